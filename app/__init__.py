@@ -7,6 +7,7 @@ from flask_cors import CORS
 from app.config import Config
 from app.routes.main_routes import main_bp
 from app.routes.api_routes import api_bp
+import atexit
 import logging
 from logging.handlers import RotatingFileHandler
 import os
@@ -21,6 +22,7 @@ def create_app(config_class=Config):
     
     # Load configuration
     app.config.from_object(config_class)
+    configure_services(app)
     
     # Initialize CORS
     CORS(app, resources={
@@ -41,9 +43,27 @@ def create_app(config_class=Config):
     # Error handlers
     register_error_handlers(app)
     
+    # Re-queue emails left unsent by a previous process
+    if not app.testing and not is_reloader_parent():
+        replay_outbox(app)
+    
+    # Flush buffered session writes when the process exits
+    register_shutdown(app)
+    
     return app
 
 
+def configure_services(app):
+    """Apply session, SMTP pool and mail queue settings from the app config"""
+    from app.services.email_service import email_service
+    from app.services.mail_queue_service import mail_queue_service
+    from app.services.session_service import session_service
+    
+    session_service.configure(app.config)
+    email_service.configure(app.config)
+    mail_queue_service.configure(app.config)
+
+
 def setup_logging(app):
     """Configure application logging"""
     if not app.debug:
@@ -65,6 +85,44 @@ def setup_logging(app):
         app.logger.info('AI Email Generator startup')
 
 
+def is_reloader_parent() -> bool:
+    """
+    Whether this is the Werkzeug reloader's watcher process
+    
+    run.py enables the reloader in development; the watcher only restarts
+    the serving child process and never handles requests.
+    """
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return False
+    return os.environ.get('FLASK_ENV') == 'development'
+
+
+def replay_outbox(app):
+    """Replay unfinished outbox entries into the mail queue"""
+    from app.services.mail_queue_service import mail_queue_service
+    
+    try:
+        with app.app_context():
+            replayed = mail_queue_service.replay_outbox()
+        if replayed:
+            app.logger.info(f'Replayed {replayed} unsent emails from outbox')
+    except Exception as e:
+        app.logger.error(f'Outbox replay failed: {e}', exc_info=True)
+
+
+def register_shutdown(app):
+    """Stop the session service (flushing cached writes) at process exit"""
+    from app.services.session_service import session_service
+    
+    def shutdown():
+        try:
+            session_service.stop()
+        except Exception as e:
+            app.logger.error(f'Session shutdown failed: {e}', exc_info=True)
+    
+    atexit.register(shutdown)
+
+
 def register_error_handlers(app):
     """Register custom error handlers"""
     from flask import jsonify
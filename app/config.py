@@ -25,15 +25,128 @@ class Config:
     if not SMTP_USER or not SMTP_PASSWORD:
         raise RuntimeError("SMTP_USER and SMTP_PASSWORD must be set in environment variables")
     
+    # SMTP Connection Pool Configuration
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 4))
+    SMTP_POOL_IDLE_TIMEOUT = float(os.environ.get('SMTP_POOL_IDLE_TIMEOUT', 60))  # seconds
+    SMTP_POOL_MAX_MESSAGES = int(os.environ.get('SMTP_POOL_MAX_MESSAGES', 100))  # per connection
+    
+    # Outbound Mail Queue Configuration
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', 1000))
+    MAIL_QUEUE_WORKERS = int(os.environ.get('MAIL_QUEUE_WORKERS', 4))
+    MAIL_QUEUE_PUT_TIMEOUT = float(os.environ.get('MAIL_QUEUE_PUT_TIMEOUT', 0))  # 0 = reject when full
+    MAIL_JOB_RETENTION = int(os.environ.get('MAIL_JOB_RETENTION', 3600))  # seconds
+    MAIL_BULK_CHUNK_SIZE = int(os.environ.get('MAIL_BULK_CHUNK_SIZE', 100))  # recipients per worker task
+    MAIL_BULK_PUT_TIMEOUT = float(os.environ.get('MAIL_BULK_PUT_TIMEOUT', 30))  # seconds per chunk
+    
+    # Per-Domain Send Throttling (rates are messages/second, 0 = unlimited)
+    THROTTLE_DOMAIN_RATE = float(os.environ.get('THROTTLE_DOMAIN_RATE', 5))
+    THROTTLE_DOMAIN_BURST = float(os.environ.get('THROTTLE_DOMAIN_BURST', 20))
+    THROTTLE_DOMAIN_LIMITS = os.environ.get('THROTTLE_DOMAIN_LIMITS', '')  # e.g. "gmail.com=2:20,yahoo.com=1:10"
+    THROTTLE_SENDER_RATE = float(os.environ.get('THROTTLE_SENDER_RATE', 20))
+    THROTTLE_SENDER_BURST = float(os.environ.get('THROTTLE_SENDER_BURST', 100))
+    
+    # Outbox (crash-safe spool) Configuration
+    OUTBOX_ENABLED = os.environ.get('OUTBOX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    OUTBOX_DIR = os.environ.get('OUTBOX_DIR', 'outbox')
+    OUTBOX_COMMIT_INTERVAL = float(os.environ.get('OUTBOX_COMMIT_INTERVAL', 0.002))  # group-commit window (s)
+    OUTBOX_COMPACT_BYTES = int(os.environ.get('OUTBOX_COMPACT_BYTES', 16 * 1024 * 1024))
+    OUTBOX_MAX_SLOTS = int(os.environ.get('OUTBOX_MAX_SLOTS', 64))  # processes with their own outbox log
+    OUTBOX_ADD_TIMEOUT = float(os.environ.get('OUTBOX_ADD_TIMEOUT', 10))  # seconds to wait for a commit
+    
     # LLM Configuration
     GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
-    LLM_MODEL = os.environ.get('LLM_MODEL', 'llama-3.1-8b-instant')
+    LLM_MODEL = os.environ.get('LLM_MODEL', 'llama-3.1-8b-instant')  # optional "provider:" prefix
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'groq')  # groq | openai | stub
+    LLM_API_BASE = os.environ.get('LLM_API_BASE', 'https://api.openai.com/v1')  # openai provider
+    LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
+    
+    # Stub Provider Configuration (offline load tests; LLM_PROVIDER=stub)
+    LLM_STUB_LATENCY = os.environ.get('LLM_STUB_LATENCY', 'fixed:0')  # e.g. lognormal:0.4,0.5
+    LLM_STUB_TOKENS_PER_SECOND = float(os.environ.get('LLM_STUB_TOKENS_PER_SECOND', 0))  # 0 = instant
+    LLM_STUB_OUTPUT_TOKENS = int(os.environ.get('LLM_STUB_OUTPUT_TOKENS', 120))
+    LLM_STUB_ERROR_RATE = float(os.environ.get('LLM_STUB_ERROR_RATE', 0))
+    LLM_STUB_SEED = int(os.environ.get('LLM_STUB_SEED', 0))
+    
+    # Model Routing Configuration (comma-separated model specs; empty = LLM_MODEL)
+    LLM_DRAFT_MODEL = os.environ.get('LLM_DRAFT_MODEL', '')  # first drafts
+    LLM_REFINE_MODEL = os.environ.get('LLM_REFINE_MODEL', '')  # feedback refinements
+    LLM_FALLBACK_MODELS = os.environ.get('LLM_FALLBACK_MODELS', '')  # tried after either route
+    LLM_ROUTER_LARGE_PROMPT_TOKENS = int(os.environ.get('LLM_ROUTER_LARGE_PROMPT_TOKENS', 1500))  # refine -> draft
+    LLM_ROUTER_MAX_LATENCY = float(os.environ.get('LLM_ROUTER_MAX_LATENCY', 8))  # seconds (EWMA)
+    LLM_ROUTER_MAX_ERROR_RATE = float(os.environ.get('LLM_ROUTER_MAX_ERROR_RATE', 0.3))
+    LLM_ROUTER_RECOVERY_SECONDS = float(os.environ.get('LLM_ROUTER_RECOVERY_SECONDS', 60))
+    
+    # LLM Deadline & Circuit Breaker Configuration
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 20))  # per-request deadline (s)
+    LLM_MAX_WORKERS = int(os.environ.get('LLM_MAX_WORKERS', 16))  # threads running model calls
+    LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 20))  # calls in rolling window
+    LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5))
+    LLM_BREAKER_ERROR_RATE = float(os.environ.get('LLM_BREAKER_ERROR_RATE', 0.5))
+    LLM_BREAKER_SLOW_CALL = float(os.environ.get('LLM_BREAKER_SLOW_CALL', 10))  # seconds
+    LLM_BREAKER_SLOW_RATE = float(os.environ.get('LLM_BREAKER_SLOW_RATE', 0.5))
+    LLM_BREAKER_OPEN_SECONDS = float(os.environ.get('LLM_BREAKER_OPEN_SECONDS', 30))
+    LLM_BREAKER_HALF_OPEN_CALLS = int(os.environ.get('LLM_BREAKER_HALF_OPEN_CALLS', 1))  # probes
+    
+    # Prompt Assembly Configuration (tokens are estimated at ~4 chars each)
+    LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 3000))
+    LLM_PROMPT_RECENT_FEEDBACK = int(os.environ.get('LLM_PROMPT_RECENT_FEEDBACK', 3))  # sent verbatim
+    LLM_PROMPT_SUMMARY_TOKENS = int(os.environ.get('LLM_PROMPT_SUMMARY_TOKENS', 150))  # rolling summary cap
+    
+    # Batch Generation Configuration
+    LLM_BATCH_CONCURRENCY = int(os.environ.get('LLM_BATCH_CONCURRENCY', 8))  # concurrent LLM calls
+    LLM_BATCH_MAX_TOPICS = int(os.environ.get('LLM_BATCH_MAX_TOPICS', 200))
+    
+    # Speculative Refinement Configuration (pre-generates likely feedback)
+    LLM_SPECULATE_ENABLED = os.environ.get('LLM_SPECULATE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    LLM_SPECULATE_CLASSES = os.environ.get('LLM_SPECULATE_CLASSES', 'concise,formal,casual')  # top-N, in order
+    LLM_SPECULATE_WORKERS = int(os.environ.get('LLM_SPECULATE_WORKERS', 2))
+    LLM_SPECULATE_MAX_PENDING = int(os.environ.get('LLM_SPECULATE_MAX_PENDING', 32))
+    LLM_SPECULATE_RATE = float(os.environ.get('LLM_SPECULATE_RATE', 1.0))  # speculative calls/second
+    LLM_SPECULATE_BURST = float(os.environ.get('LLM_SPECULATE_BURST', 10))
+    LLM_SPECULATE_MAX_LOAD = int(os.environ.get('LLM_SPECULATE_MAX_LOAD', 8))  # skip above N in-flight calls
+    LLM_SPECULATE_MAX_SESSIONS = int(os.environ.get('LLM_SPECULATE_MAX_SESSIONS', 1000))
+    
+    # LLM Response Cache Configuration
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', 86400))  # seconds
+    LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', '')  # empty = memory only
+    
+    # Near-Duplicate Topic Cache Configuration (MinHash/LSH over topic words)
+    # Off by default: a reused draft may have been written for another user
+    LLM_SIMILAR_ENABLED = os.environ.get('LLM_SIMILAR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    LLM_SIMILAR_THRESHOLD = float(os.environ.get('LLM_SIMILAR_THRESHOLD', 0.8))  # Jaccard similarity
+    LLM_SIMILAR_NUM_PERM = int(os.environ.get('LLM_SIMILAR_NUM_PERM', 64))  # MinHash functions
+    LLM_SIMILAR_BANDS = int(os.environ.get('LLM_SIMILAR_BANDS', 16))  # LSH bands (divides NUM_PERM)
+    LLM_SIMILAR_MAX_ENTRIES = int(os.environ.get('LLM_SIMILAR_MAX_ENTRIES', 100000))
+    LLM_SIMILAR_TTL = float(os.environ.get('LLM_SIMILAR_TTL', 86400))  # seconds
+    
+    # Template Fallback Configuration
+    TEMPLATE_DIR = os.environ.get('TEMPLATE_DIR', '')  # empty = app/email_templates
+    TEMPLATE_RELOAD_INTERVAL = float(os.environ.get('TEMPLATE_RELOAD_INTERVAL', 2))  # mtime check (s), -1 = off
     
     # CORS Configuration
     ALLOWED_ORIGINS = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
     
     # Session Configuration
     SESSION_TIMEOUT = int(os.environ.get('SESSION_TIMEOUT', 3600))  # 1 hour default
+    SESSION_SLIDING_EXPIRY = os.environ.get('SESSION_SLIDING_EXPIRY', 'false').lower() in ('1', 'true', 'yes')
+    SESSION_REAP_INTERVAL = float(os.environ.get('SESSION_REAP_INTERVAL', 1.0))  # reaper wake-up (s)
+    SESSION_REAP_BATCH = int(os.environ.get('SESSION_REAP_BATCH', 500))  # expiries per lock hold
+    SESSION_SHARDS = int(os.environ.get('SESSION_SHARDS', 16))  # lock stripes of the in-memory store
+    SESSION_MEMORY_BUDGET = int(os.environ.get('SESSION_MEMORY_BUDGET', 256 * 1024 * 1024))  # bytes for all sessions, 0 = unlimited
+    SESSION_COMPRESS_AFTER = float(os.environ.get('SESSION_COMPRESS_AFTER', 300))  # compress idle drafts (s), -1 = never
+    SESSION_SNAPSHOT_EVERY = int(os.environ.get('SESSION_SNAPSHOT_EVERY', 10))  # full draft every N versions
+    SESSION_MAX_VERSIONS = int(os.environ.get('SESSION_MAX_VERSIONS', 50))  # draft versions kept, 0 = all
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')  # memory | sqlite
+    SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', 'sessions.db')
+    SESSION_DB_COMMIT_INTERVAL = float(os.environ.get('SESSION_DB_COMMIT_INTERVAL', 0.001))  # group-commit window (s)
+    SESSION_DB_BATCH_SIZE = int(os.environ.get('SESSION_DB_BATCH_SIZE', 256))  # writes per transaction
+    SESSION_CACHE_ENABLED = os.environ.get('SESSION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))  # cached sessions per process
+    SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', 1.0))  # re-read clean sessions after (s)
+    SESSION_CACHE_FLUSH_INTERVAL = float(os.environ.get('SESSION_CACHE_FLUSH_INTERVAL', 0.05))  # write-behind delay (s)
+    SESSION_CACHE_FLUSH_SIZE = int(os.environ.get('SESSION_CACHE_FLUSH_SIZE', 256))  # dirty sessions forcing a flush
     
     # Application Settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request size
@@ -2,13 +2,24 @@
 Data Models and Type Definitions
 Defines data structures used across the application
 """
-from typing import TypedDict, List
+import sys
+import time
+import zlib
+from difflib import SequenceMatcher
+from typing import TypedDict, List, Optional, Tuple, Union
 from typing_extensions import Annotated
 from langchain_core.messages import BaseMessage
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 
+def _inflate(text: Union[str, bytes]) -> str:
+    """Text stored either plain or zlib-compressed"""
+    if isinstance(text, bytes):
+        return zlib.decompress(text).decode('utf-8')
+    return text
+
+
 class AgentState(TypedDict):
     """LangGraph agent state definition (for future use)"""
     messages: Annotated[List[BaseMessage], lambda x, y: x + y]
@@ -19,16 +30,293 @@ class AgentState(TypedDict):
     generated_content: str
 
 
-@dataclass
+class DraftHistory:
+    """
+    Every version of a session's draft, stored compactly
+    
+    Versions are numbered from 1. Most versions are stored as a line-level
+    delta against the previous one (the replaced line ranges and their new
+    lines), so an extra version costs memory proportional to what changed.
+    Every ``snapshot_every`` versions a full snapshot is stored instead,
+    which bounds how many deltas ``get`` has to apply. Only the newest
+    ``max_versions`` versions are kept (0 keeps all).
+    """
+    
+    __slots__ = ('snapshot_every', 'max_versions', 'first', 'versions', '_chain')
+    
+    def __init__(self, snapshot_every: int = 10, max_versions: int = 50):
+        self.snapshot_every = max(1, snapshot_every)
+        self.max_versions = max_versions
+        self.first = 1
+        # (created_at, snapshot text or tuple of (start, end, new lines) edits)
+        self.versions: List[Tuple[float, object]] = []
+        self._chain = 0
+    
+    @property
+    def latest(self) -> int:
+        """Number of the newest version (0 when empty)"""
+        return self.first + len(self.versions) - 1
+    
+    def append(self, text: str, previous: Optional[str] = None):
+        """
+        Record a new version
+        
+        Args:
+            text: The new draft
+            previous: The current draft, which must be the latest version;
+                nothing is recorded if ``text`` equals it
+        """
+        if previous is not None and text == previous:
+            return
+        if previous is None or not self.versions or self._chain + 1 >= self.snapshot_every:
+            self.versions.append((time.time(), text))
+            self._chain = 0
+        else:
+            self.versions.append((time.time(), _line_delta(previous, text)))
+            self._chain += 1
+        
+        if self.max_versions > 0 and len(self.versions) > self.max_versions:
+            self._trim(len(self.versions) - self.max_versions)
+    
+    def get(self, version: int) -> str:
+        """
+        Reconstruct one version
+        
+        Args:
+            version: Version number
+            
+        Returns:
+            The draft text of that version
+            
+        Raises:
+            ValueError: If the version is not kept
+        """
+        index = version - self.first
+        if not 0 <= index < len(self.versions):
+            raise ValueError(f"Version {version} not found")
+        
+        base = index
+        while not _is_snapshot(self.versions[base][1]):
+            base -= 1
+        text = _inflate(self.versions[base][1])
+        if base == index:
+            return text
+        
+        lines = text.splitlines(keepends=True)
+        for _, edits in self.versions[base + 1:index + 1]:
+            lines = _apply_delta(lines, edits)
+        return ''.join(lines)
+    
+    def describe(self) -> List[dict]:
+        """Describe every kept version, oldest first"""
+        described = []
+        for number, (created_at, payload) in enumerate(self.versions, self.first):
+            snapshot = _is_snapshot(payload)
+            described.append({
+                'version': number,
+                'created_at': datetime.utcfromtimestamp(created_at).isoformat(),
+                'snapshot': snapshot,
+                'changed_lines': None if snapshot else sum(end - start + len(new) for start, end, new in payload)
+            })
+        return described
+    
+    def compress(self, min_size: int = 512, shared: Optional[Tuple[str, bytes]] = None):
+        """
+        Compress snapshots of at least ``min_size`` characters
+        
+        Args:
+            min_size: Snapshots shorter than this stay as is
+            shared: Optional (text, compressed text) pair to reuse for a
+                snapshot that is that very string
+        """
+        for index, (created_at, payload) in enumerate(self.versions):
+            if not isinstance(payload, str) or len(payload) < min_size:
+                continue
+            if shared is not None and payload is shared[0] and isinstance(shared[1], bytes):
+                compressed = shared[1]
+            else:
+                compressed = zlib.compress(payload.encode('utf-8'))
+            self.versions[index] = (created_at, compressed)
+    
+    def nbytes(self, exclude: object = None) -> int:
+        """Approximate memory held by the history, not counting ``exclude``"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.versions)
+        for version in self.versions:
+            payload = version[1]
+            size += sys.getsizeof(version)
+            if _is_snapshot(payload):
+                if payload is not exclude:
+                    size += sys.getsizeof(payload)
+                continue
+            size += sys.getsizeof(payload)
+            for edit in payload:
+                size += sys.getsizeof(edit) + sys.getsizeof(edit[2])
+                size += sum(sys.getsizeof(line) for line in edit[2])
+        return size
+    
+    def to_record(self) -> dict:
+        """Convert to a JSON-serializable record"""
+        return {
+            'snapshot_every': self.snapshot_every,
+            'max_versions': self.max_versions,
+            'first': self.first,
+            'versions': [
+                [created_at, _inflate(payload) if _is_snapshot(payload)
+                 else [[start, end, list(new)] for start, end, new in payload]]
+                for created_at, payload in self.versions
+            ]
+        }
+    
+    @classmethod
+    def from_record(cls, record: dict) -> 'DraftHistory':
+        """Rebuild a history from ``to_record`` output"""
+        history = cls(record.get('snapshot_every', 10), record.get('max_versions', 50))
+        history.first = record.get('first', 1)
+        for created_at, payload in record.get('versions', []):
+            if isinstance(payload, str):
+                history.versions.append((created_at, payload))
+                history._chain = 0
+            else:
+                edits = tuple((start, end, tuple(new)) for start, end, new in payload)
+                history.versions.append((created_at, edits))
+                history._chain += 1
+        return history
+    
+    def _trim(self, count: int):
+        """Drop the oldest ``count`` versions, snapshotting the new oldest"""
+        if not _is_snapshot(self.versions[count][1]):
+            self.versions[count] = (self.versions[count][0], self.get(self.first + count))
+        del self.versions[:count]
+        self.first += count
+
+
+def _is_snapshot(payload: object) -> bool:
+    return isinstance(payload, (str, bytes))
+
+
+def _line_delta(old: str, new: str) -> tuple:
+    """Line edits turning ``old`` into ``new``, as (start, end, new lines)"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return tuple(
+        (i1, i2, tuple(new_lines[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    )
+
+
+def _apply_delta(lines: List[str], edits: tuple) -> List[str]:
+    result = []
+    position = 0
+    for start, end, new in edits:
+        result.extend(lines[position:start])
+        result.extend(new)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
 class EmailSession:
-    """Email session data structure"""
-    session_id: str
-    topic: str
-    generated_content: str
-    feedback_history: List[str]
-    final_data: str
-    receiver_mail: str
-    created_at: datetime
+    """
+    Email session data structure
+    
+    Uses ``__slots__`` to keep per-session overhead small. The draft
+    (``generated_content``) and ``final_data`` are stored once when they
+    are identical, and ``compress`` replaces cold drafts with zlib
+    compressed bytes that are decompressed transparently on access.
+    
+    Every value assigned to ``generated_content`` is recorded in
+    ``history`` as a new draft version.
+    """
+    
+    __slots__ = ('session_id', 'topic', '_draft', '_final', 'feedback_history', 'receiver_mail',
+                 'created_at', 'feedback_summary', 'summarized_count', 'history')
+    
+    def __init__(self, session_id: str, topic: str, generated_content: str,
+                 feedback_history: List[str], final_data: str, receiver_mail: str,
+                 created_at: datetime, feedback_summary: str = '', summarized_count: int = 0,
+                 history: Optional[DraftHistory] = None):
+        self.session_id = session_id
+        self.topic = topic
+        self._draft = generated_content
+        if history is None:
+            history = DraftHistory()
+        if not history.versions:
+            history.append(generated_content)
+        self.history = history
+        self._final = ''
+        self.final_data = final_data
+        self.feedback_history = feedback_history
+        self.receiver_mail = receiver_mail
+        self.created_at = created_at
+        self.feedback_summary = feedback_summary
+        self.summarized_count = summarized_count
+    
+    @property
+    def generated_content(self) -> str:
+        return _inflate(self._draft)
+    
+    @generated_content.setter
+    def generated_content(self, value: str):
+        self.history.append(value, self.generated_content)
+        self._draft = value
+    
+    @property
+    def final_data(self) -> str:
+        return _inflate(self._final)
+    
+    @final_data.setter
+    def final_data(self, value: str):
+        # Share the draft's storage when finalizing it unchanged
+        if value and (value is self._draft or value == self.generated_content):
+            self._final = self._draft
+        else:
+            self._final = value
+    
+    @property
+    def is_compressed(self) -> bool:
+        return isinstance(self._draft, bytes) or isinstance(self._final, bytes)
+    
+    def compress(self, min_size: int = 512) -> bool:
+        """
+        Compress the draft and final text if they are large enough
+        
+        Args:
+            min_size: Texts shorter than this (in characters) stay as is
+            
+        Returns:
+            True if anything was compressed
+        """
+        draft = self._draft
+        shared = self._final is draft
+        compressed = False
+        if isinstance(draft, str) and len(draft) >= min_size:
+            self._draft = zlib.compress(draft.encode('utf-8'))
+            compressed = True
+        if shared:
+            self._final = self._draft
+        elif isinstance(self._final, str) and len(self._final) >= min_size:
+            self._final = zlib.compress(self._final.encode('utf-8'))
+            compressed = True
+        self.history.compress(min_size, shared=(draft, self._draft))
+        return compressed
+    
+    def nbytes(self) -> int:
+        """Approximate memory held by this session, in bytes"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.created_at)
+        size += sum(sys.getsizeof(text) for text in (
+            self.session_id, self.topic, self._draft, self.receiver_mail, self.feedback_summary
+        ))
+        if self._final is not self._draft:
+            size += sys.getsizeof(self._final)
+        size += sys.getsizeof(self.feedback_history)
+        size += sum(sys.getsizeof(item) for item in self.feedback_history)
+        size += self.history.nbytes(exclude=self._draft)
+        return size
+    
+    def __repr__(self):
+        return f"EmailSession(session_id={self.session_id!r}, topic={self.topic!r})"
     
     def to_dict(self):
         """Convert to dictionary"""
@@ -37,10 +325,43 @@ class EmailSession:
             'topic': self.topic,
             'generated_content': self.generated_content,
             'feedback_history': self.feedback_history,
+            'feedback_summary': self.feedback_summary,
+            'final_data': self.final_data,
+            'receiver_mail': self.receiver_mail,
+            'created_at': self.created_at.isoformat(),
+            'version': self.history.latest
+        }
+    
+    def to_record(self) -> dict:
+        """Convert to a JSON-serializable record for session storage"""
+        return {
+            'session_id': self.session_id,
+            'topic': self.topic,
+            'generated_content': self.generated_content,
+            'feedback_history': list(self.feedback_history),
             'final_data': self.final_data,
             'receiver_mail': self.receiver_mail,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'feedback_summary': self.feedback_summary,
+            'summarized_count': self.summarized_count,
+            'history': self.history.to_record()
         }
+    
+    @classmethod
+    def from_record(cls, record: dict) -> 'EmailSession':
+        """Rebuild a session from ``to_record`` output"""
+        return cls(
+            session_id=record['session_id'],
+            topic=record['topic'],
+            generated_content=record['generated_content'],
+            feedback_history=list(record.get('feedback_history', [])),
+            final_data=record.get('final_data', ''),
+            receiver_mail=record.get('receiver_mail', ''),
+            created_at=datetime.fromisoformat(record['created_at']),
+            feedback_summary=record.get('feedback_summary', ''),
+            summarized_count=record.get('summarized_count', 0),
+            history=DraftHistory.from_record(record['history']) if 'history' in record else None
+        )
 
 
 @dataclass
@@ -61,3 +382,66 @@ class EmailContent:
             body = content
         
         return cls(subject=subject, body=body)
+
+
+@dataclass
+class MailJob:
+    """Outbound email job tracked by the mail queue"""
+    job_id: str
+    subject: str
+    body: str
+    recipient: str = ''
+    session_id: Optional[str] = None
+    kind: str = 'single'
+    status: str = 'queued'
+    error: str = ''
+    total: int = 0
+    sent_count: int = 0
+    failed_count: int = 0
+    results: List[dict] = field(default_factory=list)
+    submitted: bool = True
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    @property
+    def is_finished(self) -> bool:
+        """Whether the job reached a terminal state"""
+        return self.status in ('sent', 'failed', 'partial')
+    
+    def to_dict(self, include_results: bool = True):
+        """Convert to dictionary (message content is omitted)"""
+        queued_ms = None
+        send_ms = None
+        if self.started_at:
+            queued_ms = int((self.started_at - self.created_at).total_seconds() * 1000)
+            if self.finished_at:
+                send_ms = int((self.finished_at - self.started_at).total_seconds() * 1000)
+        
+        data = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'recipient': self.recipient,
+            'session_id': self.session_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'timings': {
+                'queued_ms': queued_ms,
+                'send_ms': send_ms
+            }
+        }
+        
+        if self.kind in ('bulk', 'merge'):
+            data.update({
+                'total': self.total,
+                'sent': self.sent_count,
+                'failed': self.failed_count,
+                'pending': self.total - self.sent_count - self.failed_count
+            })
+            if include_results:
+                data['results'] = list(self.results)
+        
+        return data
@@ -2,10 +2,16 @@
 API Routes
 Handles all API endpoints for email generation
 """
-from flask import Blueprint, request, jsonify, current_app
+import json
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from app.services.llm_service import llm_service
 from app.services.email_service import email_service
-from app.services.session_service import session_service
+from app.services.mail_queue_service import mail_queue_service, MailQueueFullError
+from app.services.merge_service import MergePlan, RowSpool, iter_csv_rows, iter_json_rows
+from app.services.outbox_service import outbox_service
+from app.services.prompt_service import prompt_builder
+from app.services.session_service import SessionConflictError, session_service
+from app.services.speculation_service import speculation_service
 from app.models.state import EmailContent
 from app.utils.validators import (
     validate_topic, 
@@ -13,7 +19,12 @@ from app.utils.validators import (
     is_valid_email,
     require_json
 )
-from app.utils.helpers import format_error_response, format_success_response
+from app.utils.helpers import (
+    format_error_response,
+    format_success_response,
+    format_sse_event,
+    iter_recipients
+)
 
 api_bp = Blueprint('api', __name__)
 
@@ -26,7 +37,8 @@ def generate_draft():
     
     Request JSON:
         {
-            "topic": "Email topic or purpose"
+            "topic": "Email topic or purpose",
+            "no_cache": false
         }
     
     Response JSON:
@@ -46,10 +58,14 @@ def generate_draft():
             return format_error_response(error_msg)
         
         # Generate email content
-        generated_content = llm_service.generate_email(topic)
+        generated_content = llm_service.generate_email(
+            topic,
+            use_cache=not data.get('no_cache', False)
+        )
         
         # Create session
         session = session_service.create_session(topic, generated_content)
+        speculation_service.schedule(session)
         
         return jsonify(format_success_response({
             'session_id': session.session_id,
@@ -61,6 +77,127 @@ def generate_draft():
         return format_error_response(str(e), 500)
 
 
+@api_bp.route('/generate/stream', methods=['POST'])
+@require_json('topic')
+def generate_draft_stream():
+    """
+    Generate initial email draft, streaming tokens as server-sent events
+    
+    Request JSON:
+        {
+            "topic": "Email topic or purpose",
+            "no_cache": false
+        }
+    
+    Response (text/event-stream):
+        event: token
+        data: {"text": "Subject: ..."}
+        
+        event: done
+        data: {"success": true, "session_id": "uuid", "content": "full email"}
+    
+    On failure after the stream has started an "error" event is sent.
+    """
+    data = request.get_json()
+    topic = data.get('topic', '').strip()
+    use_cache = not data.get('no_cache', False)
+    
+    # Validate topic
+    is_valid, error_msg = validate_topic(topic)
+    if not is_valid:
+        return format_error_response(error_msg)
+    
+    def event_stream():
+        parts = []
+        try:
+            for text in llm_service.stream_email(topic, use_cache=use_cache):
+                parts.append(text)
+                yield format_sse_event('token', {'text': text})
+            
+            generated_content = ''.join(parts)
+            session = session_service.create_session(topic, generated_content)
+            speculation_service.schedule(session)
+            
+            yield format_sse_event('done', format_success_response({
+                'session_id': session.session_id,
+                'content': generated_content
+            }))
+        
+        except Exception as e:
+            current_app.logger.error(f"Error in generate_draft_stream: {e}", exc_info=True)
+            yield format_sse_event('error', {'success': False, 'error': str(e)})
+    
+    return _sse_response(event_stream())
+
+
+@api_bp.route('/generate/batch', methods=['POST'])
+@require_json('topics')
+def generate_batch():
+    """
+    Generate initial drafts for many topics, one session per topic
+    
+    Request JSON:
+        {
+            "topics": ["Topic one", "Topic two"],
+            "no_cache": false
+        }
+    
+    Response JSON:
+        {
+            "success": true,
+            "results": [
+                {
+                    "topic": "Topic one",
+                    "success": true,
+                    "session_id": "uuid",
+                    "content": "generated email content",
+                    "source": "llm | cache | template",
+                    "error": ""
+                }
+            ]
+        }
+    """
+    try:
+        data = request.get_json()
+        topics = data.get('topics')
+        
+        if not isinstance(topics, list) or not topics:
+            return format_error_response('topics must be a non-empty list')
+        
+        max_topics = current_app.config.get('LLM_BATCH_MAX_TOPICS', 200)
+        if len(topics) > max_topics:
+            return format_error_response(f'At most {max_topics} topics per batch')
+        
+        results = [None] * len(topics)
+        valid = []
+        for index, topic in enumerate(topics):
+            topic = topic.strip() if isinstance(topic, str) else ''
+            is_valid, error_msg = validate_topic(topic)
+            if is_valid:
+                valid.append((index, topic))
+            else:
+                results[index] = {'topic': topic, 'success': False, 'error': error_msg}
+        
+        generated = llm_service.generate_batch(
+            [topic for _, topic in valid],
+            use_cache=not data.get('no_cache', False)
+        )
+        
+        for (index, topic), item in zip(valid, generated):
+            session = session_service.create_session(topic, item['content'])
+            results[index] = {
+                'success': True,
+                'session_id': session.session_id,
+                **item
+            }
+        
+        return jsonify(format_success_response({'results': results}))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in generate_batch: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
+
+
 @api_bp.route('/feedback', methods=['POST'])
 @require_json('session_id', 'feedback')
 def process_feedback():
@@ -70,7 +207,8 @@ def process_feedback():
     Request JSON:
         {
             "session_id": "uuid",
-            "feedback": "user feedback text"
+            "feedback": "user feedback text",
+            "no_cache": false
         }
     
     Response JSON:
@@ -97,29 +235,146 @@ def process_feedback():
                 return format_error_response(error_msg)
             
             # Add feedback to history
-            session_service.add_feedback(session_id, feedback)
-        
-        # Regenerate content with feedback
-        all_feedback = ' | '.join(session.feedback_history)
-        new_content = llm_service.generate_email(
-            session.topic,
-            all_feedback,
-            session.generated_content
-        )
+            session = session_service.add_feedback(session_id, feedback) or session
+        
+        # Regenerate content with feedback (older entries summarized),
+        # unless a matching refinement was prepared in the background
+        all_feedback = _compact_feedback(session)
+        new_content = None
+        if feedback and not data.get('no_cache', False):
+            new_content = speculation_service.take(session_id, feedback, session.generated_content)
+        if new_content is None:
+            new_content = llm_service.generate_email(
+                session.topic,
+                all_feedback,
+                session.generated_content,
+                use_cache=not data.get('no_cache', False)
+            )
         
         # Update session
-        session_service.update_session(session_id, generated_content=new_content)
+        session = session_service.update_session(session_id, generated_content=new_content) or session
+        speculation_service.schedule(session)
         
         return jsonify(format_success_response({
             'content': new_content,
             'feedback_history': session.feedback_history
         }))
     
+    except SessionConflictError as e:
+        return format_error_response(str(e), 409)
     except Exception as e:
         current_app.logger.error(f"Error in process_feedback: {e}", exc_info=True)
         return format_error_response(str(e), 500)
 
 
+@api_bp.route('/feedback/stream', methods=['POST'])
+@require_json('session_id', 'feedback')
+def process_feedback_stream():
+    """
+    Process user feedback and regenerate email, streaming tokens as
+    server-sent events
+    
+    Request JSON:
+        {
+            "session_id": "uuid",
+            "feedback": "user feedback text",
+            "no_cache": false
+        }
+    
+    Response (text/event-stream):
+        event: token
+        data: {"text": "..."}
+        
+        event: done
+        data: {"success": true, "content": "...", "feedback_history": [...]}
+    """
+    data = request.get_json()
+    session_id = data.get('session_id')
+    feedback = data.get('feedback', '').strip()
+    use_cache = not data.get('no_cache', False)
+    
+    # Get session
+    session = session_service.get_session(session_id)
+    if not session:
+        return format_error_response('Invalid or expired session')
+    
+    # Validate feedback
+    if feedback:
+        is_valid, error_msg = validate_feedback(feedback)
+        if not is_valid:
+            return format_error_response(error_msg)
+        
+        # Add feedback to history
+        session = session_service.add_feedback(session_id, feedback) or session
+    
+    all_feedback = _compact_feedback(session)
+    prepared = None
+    if feedback and use_cache:
+        prepared = speculation_service.take(session_id, feedback, session.generated_content)
+    
+    def event_stream():
+        parts = []
+        try:
+            if prepared is not None:
+                chunks = iter([prepared])
+            else:
+                chunks = llm_service.stream_email(
+                    session.topic,
+                    all_feedback,
+                    session.generated_content,
+                    use_cache=use_cache
+                )
+            
+            for text in chunks:
+                parts.append(text)
+                yield format_sse_event('token', {'text': text})
+            
+            new_content = ''.join(parts)
+            updated = session_service.update_session(session_id, generated_content=new_content) or session
+            speculation_service.schedule(updated)
+            
+            yield format_sse_event('done', format_success_response({
+                'content': new_content,
+                'feedback_history': updated.feedback_history
+            }))
+        
+        except Exception as e:
+            current_app.logger.error(f"Error in process_feedback_stream: {e}", exc_info=True)
+            yield format_sse_event('error', {'success': False, 'error': str(e)})
+    
+    return _sse_response(event_stream())
+
+
+def _compact_feedback(session):
+    """Fold aged-out feedback into the session summary; return prompt feedback"""
+    feedback_text, summary, summarized_count = prompt_builder.compact_feedback(
+        session.feedback_history,
+        session.feedback_summary,
+        session.summarized_count
+    )
+    
+    if summarized_count != session.summarized_count:
+        session_service.update_session(
+            session.session_id,
+            feedback_summary=summary,
+            summarized_count=summarized_count
+        )
+    
+    return feedback_text
+
+
+def _sse_response(events):
+    """Wrap an event generator in an unbuffered text/event-stream response"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @api_bp.route('/finalize', methods=['POST'])
 @require_json('session_id')
 def finalize_draft():
@@ -147,15 +402,18 @@ def finalize_draft():
             return format_error_response('Invalid or expired session')
         
         # Finalize content
-        session_service.update_session(
+        session = session_service.update_session(
             session_id,
             final_data=session.generated_content
-        )
+        ) or session
+        speculation_service.cancel(session_id)
         
         return jsonify(format_success_response({
             'final_content': session.final_data
         }))
     
+    except SessionConflictError as e:
+        return format_error_response(str(e), 409)
     except Exception as e:
         current_app.logger.error(f"Error in finalize_draft: {e}", exc_info=True)
         return format_error_response(str(e), 500)
@@ -165,7 +423,7 @@ def finalize_draft():
 @require_json('session_id', 'email')
 def send_email():
     """
-    Send finalized email to recipient
+    Queue finalized email for delivery to recipient
     
     Request JSON:
         {
@@ -173,10 +431,12 @@ def send_email():
             "email": "recipient@example.com"
         }
     
-    Response JSON:
+    Response JSON (202 Accepted):
         {
             "success": true,
-            "message": "Email sent successfully to recipient@example.com"
+            "job_id": "uuid",
+            "status": "queued",
+            "message": "Email to recipient@example.com queued for delivery"
         }
     """
     try:
@@ -202,21 +462,22 @@ def send_email():
             session.topic
         )
         
-        # Send email
-        email_service.send_email(
+        # Queue email; delivery happens on a sender worker
+        job = mail_queue_service.submit(
             email_content.subject,
             email_content.body,
-            recipient_email
+            recipient_email,
+            session_id=session_id
         )
         
-        # Update session
-        session_service.update_session(session_id, receiver_mail=recipient_email)
-        
         return jsonify(format_success_response(
-            {},
-            f'Email sent successfully to {recipient_email}'
-        ))
+            job.to_dict(),
+            f'Email to {recipient_email} queued for delivery'
+        )), 202
     
+    except MailQueueFullError as e:
+        error_body, _ = format_error_response(str(e), 503)
+        return jsonify(error_body), 503, {'Retry-After': '5'}
     except ValueError as e:
         return format_error_response(str(e))
     except RuntimeError as e:
@@ -226,6 +487,205 @@ def send_email():
         return format_error_response(f'Failed to send email: {str(e)}', 500)
 
 
+@api_bp.route('/send-email/bulk', methods=['POST'])
+def send_bulk_email():
+    """
+    Queue finalized email for delivery to many recipients
+    
+    Request JSON:
+        {
+            "session_id": "uuid",
+            "recipients": ["a@example.com", "b@example.com"]
+        }
+    
+    Or multipart/form-data with a "session_id" field and a "file" upload
+    (one address per line, or CSV), which is streamed rather than loaded.
+    
+    Response JSON (202 Accepted):
+        {
+            "success": true,
+            "job_id": "uuid",
+            "kind": "bulk",
+            "status": "sending",
+            "total": 2,
+            "sent": 0,
+            "failed": 0,
+            "pending": 2
+        }
+    """
+    try:
+        if request.is_json:
+            data = request.get_json()
+            session_id = data.get('session_id')
+            recipients = data.get('recipients')
+            if not isinstance(recipients, list) or not recipients:
+                return format_error_response('recipients must be a non-empty list')
+            recipients = (str(r).strip() for r in recipients)
+        else:
+            session_id = request.form.get('session_id')
+            upload = request.files.get('file')
+            if upload is None:
+                return format_error_response('Provide a JSON body or a "file" upload')
+            recipients = iter_recipients(upload.stream)
+        
+        if not session_id:
+            return format_error_response('Missing required field: session_id')
+        
+        # Get session
+        session = session_service.get_session(session_id)
+        if not session:
+            return format_error_response('Invalid or expired session')
+        
+        if not session.final_data:
+            return format_error_response('Email must be finalized before sending')
+        
+        # Parse once for the whole batch
+        email_content = EmailContent.parse_from_content(
+            session.final_data,
+            session.topic
+        )
+        
+        job = mail_queue_service.submit_bulk(
+            email_content.subject,
+            email_content.body,
+            recipients,
+            session_id=session_id
+        )
+        
+        if job.total == 0:
+            return format_error_response('No recipients found in upload')
+        
+        return jsonify(format_success_response(
+            job.to_dict(include_results=False),
+            f'Email to {job.total} recipients queued for delivery'
+        )), 202
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in send_bulk_email: {e}", exc_info=True)
+        return format_error_response(f'Failed to queue bulk email: {str(e)}', 500)
+
+
+@api_bp.route('/send-email/merge', methods=['POST'])
+def send_merge_email():
+    """
+    Personalize finalized email per recipient row and queue delivery
+    
+    Placeholders such as [Recipient] or [Your Name] are filled from each
+    row's columns (recipient, name, your_name, ...) or from "variables".
+    
+    Request JSON:
+        {
+            "session_id": "uuid",
+            "rows": [{"email": "a@example.com", "recipient": "Ana"}],
+            "variables": {"your_name": "Sam"}
+        }
+    
+    Or multipart/form-data with "session_id", optional "variables" (JSON
+    string) and a "file" upload: CSV with a header row, or JSON / JSON
+    lines (.json, .jsonl). Uploads are streamed row by row into a spool
+    and queued in the background, so the response does not wait for
+    delivery pacing; poll the job for progress.
+    
+    Response JSON (202 Accepted):
+        {
+            "success": true,
+            "job_id": "uuid",
+            "kind": "merge",
+            "status": "queued",
+            "placeholders": ["recipient", "your_name"],
+            "rows": 1
+        }
+    """
+    try:
+        if request.is_json:
+            data = request.get_json()
+            session_id = data.get('session_id')
+            variables = data.get('variables') or {}
+            rows = data.get('rows')
+            if not isinstance(rows, list) or not rows:
+                return format_error_response('rows must be a non-empty list')
+        else:
+            session_id = request.form.get('session_id')
+            try:
+                variables = json.loads(request.form.get('variables') or '{}')
+            except ValueError:
+                return format_error_response('variables must be a JSON object')
+            upload = request.files.get('file')
+            if upload is None:
+                return format_error_response('Provide a JSON body or a "file" upload')
+            filename = (upload.filename or '').lower()
+            if filename.endswith(('.json', '.jsonl', '.ndjson')) or 'json' in (upload.mimetype or ''):
+                rows = iter_json_rows(upload.stream)
+            else:
+                rows = iter_csv_rows(upload.stream)
+        
+        if not session_id:
+            return format_error_response('Missing required field: session_id')
+        
+        if not isinstance(variables, dict):
+            return format_error_response('variables must be a JSON object')
+        
+        # Get session
+        session = session_service.get_session(session_id)
+        if not session:
+            return format_error_response('Invalid or expired session')
+        
+        if not session.final_data:
+            return format_error_response('Email must be finalized before sending')
+        
+        # Compile once; rows are rendered as they are queued
+        plan = MergePlan.compile(session.final_data, session.topic, variables)
+        spool = RowSpool(rows)
+        
+        if spool.count == 0:
+            spool.close()
+            return format_error_response('No recipient rows found')
+        
+        job = mail_queue_service.submit_merge(plan, spool, session_id=session_id)
+        
+        return jsonify(format_success_response({
+            **job.to_dict(include_results=False),
+            'placeholders': plan.placeholders,
+            'rows': spool.count
+        }, f'{spool.count} personalized emails queued for delivery')), 202
+    
+    except ValueError as e:
+        return format_error_response(str(e))
+    except Exception as e:
+        current_app.logger.error(f"Error in send_merge_email: {e}", exc_info=True)
+        return format_error_response(f'Failed to queue merge email: {str(e)}', 500)
+
+
+@api_bp.route('/send-email/<job_id>', methods=['GET'])
+def get_send_status(job_id):
+    """
+    Retrieve delivery status of a queued email
+    
+    Response JSON:
+        {
+            "success": true,
+            "job_id": "uuid",
+            "status": "queued | sending | sent | failed | partial",
+            "error": "",
+            "timings": {"queued_ms": 12, "send_ms": 340}
+        }
+    
+    Bulk jobs additionally report total/sent/failed/pending counts and
+    per-recipient "results".
+    """
+    try:
+        job = mail_queue_service.get_job(job_id)
+        
+        if not job:
+            return format_error_response('Job not found', 404)
+        
+        return jsonify(format_success_response(job.to_dict()))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in get_send_status: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
+
+
 @api_bp.route('/session/<session_id>', methods=['GET'])
 def get_session(session_id):
     """
@@ -238,7 +698,8 @@ def get_session(session_id):
             "generated_content": "content",
             "feedback_history": [],
             "final_data": "",
-            "receiver_mail": ""
+            "receiver_mail": "",
+            "version": 1
         }
     """
     try:
@@ -252,3 +713,139 @@ def get_session(session_id):
     except Exception as e:
         current_app.logger.error(f"Error in get_session: {e}", exc_info=True)
         return format_error_response(str(e), 500)
+
+
+@api_bp.route('/session/<session_id>/versions', methods=['GET'])
+def get_session_versions(session_id):
+    """
+    List the kept draft versions of a session
+    
+    Response JSON:
+        {
+            "success": true,
+            "session_id": "uuid",
+            "current": 3,
+            "versions": [
+                {"version": 1, "created_at": "...", "snapshot": true, "changed_lines": null},
+                {"version": 2, "created_at": "...", "snapshot": false, "changed_lines": 4}
+            ]
+        }
+    """
+    try:
+        session = session_service.get_session(session_id)
+        
+        if not session:
+            return format_error_response('Session not found', 404)
+        
+        return jsonify(format_success_response({
+            'session_id': session_id,
+            'current': session.history.latest,
+            'versions': session.history.describe()
+        }))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in get_session_versions: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
+
+
+@api_bp.route('/session/<session_id>/versions/<int:version>', methods=['GET'])
+def get_session_version(session_id, version):
+    """
+    Retrieve the draft text of one version
+    
+    Response JSON:
+        {
+            "success": true,
+            "version": 2,
+            "generated_content": "content"
+        }
+    """
+    try:
+        session = session_service.get_session(session_id)
+        
+        if not session:
+            return format_error_response('Session not found', 404)
+        
+        try:
+            content = session.history.get(version)
+        except ValueError as e:
+            return format_error_response(str(e), 404)
+        
+        return jsonify(format_success_response({
+            'version': version,
+            'generated_content': content
+        }))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in get_session_version: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
+
+
+@api_bp.route('/session/<session_id>/versions/<int:version>/restore', methods=['POST'])
+def restore_session_version(session_id, version):
+    """
+    Make an earlier draft version the current draft
+    
+    The restored draft is recorded as a new version.
+    
+    Response JSON:
+        {
+            "success": true,
+            "version": 4,
+            "restored_from": 2,
+            "generated_content": "content"
+        }
+    """
+    try:
+        try:
+            session = session_service.restore_version(session_id, version)
+        except ValueError as e:
+            return format_error_response(str(e), 404)
+        
+        if not session:
+            return format_error_response('Session not found', 404)
+        
+        speculation_service.schedule(session)
+        
+        return jsonify(format_success_response({
+            'version': session.history.latest,
+            'restored_from': version,
+            'generated_content': session.generated_content
+        }))
+    
+    except SessionConflictError as e:
+        return format_error_response(str(e), 409)
+    except Exception as e:
+        current_app.logger.error(f"Error in restore_session_version: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
+
+
+@api_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Retrieve service runtime statistics
+    
+    Response JSON:
+        {
+            "success": true,
+            "smtp_pool": {"hits": 0, "misses": 0, "reconnects": 0, ...},
+            "mail_queue": {"depth": 0, "capacity": 1000, ...},
+            "outbox": {"enabled": true, "pending": 0, "commits": 0, ...},
+            "llm": {"cache": {...}, "singleflight": {...}, "router": {...}, "breaker": {...}, ...},
+            "speculation": {"enabled": false, "scheduled": 0, "hits": 0, ...},
+            "sessions": {"active": 0, "expiry_heap": 0, "expired": 0, ...}
+        }
+    """
+    try:
+        return jsonify(format_success_response({
+            'smtp_pool': email_service.get_pool_stats(),
+            'mail_queue': mail_queue_service.get_stats(),
+            'outbox': outbox_service.get_stats(),
+            'llm': llm_service.get_stats(),
+            'speculation': speculation_service.get_stats(),
+            'sessions': session_service.get_stats()
+        }))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error in get_stats: {e}", exc_info=True)
+        return format_error_response(str(e), 500)
@@ -30,9 +30,16 @@ def api_info():
         'status': 'running',
         'endpoints': {
             'generate': 'POST /api/generate',
+            'generate_stream': 'POST /api/generate/stream',
+            'generate_batch': 'POST /api/generate/batch',
             'feedback': 'POST /api/feedback',
+            'feedback_stream': 'POST /api/feedback/stream',
             'finalize': 'POST /api/finalize',
             'send_email': 'POST /api/send-email',
-            'get_session': 'GET /api/session/<session_id>'
+            'send_bulk': 'POST /api/send-email/bulk',
+            'send_merge': 'POST /api/send-email/merge',
+            'send_status': 'GET /api/send-email/<job_id>',
+            'get_session': 'GET /api/session/<session_id>',
+            'stats': 'GET /api/stats'
         }
     })
@@ -0,0 +1,216 @@
+"""
+Generation Cache Service
+LRU + TTL cache for generated email drafts, with an optional disk tier
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "🗃️ "
+        print(f"{emoji} {message}")
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def make_cache_key(model: str, topic: str, feedback: str = "", previous_content: str = "") -> str:
+    """
+    Build a cache key from normalized prompt inputs
+
+    Topic and feedback are case- and whitespace-insensitive; the previous
+    draft is whitespace-normalized only.
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    parts = (
+        model or '',
+        _WHITESPACE.sub(' ', topic or '').strip().casefold(),
+        _WHITESPACE.sub(' ', feedback or '').strip().casefold(),
+        _WHITESPACE.sub(' ', previous_content or '').strip()
+    )
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class DiskCacheTier:
+    """
+    File-per-entry cache tier that survives restarts
+
+    Entries live at ``<directory>/<key[:2]>/<key>.json`` and carry an
+    absolute expiry time; expired files are removed when read.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('expires_at', 0) < time.time():
+            self.delete(key)
+            return None
+        return entry.get('value')
+
+    def put(self, key: str, value: str, ttl: float):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'value': value, 'expires_at': time.time() + ttl}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            _safe_log(f"Disk cache write failed: {e}", 'error')
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+
+class GenerationCache:
+    """
+    In-memory LRU with a byte cap and TTL, backed by an optional disk tier
+
+    Any object exposing ``get(key)``, ``put(key, value)`` and
+    ``get_stats()`` can stand in for this class on LLMService.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 86400,
+                 disk: Optional[DiskCacheTier] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    @classmethod
+    def from_env(cls) -> Optional['GenerationCache']:
+        """Build the cache from LLM_CACHE_* settings (None if disabled)"""
+        if os.environ.get('LLM_CACHE_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+
+        disk = None
+        disk_dir = os.environ.get('LLM_CACHE_DIR', '')
+        if disk_dir:
+            try:
+                disk = DiskCacheTier(disk_dir)
+            except OSError as e:
+                _safe_log(f"Disk cache disabled: {e}", 'error')
+
+        return cls(
+            max_bytes=int(os.environ.get('LLM_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+            ttl=float(os.environ.get('LLM_CACHE_TTL', 86400)),
+            disk=disk
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached value, promoting disk hits into memory"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                self._remove(key)
+                self._stats['expirations'] += 1
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key: str, value: str):
+        """Store a value in memory and, if configured, on disk"""
+        self._store(key, value)
+        with self._lock:
+            self._stats['stores'] += 1
+        if self.disk is not None:
+            self.disk.put(key, value, self.ttl)
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = self._stats['hits'] + self._stats['disk_hits']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk': self.disk is not None
+            }
+
+    def _store(self, key: str, value: str):
+        size = len(key) + len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def _remove(self, key: str):
+        """Remove an entry (lock held)"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
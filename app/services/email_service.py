@@ -2,8 +2,13 @@
 Email Sending Service
 Handles SMTP email transmission
 """
+import os
 import smtplib
+import threading
+import time
+from collections import deque
 from email.message import EmailMessage
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 from app.utils.validators import is_valid_email
 
 
@@ -21,70 +26,471 @@ def _safe_log(message: str, level: str = 'info'):
         print(f"{emoji} {message}")
 
 
+def _bulk_result(recipient_email: str, error: str = '') -> Dict[str, str]:
+    """Per-recipient bulk send result"""
+    return {
+        'email': recipient_email,
+        'status': 'failed' if error else 'sent',
+        'error': error
+    }
+
+
+class _PooledConnection:
+    """Authenticated SMTP connection plus the bookkeeping the pool needs"""
+
+    __slots__ = ('smtp', 'created_at', 'last_used', 'messages_sent')
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Bounded, thread-safe pool of authenticated SMTP connections
+
+    Connections are checked with NOOP before reuse and dropped once they
+    have been idle longer than ``idle_timeout`` seconds or have sent
+    ``max_messages`` messages.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 max_size: int = 4, idle_timeout: float = 60.0,
+                 max_messages: int = 100, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max(1, max_messages)
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._in_use = 0
+        self._stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0}
+
+    def acquire(self) -> _PooledConnection:
+        """
+        Check out a connection, reusing an idle one when it is still healthy
+
+        Returns:
+            _PooledConnection ready to send
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError("Timed out waiting for a free SMTP connection")
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    break
+                if self._is_usable(conn):
+                    self._count('hits')
+                    self._mark_in_use(1)
+                    return conn
+                self._discard(conn)
+
+            self._count('misses')
+            conn = self._connect()
+            self._mark_in_use(1)
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: _PooledConnection, reusable: bool = True):
+        """
+        Return a connection to the pool
+
+        Args:
+            conn: Connection obtained from ``acquire``
+            reusable: False if the connection is known to be broken
+        """
+        try:
+            if reusable and conn.messages_sent < self.max_messages:
+                conn.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                self._discard(conn)
+        finally:
+            self._mark_in_use(-1)
+            self._slots.release()
+
+    def record_reconnect(self):
+        """Count a send that had to be retried on a fresh connection"""
+        self._count('reconnects')
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return pool counters and current occupancy"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+        stats['max_size'] = self.max_size
+        return stats
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._quit(conn.smtp)
+
+    def _connect(self) -> _PooledConnection:
+        """Open, secure and authenticate a new connection"""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.starttls()
+            smtp.login(self.user, self.password)
+        except BaseException:
+            self._quit(smtp)
+            raise
+        return _PooledConnection(smtp)
+
+    def _is_usable(self, conn: _PooledConnection) -> bool:
+        """Check idle age, message count and liveness (NOOP)"""
+        if time.monotonic() - conn.last_used > self.idle_timeout:
+            return False
+        if conn.messages_sent >= self.max_messages:
+            return False
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _discard(self, conn: _PooledConnection):
+        self._count('discarded')
+        self._quit(conn.smtp)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _mark_in_use(self, delta: int):
+        with self._lock:
+            self._in_use += delta
+
+    @staticmethod
+    def _quit(smtp: smtplib.SMTP):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+
 class EmailService:
     """
     Manages email sending via SMTP
     """
-    
+
+    def __init__(self):
+        self._settings: Mapping[str, object] = os.environ
+        self._pool: Optional[SMTPConnectionPool] = None
+        self._pool_key = None
+        self._pool_lock = threading.Lock()
+
+    def configure(self, settings: Mapping[str, object]):
+        """
+        Read SMTP and SMTP_POOL_* settings from ``settings`` (e.g. the app
+        config) instead of the environment
+
+        The pool is rebuilt on its next use if the settings changed it.
+        """
+        self._settings = settings
+
     def send_email(self, subject: str, body: str, recipient_email: str) -> bool:
         """
         Send email via SMTP
-        
+
         Args:
             subject: Email subject
             body: Email body content
             recipient_email: Recipient email address
-            
+
         Returns:
             True if successful, raises exception otherwise
         """
-        import os
-        
-        # Get configuration from environment
-        smtp_host = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_pass = os.environ.get('SMTP_PASSWORD')
-        
-        if not smtp_user or not smtp_pass:
-            raise RuntimeError("SMTP_USER and SMTP_PASSWORD must be set in environment")
-        
-        # Validate emails
-        if not is_valid_email(smtp_user):
-            raise ValueError(f"Invalid sender email: {smtp_user}")
-        
+        pool = self._get_pool()
+
         if not is_valid_email(recipient_email):
             raise ValueError(f"Invalid recipient email: {recipient_email}")
-        
-        # Create email message
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["From"] = smtp_user
-        msg["To"] = recipient_email
-        msg.set_content(body)
-        
+
+        msg = self.build_message(subject, body, pool.user, recipient_email)
+
         # Send email
         try:
-            with smtplib.SMTP(smtp_host, smtp_port) as smtp:
-                smtp.starttls()
-                smtp.login(smtp_user, smtp_pass)
-                smtp.send_message(msg)
-            
+            self._deliver(pool, msg)
+
             _safe_log(f"Email sent successfully to {recipient_email}")
             return True
-        
+
         except smtplib.SMTPAuthenticationError as e:
             _safe_log(f"SMTP authentication failed: {e}", 'error')
             raise RuntimeError("Email authentication failed. Please check SMTP credentials.")
-        
+
         except smtplib.SMTPException as e:
             _safe_log(f"SMTP error: {e}", 'error')
             raise RuntimeError(f"Failed to send email: {str(e)}")
-        
+
         except Exception as e:
             _safe_log(f"Unexpected error sending email: {e}", 'error')
             raise RuntimeError(f"Unexpected error: {str(e)}")
 
+    def send_bulk(self, subject: str, body: str, recipients: Iterable[str],
+                  results: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Send the same email to many recipients over pooled connections
+
+        The MIME message is built and serialized once; only the ``To``
+        header differs per recipient. A connection is held for the whole
+        batch and rotated when it reaches the pool's message cap.
+
+        Args:
+            subject: Email subject
+            body: Email body content
+            recipients: Recipient email addresses
+            results: Optional list that results are appended to as they
+                are produced, so the caller keeps them if the batch raises
+
+        Returns:
+            Per-recipient results: {'email', 'status' ('sent'|'failed'), 'error'}
+        """
+        pool = self._get_pool()
+        payload = self._serialize_shared(subject, body, pool.user)
+
+        def render(recipient_email: str) -> bytes:
+            return b'To: ' + recipient_email.encode('ascii') + b'\r\n' + payload
+
+        return self._send_batch(pool, ((r, render) for r in recipients), results)
+
+    def send_personalized(self, messages: Iterable[Tuple[str, str, str]],
+                          results: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Send individually rendered emails over pooled connections
+
+        Args:
+            messages: (recipient_email, subject, body) tuples
+            results: Optional list that results are appended to as they
+                are produced, so the caller keeps them if the batch raises
+
+        Returns:
+            Per-recipient results: {'email', 'status' ('sent'|'failed'), 'error'}
+        """
+        pool = self._get_pool()
+
+        def renderer(subject: str, body: str) -> Callable[[str], bytes]:
+            def render(recipient_email: str) -> bytes:
+                msg = self.build_message(subject, body, pool.user, recipient_email)
+                return msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+            return render
+
+        return self._send_batch(pool, ((r, renderer(s, b)) for r, s, b in messages), results)
+
+    def _send_batch(self, pool: SMTPConnectionPool,
+                    items: Iterable[Tuple[str, Callable[[str], bytes]]],
+                    results: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Send (recipient, render) items holding one connection at a time
+
+        The connection is rotated when it reaches the pool's message cap
+        and replaced once if it drops mid-send. A message that cannot be
+        rendered (e.g. a header with a line break) fails only its own
+        recipient. Results are appended to ``results`` in item order.
+        """
+        if results is None:
+            results = []
+        conn = None
+        fatal_error = ''
+
+        try:
+            for recipient_email, render in items:
+                if fatal_error:
+                    results.append(_bulk_result(recipient_email, fatal_error))
+                    continue
+
+                if not is_valid_email(recipient_email):
+                    results.append(_bulk_result(recipient_email, 'Invalid email format'))
+                    continue
+
+                try:
+                    data = render(recipient_email)
+                except Exception as e:
+                    results.append(_bulk_result(recipient_email, f"Invalid message: {str(e)}"))
+                    continue
+
+                for attempt in range(2):
+                    if conn is None:
+                        try:
+                            conn = pool.acquire()
+                        except smtplib.SMTPAuthenticationError as e:
+                            _safe_log(f"SMTP authentication failed: {e}", 'error')
+                            fatal_error = "Email authentication failed. Please check SMTP credentials."
+                        except Exception as e:
+                            _safe_log(f"SMTP connection failed: {e}", 'error')
+                            fatal_error = f"Failed to connect to SMTP server: {str(e)}"
+                        if fatal_error:
+                            results.append(_bulk_result(recipient_email, fatal_error))
+                            break
+
+                    lost = None
+                    try:
+                        conn.smtp.sendmail(pool.user, [recipient_email], data)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                        # Recipient refused or data rejected; connection is still usable
+                        results.append(_bulk_result(recipient_email, str(e)))
+                    except smtplib.SMTPServerDisconnected as e:
+                        lost = e
+                    except smtplib.SMTPException as e:
+                        # Any other SMTP error fails this message only; the
+                        # connection is not trusted for the next one
+                        pool.release(conn, reusable=False)
+                        conn = None
+                        results.append(_bulk_result(recipient_email, str(e)))
+                    except OSError as e:
+                        # Socket error: the connection is gone
+                        lost = e
+                    else:
+                        conn.messages_sent += 1
+                        results.append(_bulk_result(recipient_email))
+                        if conn.messages_sent >= pool.max_messages:
+                            pool.release(conn)
+                            conn = None
+
+                    if lost is not None:
+                        pool.release(conn, reusable=False)
+                        conn = None
+                        if not attempt:
+                            pool.record_reconnect()
+                            continue
+                        results.append(_bulk_result(recipient_email, f"Connection lost: {str(lost)}"))
+                    break
+        finally:
+            if conn is not None:
+                pool.release(conn)
+
+        sent = sum(1 for result in results if result['status'] == 'sent')
+        _safe_log(f"Bulk send finished: {sent}/{len(results)} delivered")
+        return results
+
+    def build_message(self, subject: str, body: str, sender: str, recipient_email: str) -> EmailMessage:
+        """Create the MIME message for one recipient"""
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = sender
+        msg["To"] = recipient_email
+        msg.set_content(body)
+        return msg
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """Return SMTP connection pool statistics"""
+        pool = self._pool
+        if pool is None:
+            return {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0,
+                    'idle': 0, 'in_use': 0, 'max_size': 0}
+        return pool.get_stats()
+
+    def close(self):
+        """Close pooled SMTP connections"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+
+    def _deliver(self, pool: SMTPConnectionPool, msg: EmailMessage):
+        """
+        Send a message on a pooled connection
+
+        A connection that drops mid-send is discarded and the message is
+        retried once on a fresh connection.
+        """
+        for attempt in range(2):
+            conn = pool.acquire()
+            try:
+                conn.smtp.send_message(msg)
+            except smtplib.SMTPResponseException:
+                # Server answered; smtplib has already reset the transaction
+                pool.release(conn)
+                raise
+            except smtplib.SMTPRecipientsRefused:
+                pool.release(conn)
+                raise
+            except smtplib.SMTPServerDisconnected:
+                pool.release(conn, reusable=False)
+                if attempt:
+                    raise
+                pool.record_reconnect()
+                continue
+            except smtplib.SMTPException:
+                # SMTPException subclasses OSError, but other SMTP errors are
+                # not dropped connections: fail the message without a retry
+                pool.release(conn, reusable=False)
+                raise
+            except OSError:
+                # Socket error: the connection dropped
+                pool.release(conn, reusable=False)
+                if attempt:
+                    raise
+                pool.record_reconnect()
+                continue
+            except BaseException:
+                pool.release(conn, reusable=False)
+                raise
+
+            conn.messages_sent += 1
+            pool.release(conn)
+            return
+
+    def _serialize_shared(self, subject: str, body: str, sender: str) -> bytes:
+        """Serialize a message without its ``To`` header for bulk reuse"""
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = sender
+        msg.set_content(body)
+        return msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+    def _get_pool(self) -> SMTPConnectionPool:
+        """Return the connection pool, rebuilding it if SMTP settings changed"""
+        # Get configuration (app config once configured, else environment)
+        settings = self._settings
+        smtp_host = settings.get('SMTP_HOST', 'smtp.gmail.com')
+        smtp_port = int(settings.get('SMTP_PORT', 587))
+        smtp_user = settings.get('SMTP_USER')
+        smtp_pass = settings.get('SMTP_PASSWORD')
+
+        if not smtp_user or not smtp_pass:
+            raise RuntimeError("SMTP_USER and SMTP_PASSWORD must be set in environment")
+
+        if not is_valid_email(smtp_user):
+            raise ValueError(f"Invalid sender email: {smtp_user}")
+
+        max_size = int(settings.get('SMTP_POOL_SIZE', 4))
+        idle_timeout = float(settings.get('SMTP_POOL_IDLE_TIMEOUT', 60))
+        max_messages = int(settings.get('SMTP_POOL_MAX_MESSAGES', 100))
+
+        key = (smtp_host, smtp_port, smtp_user, smtp_pass, max_size, idle_timeout, max_messages)
+        with self._pool_lock:
+            if self._pool is None or self._pool_key != key:
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool = SMTPConnectionPool(
+                    smtp_host,
+                    smtp_port,
+                    smtp_user,
+                    smtp_pass,
+                    max_size=max_size,
+                    idle_timeout=idle_timeout,
+                    max_messages=max_messages
+                )
+                self._pool_key = key
+            return self._pool
+
 
 # Global email service instance
 email_service = EmailService()
@@ -0,0 +1,196 @@
+"""
+Feedback Rules
+Declarative feedback rules for template emails, compiled into one
+trigger matcher and a single-pass rewriter
+"""
+import re
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+from app.utils.aho_corasick import AhoCorasick
+
+
+class FeedbackRule(NamedTuple):
+    """
+    One feedback transformation
+
+    Attributes:
+        name: Rule (feedback class) name
+        triggers: Lowercase substrings of the feedback that activate the rule
+        rewrites: (old, new) replacements applied to the email
+        replace_body: Template (with {topic}) that replaces the whole email
+        append: Text appended to the email
+    """
+    name: str
+    triggers: Tuple[str, ...]
+    rewrites: Tuple[Tuple[str, str], ...] = ()
+    replace_body: Optional[str] = None
+    append: str = ''
+
+
+CONCISE_BODY = """Subject: {topic}
+
+Dear [Recipient],
+
+I hope you're well.
+
+I'm writing regarding {topic}. This is an important matter that I'd like to discuss with you.
+
+Please let me know when you're available to connect.
+
+Best regards,
+[Your Name]"""
+
+# Rules in application order: a later rule's rewrite wins when two active
+# rules rewrite the same text
+FEEDBACK_RULES: Tuple[FeedbackRule, ...] = (
+    FeedbackRule(
+        name='concise',
+        triggers=('shorter', 'brief', 'concise'),
+        replace_body=CONCISE_BODY
+    ),
+    FeedbackRule(
+        name='formal',
+        triggers=('formal', 'professional'),
+        rewrites=(
+            ('Hi', 'Dear'),
+            ("Hope you're doing well", 'I trust this email finds you in good health'),
+            ('Best regards', 'Sincerely'),
+            ('Thanks', 'Thank you'),
+        )
+    ),
+    FeedbackRule(
+        name='casual',
+        triggers=('casual', 'friendly'),
+        rewrites=(
+            ('Dear [Recipient]', 'Hi [Recipient]'),
+            ('Sincerely', 'Best'),
+            ('I trust this email finds you in good health', "Hope you're doing great"),
+        )
+    ),
+    FeedbackRule(
+        name='urgent',
+        triggers=('urgent', 'important'),
+        rewrites=(
+            ('Subject:', 'Subject: [URGENT]'),
+            ('I hope', 'I urgently need to discuss'),
+        )
+    ),
+    FeedbackRule(
+        name='detail',
+        triggers=('detail', 'elaborate'),
+        append="""\n\nAdditional Context:
+This matter requires careful consideration and I believe your input would be valuable in moving forward effectively.
+
+I'm happy to provide any additional information you might need to help with this request."""
+    ),
+)
+
+
+class FeedbackRuleEngine:
+    """
+    Applies a rule table to template emails
+
+    All triggers of all rules are compiled into one Aho-Corasick
+    automaton, so the feedback is scanned once (and the result memoized,
+    since feedback strings repeat). The rewrites of the rules it
+    activates are merged into one alternation regex (longest phrase
+    first) and applied in a single pass over the email; the compiled
+    rewriter is cached per combination of active rules.
+    """
+
+    def __init__(self, rules: Tuple[FeedbackRule, ...] = FEEDBACK_RULES, cache_size: int = 256):
+        self.rules = tuple(rules)
+        self.cache_size = cache_size
+        self._matcher = AhoCorasick(
+            (trigger, index) for index, rule in enumerate(self.rules) for trigger in rule.triggers
+        )
+        self._lock = threading.Lock()
+        self._active_cache: Dict[str, Tuple[int, ...]] = {}
+        self._rewriters: Dict[Tuple[int, ...], Optional[Tuple[Pattern, Dict[str, str]]]] = {}
+
+    @property
+    def keywords(self) -> Dict[str, List[str]]:
+        """Triggers by rule name"""
+        return {rule.name: list(rule.triggers) for rule in self.rules}
+
+    def match(self, feedback: str) -> List[FeedbackRule]:
+        """Rules activated by the feedback, in table order"""
+        return [self.rules[i] for i in self._active(feedback)]
+
+    def apply(self, email_content: str, feedback: str, topic: str) -> str:
+        """
+        Apply every rule the feedback activates
+
+        Args:
+            email_content: Email to transform
+            feedback: User feedback
+            topic: Email topic (for body replacements)
+
+        Returns:
+            Transformed email
+        """
+        return self.prepare(feedback)(email_content, topic)
+
+    def prepare(self, feedback: str) -> Callable[[str, str], str]:
+        """
+        Resolve the feedback once for many emails
+
+        Args:
+            feedback: User feedback
+
+        Returns:
+            Function of (email_content, topic) returning the transformed email
+        """
+        active = self._active(feedback)
+        if not active:
+            return lambda email_content, topic: email_content
+
+        replace_body = None
+        for index in active:
+            if self.rules[index].replace_body is not None:
+                replace_body = self.rules[index].replace_body
+        rewriter = self._rewriter(active)
+        appendix = ''.join(self.rules[index].append for index in active)
+
+        def transform(email_content: str, topic: str) -> str:
+            if replace_body is not None:
+                email_content = replace_body.format(topic=topic)
+            if rewriter is not None:
+                pattern, replacements = rewriter
+                email_content = pattern.sub(lambda m: replacements[m.group(0)], email_content)
+            return email_content + appendix if appendix else email_content
+
+        return transform
+
+    def _active(self, feedback: str) -> Tuple[int, ...]:
+        """Indices of the rules the feedback activates, in table order"""
+        feedback = feedback.lower()
+        active = self._active_cache.get(feedback)
+        if active is None:
+            active = tuple(sorted({index for _, _, index in self._matcher.iter_matches(feedback)}))
+            with self._lock:
+                if len(self._active_cache) >= self.cache_size:
+                    self._active_cache.clear()
+                self._active_cache[feedback] = active
+        return active
+
+    def _rewriter(self, active: Tuple[int, ...]) -> Optional[Tuple[Pattern, Dict[str, str]]]:
+        """Compiled (pattern, replacements) for a set of active rules"""
+        with self._lock:
+            if active in self._rewriters:
+                return self._rewriters[active]
+
+        replacements: Dict[str, str] = {}
+        for index in active:
+            replacements.update(self.rules[index].rewrites)
+
+        rewriter = None
+        if replacements:
+            alternatives = sorted(replacements, key=len, reverse=True)
+            rewriter = (re.compile('|'.join(re.escape(old) for old in alternatives)), replacements)
+
+        with self._lock:
+            if len(self._rewriters) >= self.cache_size:
+                self._rewriters.clear()
+            self._rewriters[active] = rewriter
+        return rewriter
@@ -0,0 +1,355 @@
+"""
+LLM Provider Service
+Chat model backends behind one interface: Groq, OpenAI-compatible HTTP,
+and a deterministic local stub for offline benchmarking
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "🤖"
+        print(f"{emoji} {message}")
+
+
+PROVIDERS = ('groq', 'openai', 'stub')
+
+
+class LLMProviderError(RuntimeError):
+    """Raised when a provider request fails"""
+
+
+class LLMProvider:
+    """
+    Base class for chat model backends
+
+    Providers mirror the LangChain chat model surface that LLMService
+    uses: ``invoke`` returns a message with ``content``, ``stream`` yields
+    chunks with ``content`` and ``batch`` maps ``invoke`` over many
+    prompts. Subclasses implement ``invoke`` and ``stream``.
+    """
+
+    name = 'base'
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        """Provider-qualified model name (used in cache keys and stats)"""
+        return f"{self.name}:{self.model}"
+
+    def invoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        raise NotImplementedError
+
+    def stream(self, messages: Sequence[BaseMessage]) -> Iterator[AIMessageChunk]:
+        raise NotImplementedError
+
+    def batch(self, inputs: List[Sequence[BaseMessage]], config: Optional[dict] = None,
+              return_exceptions: bool = False) -> List[Any]:
+        """
+        Invoke every prompt, at most ``config['max_concurrency']`` at once
+
+        Returns:
+            Responses in input order; failures are returned in place when
+            ``return_exceptions`` is True and raised otherwise
+        """
+        if not inputs:
+            return []
+        max_concurrency = max(1, int((config or {}).get('max_concurrency') or len(inputs)))
+
+        def call(messages):
+            try:
+                return self.invoke(messages)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(inputs))) as executor:
+            return list(executor.map(call, inputs))
+
+
+class GroqProvider(LLMProvider):
+    """Groq chat models through langchain-groq"""
+
+    name = 'groq'
+
+    def __init__(self, model: str, api_key: str, timeout: Optional[float] = None):
+        super().__init__(model)
+        from langchain_groq import ChatGroq
+        self.client = ChatGroq(model=model, groq_api_key=api_key, timeout=timeout)
+
+    def invoke(self, messages):
+        return self.client.invoke(messages)
+
+    def stream(self, messages):
+        return self.client.stream(messages)
+
+    def batch(self, inputs, config=None, return_exceptions=False):
+        return self.client.batch(inputs, config=config, return_exceptions=return_exceptions)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any server speaking the OpenAI chat completions API
+
+    Talks to ``<base_url>/chat/completions`` with the standard library,
+    so vLLM, llama.cpp, Ollama and hosted OpenAI-compatible endpoints work
+    without extra dependencies.
+    """
+
+    name = 'openai'
+
+    _ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+
+    def __init__(self, model: str, base_url: str, api_key: str = '',
+                 timeout: Optional[float] = None, temperature: Optional[float] = None):
+        super().__init__(model)
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.temperature = temperature
+
+    def invoke(self, messages):
+        with self._post(messages, stream=False) as response:
+            payload = json.loads(response.read().decode('utf-8'))
+        try:
+            content = payload['choices'][0]['message'].get('content') or ''
+        except (KeyError, IndexError, TypeError):
+            raise LLMProviderError(f"Unexpected completion payload: {str(payload)[:200]}")
+        return AIMessage(content=content)
+
+    def stream(self, messages):
+        with self._post(messages, stream=True) as response:
+            for raw in response:
+                line = raw.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return
+                try:
+                    delta = json.loads(data)['choices'][0].get('delta') or {}
+                except (ValueError, KeyError, IndexError):
+                    continue
+                text = delta.get('content')
+                if text:
+                    yield AIMessageChunk(content=text)
+
+    def _post(self, messages, stream: bool):
+        body = {
+            'model': self.model,
+            'messages': [
+                {'role': self._ROLES.get(m.type, 'user'), 'content': m.content}
+                for m in messages
+            ],
+            'stream': stream
+        }
+        if self.temperature is not None:
+            body['temperature'] = self.temperature
+
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(body).encode('utf-8'),
+            headers=headers,
+            method='POST'
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode('utf-8', 'replace')[:200]
+            raise LLMProviderError(f"HTTP {e.code} from {self.base_url}: {detail}")
+        except urllib.error.URLError as e:
+            raise LLMProviderError(f"Cannot reach {self.base_url}: {e.reason}")
+
+
+def parse_latency_spec(spec: str) -> Tuple[str, Tuple[float, ...]]:
+    """
+    Parse a latency distribution such as ``"lognormal:0.4,0.5"``
+
+    Supported forms (seconds):
+        fixed:<value>
+        uniform:<low>,<high>
+        lognormal:<median>,<sigma>
+        exponential:<mean>
+
+    Returns:
+        Tuple of (kind, params)
+    """
+    kind, _, args = (spec or 'fixed:0').partition(':')
+    kind = kind.strip().lower()
+    try:
+        params = tuple(float(a) for a in args.split(',') if a.strip())
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    arity = {'fixed': 1, 'uniform': 2, 'lognormal': 2, 'exponential': 1}
+    if kind not in arity or len(params) != arity[kind]:
+        raise ValueError(f"Invalid latency spec: {spec!r}")
+    return kind, params
+
+
+_STUB_WORDS = (
+    'thank', 'you', 'for', 'your', 'time', 'we', 'would', 'like', 'to', 'share',
+    'an', 'update', 'on', 'the', 'project', 'and', 'next', 'steps', 'please',
+    'let', 'me', 'know', 'if', 'this', 'works', 'team', 'schedule', 'review',
+    'meeting', 'details', 'below', 'happy', 'discuss', 'further', 'at', 'convenience'
+)
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic local backend for load tests and benchmarks
+
+    The reply text depends only on the prompt, so repeated runs produce
+    identical drafts. Latency, streaming speed and failures are drawn from
+    a seeded generator: the time to first token follows ``latency``
+    (see ``parse_latency_spec``), tokens then arrive at
+    ``tokens_per_second`` (0 = instantly) and ``error_rate`` of calls fail
+    with LLMProviderError.
+    """
+
+    name = 'stub'
+
+    def __init__(self, model: str = 'echo', latency: str = 'fixed:0', tokens_per_second: float = 0.0,
+                 output_tokens: int = 120, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(model)
+        self.latency_kind, self.latency_params = parse_latency_spec(latency)
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = max(1, output_tokens)
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        tokens = self._reply_tokens(messages)
+        first_token, fail = self._draw()
+        duration = first_token
+        if self.tokens_per_second > 0:
+            duration += len(tokens) / self.tokens_per_second
+        time.sleep(duration)
+        if fail:
+            raise LLMProviderError("Injected stub failure")
+        return AIMessage(content=''.join(tokens))
+
+    def stream(self, messages):
+        tokens = self._reply_tokens(messages)
+        first_token, fail = self._draw()
+        time.sleep(first_token)
+        if fail:
+            raise LLMProviderError("Injected stub failure")
+
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for index, token in enumerate(tokens):
+            if interval and index:
+                time.sleep(interval)
+            yield AIMessageChunk(content=token)
+
+    def _draw(self) -> Tuple[float, bool]:
+        """Draw (time to first token, fail) from the seeded generator"""
+        with self._lock:
+            kind, params = self.latency_kind, self.latency_params
+            if kind == 'fixed':
+                latency = params[0]
+            elif kind == 'uniform':
+                latency = self._rng.uniform(params[0], params[1])
+            elif kind == 'lognormal':
+                latency = self._rng.lognormvariate(math.log(max(params[0], 1e-9)), params[1])
+            else:
+                latency = self._rng.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return max(0.0, latency), fail
+
+    def _reply_tokens(self, messages) -> List[str]:
+        """Build a prompt-seeded email as a list of word tokens"""
+        prompt = messages[-1].content if messages else ''
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+
+        topic = prompt.split('\n', 1)[0].replace('Email Topic/Purpose:', '').strip() or 'Update'
+        words = [rng.choice(_STUB_WORDS) for _ in range(self.output_tokens)]
+        body = ' '.join(words).capitalize()
+
+        text = f"Subject: {topic[:60]}\n\nHello,\n\n{body}.\n\nBest regards,\n[Your Name]"
+        pieces = text.split(' ')
+        return [piece + ' ' for piece in pieces[:-1]] + [pieces[-1]]
+
+
+def split_model_spec(model_spec: str, default_provider: str = 'groq') -> Tuple[str, str]:
+    """
+    Split ``"provider:model"`` into its parts
+
+    Model names without a known provider prefix keep the default provider,
+    so plain Groq model names continue to work.
+    """
+    prefix, sep, rest = (model_spec or '').partition(':')
+    if sep and prefix.lower() in PROVIDERS:
+        return prefix.lower(), rest
+    return default_provider, model_spec
+
+
+def create_provider(model_spec: str, provider: Optional[str] = None,
+                    timeout: Optional[float] = None) -> Optional[LLMProvider]:
+    """
+    Build a provider from a model spec and the environment
+
+    Args:
+        model_spec: Model name, optionally prefixed with ``provider:``
+        provider: Provider name (LLM_PROVIDER); the model prefix wins
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        LLMProvider, or None when the provider lacks credentials
+    """
+    name, model = split_model_spec(model_spec, (provider or 'groq').lower())
+
+    if name == 'groq':
+        api_key = os.environ.get('GROQ_API_KEY')
+        if not api_key:
+            _safe_log("GROQ_API_KEY not set, using template fallback")
+            return None
+        return GroqProvider(model, api_key, timeout=timeout)
+
+    if name == 'openai':
+        return OpenAICompatibleProvider(
+            model,
+            base_url=os.environ.get('LLM_API_BASE', 'https://api.openai.com/v1'),
+            api_key=os.environ.get('LLM_API_KEY', ''),
+            timeout=timeout
+        )
+
+    if name == 'stub':
+        return StubProvider(
+            model or 'echo',
+            latency=os.environ.get('LLM_STUB_LATENCY', 'fixed:0'),
+            tokens_per_second=float(os.environ.get('LLM_STUB_TOKENS_PER_SECOND', 0)),
+            output_tokens=int(os.environ.get('LLM_STUB_OUTPUT_TOKENS', 120)),
+            error_rate=float(os.environ.get('LLM_STUB_ERROR_RATE', 0)),
+            seed=int(os.environ.get('LLM_STUB_SEED', 0))
+        )
+
+    raise ValueError(f"Unknown LLM provider: {name!r} (expected one of {', '.join(PROVIDERS)})")
@@ -1,11 +1,26 @@
 """
 LLM Service
-Handles AI-powered email content generation using LangChain and Groq
+Handles AI-powered email content generation through pluggable providers
 """
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
+from app.services.cache_service import GenerationCache, make_cache_key
+from app.services.prompt_service import estimate_tokens, prompt_builder
+from app.services.router_service import DRAFT, REFINE, ModelRouter
+from app.services.similarity_service import SimilarityIndex
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.singleflight import SingleFlight
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, Iterator, List, Optional
 import os
+import threading
+import time
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a generation cannot finish before its deadline"""
+    
+    def __init__(self, message: str, reason: str = 'timeout'):
+        super().__init__(message)
+        self.reason = reason
 
 
 class LLMService:
@@ -15,6 +30,16 @@ class LLMService:
     
     def __init__(self):
         self.llm = None
+        self.model = None
+        self.router = None
+        self.cache = None
+        self.similar = None
+        self.breaker = None
+        self.timeout = float(os.environ.get('LLM_TIMEOUT', 20))
+        self._inflight = SingleFlight()
+        self._executor = None
+        self._fallback_lock = threading.Lock()
+        self._fallbacks = {'unavailable': 0, 'breaker_open': 0, 'deadline': 0, 'timeout': 0, 'error': 0}
         self._initialized = False
     
     def _initialize_llm(self):
@@ -23,31 +48,63 @@ class LLMService:
             return
         
         try:
-            api_key = os.environ.get('GROQ_API_KEY')
-            model = os.environ.get('LLM_MODEL', 'llama-3.1-8b-instant')
+            # Model specs may carry a provider prefix, e.g. "stub:fast"
+            self.router = ModelRouter.from_env(timeout=self.timeout)
             
-            if api_key:
-                self.llm = ChatGroq(
-                    model=model,
-                    groq_api_key=api_key
-                )
-                print(f"✅ LLM initialized successfully: {model}")
-            else:
-                print("⚠️  GROQ_API_KEY not set, using template fallback")
+            if self.router is not None:
+                self.llm = self.router.primary
+                self.model = self.llm.model_id
+                print(f"✅ LLM initialized successfully: {', '.join(self.router.providers)}")
         except Exception as e:
             print(f"❌ Failed to initialize LLM: {e}")
+            self.router = None
             self.llm = None
         
+        # Keep a cache assigned before initialization (pluggable)
+        if self.cache is None:
+            self.cache = GenerationCache.from_env()
+        
+        if self.similar is None:
+            self.similar = SimilarityIndex.from_env()
+        
+        if self.breaker is None:
+            self.breaker = CircuitBreaker(
+                window_size=int(os.environ.get('LLM_BREAKER_WINDOW', 20)),
+                min_calls=int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5)),
+                error_rate_threshold=float(os.environ.get('LLM_BREAKER_ERROR_RATE', 0.5)),
+                slow_call_seconds=float(os.environ.get('LLM_BREAKER_SLOW_CALL', 10)),
+                slow_rate_threshold=float(os.environ.get('LLM_BREAKER_SLOW_RATE', 0.5)),
+                open_seconds=float(os.environ.get('LLM_BREAKER_OPEN_SECONDS', 30)),
+                half_open_max_calls=int(os.environ.get('LLM_BREAKER_HALF_OPEN_CALLS', 1))
+            )
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('LLM_MAX_WORKERS', 16)),
+                thread_name_prefix='llm'
+            )
+        
         self._initialized = True
     
-    def generate_email(self, topic: str, feedback: str = "", previous_content: str = "") -> str:
+    def generate_email(self, topic: str, feedback: str = "", previous_content: str = "",
+                       use_cache: bool = True, deadline: Optional[float] = None) -> str:
         """
         Generate email content using LLM or fallback to templates
         
+        The model is chosen by the router: first drafts and refinements
+        have their own routes, and a failing model falls through to the
+        next one while time remains. The template is used straight away
+        while the circuit breaker is open or when the time left before
+        ``deadline`` is shorter than recent model latency; a call still
+        running at the deadline is abandoned in favour of the template.
+        
         Args:
             topic: Email topic/purpose
             feedback: User feedback for refinement
             previous_content: Previous draft content
+            use_cache: False to skip the cache lookup (the result is still stored)
+            deadline: time.monotonic() value by which an answer is needed
+                      (defaults to now + LLM_TIMEOUT)
             
         Returns:
             Generated email content
@@ -58,69 +115,503 @@ class LLMService:
         
         if self.llm is None:
             print("ℹ️  LLM not available, using template generation")
-            from app.services.template_service import template_service
-            return template_service.generate_email(topic, feedback)
+            return self._fallback('unavailable', topic, feedback)
+        
+        cached = self._cached(topic, feedback, previous_content) if use_cache else None
+        if cached is not None:
+            print(f"✅ Served cached email for topic: {topic[:50]}...")
+            return cached
+        
+        similar = self._similar_draft(topic, feedback, previous_content) if use_cache else None
+        if similar is not None:
+            print(f"✅ Reused draft of a similar topic for: {topic[:50]}...")
+            return similar
+        
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
         
         try:
-            prompt = self._build_prompt()
+            # Identical concurrent requests share one upstream call
+            content, shared = self._inflight.do(
+                self._flight_key(topic, feedback, previous_content),
+                lambda: self._guarded_invoke(topic, feedback, previous_content, deadline)
+            )
             
-            chat_prompt = ChatPromptTemplate.from_messages([
-                SystemMessage(content=prompt),
-                HumanMessage(content=self._build_user_message(topic, feedback, previous_content))
-            ])
+            if shared:
+                print(f"✅ Joined in-flight generation for topic: {topic[:50]}...")
+            else:
+                print(f"✅ Email generated successfully for topic: {topic[:50]}...")
+            return content
+        
+        except CircuitOpenError:
+            print("⚠️  LLM circuit open, using template generation")
+            return self._fallback('breaker_open', topic, feedback)
+        
+        except DeadlineExceededError as e:
+            print(f"⚠️  {e}, using template generation")
+            return self._fallback(e.reason, topic, feedback)
+        
+        except Exception as e:
+            print(f"❌ LLM generation failed: {e}")
+            return self._fallback('error', topic, feedback)
+    
+    def stream_email(self, topic: str, feedback: str = "", previous_content: str = "",
+                     use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream email content as it is generated
+        
+        Cache hits and template fallbacks are yielded as a single chunk.
+        If the model fails before producing any text the template is used;
+        a failure mid-stream is raised to the caller. A model that fails
+        before its first chunk falls through to the next routed model. The
+        circuit breaker
+        applies as in ``generate_email``, with time to first chunk as the
+        measured latency; the whole stream is bounded by LLM_TIMEOUT at
+        the HTTP client.
+        
+        Args:
+            topic: Email topic/purpose
+            feedback: User feedback for refinement
+            previous_content: Previous draft content
+            use_cache: False to skip the cache lookup (the result is still stored)
             
-            final_prompt = chat_prompt.format_messages()
-            response = self.llm.invoke(final_prompt)
+        Yields:
+            Text chunks of the generated email
+        """
+        # Lazy initialization
+        if not self._initialized:
+            self._initialize_llm()
+        
+        if self.llm is None:
+            print("ℹ️  LLM not available, using template generation")
+            yield self._fallback('unavailable', topic, feedback)
+            return
+        
+        cached = self._cached(topic, feedback, previous_content) if use_cache else None
+        if cached is not None:
+            print(f"✅ Served cached email for topic: {topic[:50]}...")
+            yield cached
+            return
+        
+        similar = self._similar_draft(topic, feedback, previous_content) if use_cache else None
+        if similar is not None:
+            print(f"✅ Reused draft of a similar topic for: {topic[:50]}...")
+            yield similar
+            return
+        
+        if not self.breaker.allow_request():
+            print("⚠️  LLM circuit open, using template generation")
+            yield self._fallback('breaker_open', topic, feedback)
+            return
+        
+        # Every admitted call ends in exactly one record_* or a release
+        recorded = False
+        try:
+            final_prompt = self._build_messages(topic, feedback, previous_content)
+            parts = []
+            start = time.monotonic()
+            first_chunk_latency = None
             
-            content = response.content if hasattr(response, "content") else str(response)
+            for provider in self._route(final_prompt, feedback, previous_content):
+                attempt_start = time.monotonic()
+                try:
+                    for chunk in provider.stream(final_prompt):
+                        text = chunk.content if hasattr(chunk, "content") else str(chunk)
+                        if text:
+                            if first_chunk_latency is None:
+                                first_chunk_latency = time.monotonic() - start
+                            parts.append(text)
+                            yield text
+                
+                except GeneratorExit:
+                    # Client went away after the model had started answering
+                    self.router.record(provider.model_id, first_chunk_latency, ok=True)
+                    recorded = True
+                    self.breaker.record_success(first_chunk_latency)
+                    raise
+                
+                except Exception as e:
+                    self.router.record(provider.model_id, time.monotonic() - attempt_start, ok=False)
+                    if parts:
+                        recorded = True
+                        self.breaker.record_failure(first_chunk_latency)
+                        print(f"❌ LLM stream failed mid-generation: {e}")
+                        raise
+                    print(f"❌ LLM generation failed on {provider.model_id}: {e}")
+                    continue
+                
+                self.router.record(provider.model_id, time.monotonic() - attempt_start, ok=True)
+                break
             
-            print(f"✅ Email generated successfully for topic: {topic[:50]}...")
-            return content
+            else:
+                recorded = True
+                self.breaker.record_failure(time.monotonic() - start)
+                yield self._fallback('error', topic, feedback)
+                return
+            
+            recorded = True
+            self.breaker.record_success(first_chunk_latency or time.monotonic() - start)
+        
+        finally:
+            if not recorded:
+                self.breaker.release()
+        
+        content = ''.join(parts)
+        if content:
+            self._remember(provider.model_id, content, topic, feedback, previous_content)
+        
+        print(f"✅ Email streamed successfully for topic: {topic[:50]}...")
+    
+    def generate_batch(self, topics: List[str], max_concurrency: Optional[int] = None,
+                       use_cache: bool = True, deadline: Optional[float] = None) -> List[Dict[str, str]]:
+        """
+        Generate drafts for many topics concurrently
+        
+        Cached topics, and topics close enough to an earlier one, are
+        served directly; the rest go through the batch interface of the
+        routed draft models with at most ``max_concurrency`` requests in
+        flight. Items a model fails are retried on the next routed model,
+        as in ``generate_email``, until the deadline passes; items left
+        over fall back to templates individually, and every uncached item
+        does while the circuit breaker is open. The breaker counts the
+        batch as one call, which succeeds if any item did. Each model call
+        is bounded by LLM_TIMEOUT at the HTTP client.
+        
+        Args:
+            topics: Email topics, one draft each
+            max_concurrency: Concurrent LLM requests (LLM_BATCH_CONCURRENCY)
+            use_cache: False to skip cache lookups (results are still stored)
+            deadline: time.monotonic() value after which no further model
+                      is tried (defaults to now + LLM_TIMEOUT)
+            
+        Returns:
+            One result per topic, in order:
+            {'topic', 'content', 'source' ('llm'|'cache'|'template'), 'error'}
+        """
+        # Lazy initialization
+        if not self._initialized:
+            self._initialize_llm()
+        
+        from app.services.template_service import template_service
+        
+        def template_result(topic: str, error: str = '', reason: str = 'error') -> Dict[str, str]:
+            self._count_fallback(reason)
+            return {
+                'topic': topic,
+                'content': template_service.generate_email(topic),
+                'source': 'template',
+                'error': error
+            }
+        
+        def template_results(batch: List[str], error: str, reason: str) -> List[Dict[str, str]]:
+            self._count_fallback(reason, len(batch))
+            contents = template_service.render_many(batch)
+            return [
+                {'topic': topic, 'content': content, 'source': 'template', 'error': error}
+                for topic, content in zip(batch, contents)
+            ]
         
+        if self.llm is None:
+            print("ℹ️  LLM not available, using template generation")
+            return template_results(topics, '', 'unavailable')
+        
+        results: List[Optional[Dict[str, str]]] = [None] * len(topics)
+        pending = []
+        
+        for index, topic in enumerate(topics):
+            cached = (self._cached(topic) or self._similar_draft(topic)) if use_cache else None
+            if cached is not None:
+                results[index] = {'topic': topic, 'content': cached, 'source': 'cache', 'error': ''}
+                continue
+            pending.append((index, topic))
+        
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        
+        if pending:
+            remaining = deadline - time.monotonic()
+            expected = self.breaker.expected_latency()
+            if remaining <= 0 or (expected is not None and remaining < expected):
+                print("⚠️  Deadline too close for LLM batch, using template generation")
+                fallbacks = template_results([topic for _, topic in pending],
+                                             'Deadline too close for LLM call', 'deadline')
+                for (index, _), result in zip(pending, fallbacks):
+                    results[index] = result
+                pending = []
+        
+        if pending and not self.breaker.allow_request():
+            print("⚠️  LLM circuit open, using template generation")
+            fallbacks = template_results([topic for _, topic in pending],
+                                         'LLM circuit breaker is open', 'breaker_open')
+            for (index, _), result in zip(pending, fallbacks):
+                results[index] = result
+            pending = []
+        
+        llm_calls = len(pending)
+        if pending:
+            if max_concurrency is None:
+                max_concurrency = int(os.environ.get('LLM_BATCH_CONCURRENCY', 8))
+            
+            # One breaker slot was taken for the whole batch, so it records one outcome
+            succeeded = None
+            try:
+                prompts = {index: self._build_messages(topic, '', '') for index, topic in pending}
+                prompt_tokens = max(sum(estimate_tokens(m.content) for m in prompt)
+                                    for prompt in prompts.values())
+                errors = {}
+                
+                # Items a model fails move on to the next routed model
+                for provider in self.router.route(DRAFT, prompt_tokens):
+                    if not pending or time.monotonic() >= deadline:
+                        break
+                    
+                    try:
+                        responses = provider.batch(
+                            [prompts[index] for index, _ in pending],
+                            config={'max_concurrency': max(1, max_concurrency)},
+                            return_exceptions=True
+                        )
+                    except Exception as e:
+                        responses = [e] * len(pending)
+                    
+                    failed = []
+                    for (index, topic), response in zip(pending, responses):
+                        if isinstance(response, Exception):
+                            self.router.record(provider.model_id, None, ok=False)
+                            print(f"❌ LLM generation failed on {provider.model_id} for topic {topic[:50]}: {response}")
+                            errors[index] = str(response)
+                            failed.append((index, topic))
+                            continue
+                        
+                        self.router.record(provider.model_id, None, ok=True)
+                        succeeded = True
+                        content = response.content if hasattr(response, "content") else str(response)
+                        self._remember(provider.model_id, content, topic)
+                        results[index] = {'topic': topic, 'content': content, 'source': 'llm', 'error': ''}
+                    
+                    pending = failed
+                    if succeeded is None:
+                        succeeded = False
+                
+                for index, topic in pending:
+                    if index in errors:
+                        results[index] = template_result(topic, errors[index])
+                    else:
+                        results[index] = template_result(
+                            topic, 'LLM deadline reached before a model could run', 'deadline'
+                        )
+            
+            finally:
+                if succeeded is None:
+                    self.breaker.release()
+                elif succeeded:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+        
+        print(f"✅ Batch generated {len(topics)} emails ({llm_calls} sent to the LLM)")
+        return results
+    
+    def generate_speculative(self, topic: str, feedback: str = "",
+                             previous_content: str = "") -> Optional[str]:
+        """
+        Generate a refinement ahead of demand
+        
+        Unlike ``generate_email`` this never falls back to templates and
+        does nothing unless the circuit breaker is closed.
+        
+        Args:
+            topic: Email topic/purpose
+            feedback: Anticipated feedback (already compacted)
+            previous_content: Draft being refined
+            
+        Returns:
+            Generated content, or None if it could not be produced
+        """
+        # Lazy initialization
+        if not self._initialized:
+            self._initialize_llm()
+        
+        if self.llm is None or self.breaker.state != CircuitBreaker.CLOSED:
+            return None
+        
+        cached = self._cached(topic, feedback, previous_content)
+        if cached is not None:
+            return cached
+        
+        deadline = time.monotonic() + self.timeout
+        try:
+            content, _ = self._inflight.do(
+                self._flight_key(topic, feedback, previous_content),
+                lambda: self._guarded_invoke(topic, feedback, previous_content, deadline)
+            )
+            return content
         except Exception as e:
-            print(f"❌ LLM generation failed: {e}")
-            from app.services.template_service import template_service
-            return template_service.generate_email(topic, feedback)
-    
-    def _build_prompt(self) -> str:
-        """Build system prompt for email generation"""
-        return """
-        You are an Expert Email Writer Assistant specialized in creating professional, clear, and engaging emails.
-        Your job is to write or rewrite emails based on the given topic and human feedback.
-
-        Instructions:
-        - Write in proper email format with appropriate greeting, body, and closing
-        - Use a professional yet friendly tone that's suitable for business communication
-        - Keep the email concise, clear, and actionable
-        - Include appropriate subject line suggestions when relevant
-        - Apply any human feedback to improve the email's effectiveness
-        - Ensure the email serves its intended purpose (request, update, invitation, etc.)
-        - Use proper email etiquette and formatting
-
-        Email Structure Guidelines:
-        - Start with appropriate greeting (Dear [Name], Hi [Name], Hello, etc.)
-        - Clear and engaging opening line
-        - Well-organized body paragraphs with clear purpose
-        - Professional closing with call-to-action if needed
-        - Appropriate sign-off (Best regards, Sincerely, etc.)
-
-        Tone Guidelines:
-        - Professional yet approachable
-        - Clear and direct communication
-        - Respectful and courteous
-        - Action-oriented when applicable
-
-        Output Rule:
-        Return only the email content in proper email format — no extra explanations, notes, or commentary.
+            print(f"⚠️  Speculative generation skipped: {e}")
+            return None
+    
+    def in_flight(self) -> int:
+        """Number of distinct model calls currently running"""
+        return self._inflight.get_stats()['in_flight']
+    
+    def get_cache_stats(self) -> dict:
+        """Return generation cache statistics"""
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.get_stats()}
+    
+    def get_stats(self) -> dict:
+        """Return cache, request-coalescing, routing, circuit breaker and fallback statistics"""
+        with self._fallback_lock:
+            fallbacks = dict(self._fallbacks)
+        return {
+            'cache': self.get_cache_stats(),
+            'similar': self.similar.get_stats() if self.similar is not None else {'enabled': False},
+            'singleflight': self._inflight.get_stats(),
+            'provider': self.model,
+            'router': self.router.get_stats() if self.router is not None else None,
+            'breaker': self.breaker.get_stats() if self.breaker is not None else None,
+            'fallbacks': fallbacks,
+            'timeout': self.timeout
+        }
+    
+    def _guarded_invoke(self, topic: str, feedback: str, previous_content: str,
+                        deadline: float) -> str:
+        """
+        Run ``_invoke`` on the worker pool under the breaker and deadline
+        
+        Routed models are tried in order until one succeeds; the breaker
+        sees one outcome per request.
+        
+        Raises:
+            CircuitOpenError: The breaker rejected the call
+            DeadlineExceededError: Too little time left, or the call overran
         """
+        remaining = deadline - time.monotonic()
+        expected = self.breaker.expected_latency()
+        if remaining <= 0 or (expected is not None and remaining < expected):
+            raise DeadlineExceededError(
+                f"Deadline too close for LLM call ({max(remaining, 0):.1f}s left)", reason='deadline'
+            )
+        
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        
+        # Every admitted call ends in exactly one record_* or a release
+        recorded = False
+        try:
+            final_prompt = self._build_messages(topic, feedback, previous_content)
+            start = time.monotonic()
+            last_error = None
+            
+            for provider in self._route(final_prompt, feedback, previous_content):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                attempt_start = time.monotonic()
+                future = self._executor.submit(self._invoke, provider, final_prompt,
+                                               topic, feedback, previous_content)
+                try:
+                    content = future.result(timeout=remaining)
+                except FuturesTimeoutError:
+                    # A call already running finishes in the background and is still cached
+                    future.cancel()
+                    self.router.record(provider.model_id, time.monotonic() - attempt_start, ok=False)
+                    recorded = True
+                    self.breaker.record_failure(time.monotonic() - start)
+                    raise DeadlineExceededError(f"LLM call exceeded deadline ({remaining:.1f}s)", reason='timeout')
+                except Exception as e:
+                    self.router.record(provider.model_id, time.monotonic() - attempt_start, ok=False)
+                    print(f"❌ LLM generation failed on {provider.model_id}: {e}")
+                    last_error = e
+                    continue
+                
+                self.router.record(provider.model_id, time.monotonic() - attempt_start, ok=True)
+                recorded = True
+                self.breaker.record_success(time.monotonic() - start)
+                return content
+            
+            recorded = True
+            self.breaker.record_failure(time.monotonic() - start)
+            if last_error is not None:
+                raise last_error
+            raise DeadlineExceededError("LLM deadline reached before a fallback model could run", reason='timeout')
+        
+        finally:
+            if not recorded:
+                self.breaker.release()
     
-    def _build_user_message(self, topic: str, feedback: str, previous_content: str) -> str:
-        """Build user message with context"""
-        return f"""Email Topic/Purpose: {topic}
-
-Human Feedback for Improvement: {feedback or 'No specific feedback'}
-
-Previous Email Draft: {previous_content or 'No previous draft - create new email'}"""
+    def _fallback(self, reason: str, topic: str, feedback: str = "") -> str:
+        """Count the fallback and generate the email from templates"""
+        self._count_fallback(reason)
+        from app.services.template_service import template_service
+        return template_service.generate_email(topic, feedback)
+    
+    def _count_fallback(self, reason: str, count: int = 1):
+        with self._fallback_lock:
+            self._fallbacks[reason] = self._fallbacks.get(reason, 0) + count
+    
+    def _route(self, final_prompt: list, feedback: str, previous_content: str) -> list:
+        """Routed providers for a prompt (refinement if there is feedback or a draft)"""
+        kind = REFINE if feedback or previous_content else DRAFT
+        prompt_tokens = sum(estimate_tokens(m.content) for m in final_prompt)
+        return self.router.route(kind, prompt_tokens)
+    
+    def _cached(self, topic: str, feedback: str = "", previous_content: str = "") -> Optional[str]:
+        """
+        Look up a completion from any model this request can be routed to
+        
+        Completions are cached under the model that produced them, so
+        models of the request's route are tried in route order. Large
+        refinement prompts are sent to draft models, which are tried last.
+        """
+        if self.cache is None or self.router is None:
+            return None
+        models = self.router.models(DRAFT)
+        if feedback or previous_content:
+            refine = self.router.models(REFINE)
+            models = refine + [m for m in models if m not in refine]
+        for model_id in models:
+            cached = self.cache.get(make_cache_key(model_id, topic, feedback, previous_content))
+            if cached is not None:
+                return cached
+        return None
+    
+    def _flight_key(self, topic: str, feedback: str, previous_content: str) -> str:
+        """Request-coalescing key: identical inputs on the same route share a call"""
+        kind = REFINE if feedback or previous_content else DRAFT
+        return make_cache_key(kind, topic, feedback, previous_content)
+    
+    def _invoke(self, provider, final_prompt: list, topic: str,
+                feedback: str = "", previous_content: str = "") -> str:
+        """Call one model and cache the completion"""
+        response = provider.invoke(final_prompt)
+        
+        content = response.content if hasattr(response, "content") else str(response)
+        
+        # Template fallbacks are never cached, only real completions
+        self._remember(provider.model_id, content, topic, feedback, previous_content)
+        
+        return content
+    
+    def _remember(self, model_id: str, content: str, topic: str,
+                  feedback: str = "", previous_content: str = ""):
+        """Cache a completion under its model; first drafts are also indexed by topic similarity"""
+        if self.cache is not None:
+            self.cache.put(make_cache_key(model_id, topic, feedback, previous_content), content)
+        if self.similar is not None and not (feedback or previous_content):
+            self.similar.add(topic, content)
+    
+    def _similar_draft(self, topic: str, feedback: str = "", previous_content: str = "") -> Optional[str]:
+        """Draft of a near-duplicate earlier topic (first drafts only)"""
+        if self.similar is None or feedback or previous_content:
+            return None
+        return self.similar.lookup(topic)
+    
+    def _build_messages(self, topic: str, feedback: str, previous_content: str) -> list:
+        """Build the token-budgeted chat messages sent to the model"""
+        return prompt_builder.build_messages(topic, feedback, previous_content)
 
 
 # Global LLM service instance (lazy initialization)
@@ -0,0 +1,509 @@
+"""
+Mail Queue Service
+In-process outbound email queue drained by a pool of sender workers
+"""
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Optional
+from app.models.state import MailJob
+from app.services.email_service import email_service
+from app.services.merge_service import MergePlan, MergeRowError
+from app.services.outbox_service import outbox_service
+from app.services.session_service import session_service
+from app.services.throttle_service import DomainScheduler, recipient_domain
+from app.utils.helpers import generate_session_id
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context (worker threads), use print
+        emoji = "❌" if level == 'error' else "📨"
+        print(f"{emoji} {message}")
+
+
+def _item_email(item) -> str:
+    """Recipient address of a bulk address or a (email, subject, body) merge item"""
+    return item if isinstance(item, str) else item[0]
+
+
+class MailQueueFullError(RuntimeError):
+    """Raised when the outbound queue is at capacity"""
+
+
+class MailQueueService:
+    """
+    Bounded outbound mail queue with a worker pool
+
+    Requests enqueue a MailJob and return immediately; worker threads
+    deliver through EmailService and record status and timings on the job.
+    Every queued message is first written to the outbox so it survives a
+    crash and is replayed at startup. Workers pull from a DomainScheduler,
+    which paces sends per recipient domain and for the sender account.
+    """
+
+    def __init__(self):
+        self._settings: Mapping[str, object] = os.environ
+        self._queue: Optional[DomainScheduler] = None
+        self._jobs: Dict[str, MailJob] = {}
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._started = False
+
+    def configure(self, settings: Mapping[str, object]):
+        """
+        Read MAIL_* and THROTTLE_* settings from ``settings`` (e.g. the app
+        config) instead of the environment
+
+        Queue size, worker count and throttling apply from the next
+        ``start``; call this before the first email is queued.
+        """
+        self._settings = settings
+
+    def start(self):
+        """Start sender workers (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+
+            max_size = int(self._settings.get('MAIL_QUEUE_SIZE', 1000))
+            worker_count = max(1, int(self._settings.get('MAIL_QUEUE_WORKERS', 4)))
+            self._queue = DomainScheduler.from_env(max_size, self._settings)
+
+            for index in range(worker_count):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f'mail-sender-{index}',
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+            self._started = True
+
+        _safe_log(f"Mail queue started with {worker_count} workers (capacity {max_size})")
+
+    def submit(self, subject: str, body: str, recipient_email: str,
+               session_id: Optional[str] = None) -> MailJob:
+        """
+        Queue an email for delivery
+
+        Args:
+            subject: Email subject
+            body: Email body content
+            recipient_email: Recipient email address
+            session_id: Session the email belongs to, if any
+
+        Returns:
+            The queued MailJob
+
+        Raises:
+            MailQueueFullError: If the queue is at capacity
+        """
+        self.start()
+        self._prune_finished()
+
+        job = MailJob(
+            job_id=generate_session_id(),
+            subject=subject,
+            body=body,
+            recipient=recipient_email,
+            session_id=session_id
+        )
+
+        outbox_service.add(job.job_id, job.job_id, job.kind, subject, body,
+                           [recipient_email], session_id)
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        domain = recipient_domain(recipient_email)
+        timeout = float(self._settings.get('MAIL_QUEUE_PUT_TIMEOUT', 0))
+        try:
+            if timeout > 0:
+                self._queue.put((job, None, job.job_id), domain, timeout=timeout)
+            else:
+                self._queue.put_nowait((job, None, job.job_id), domain)
+        except queue.Full:
+            outbox_service.mark_done(job.job_id)
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            raise MailQueueFullError("Mail queue is full, please retry shortly")
+
+        return job
+
+    def submit_bulk(self, subject: str, body: str, recipients: Iterable[str],
+                    session_id: Optional[str] = None) -> MailJob:
+        """
+        Queue one email for many recipients
+
+        Recipients are consumed lazily and queued in per-domain chunks (no
+        larger than the domain's burst), so a streamed upload never has to
+        be held in memory and each chunk can be paced on its own. When the
+        queue is full the caller blocks (up to MAIL_BULK_PUT_TIMEOUT per
+        chunk); recipients that still cannot be queued are recorded as
+        failed.
+
+        Args:
+            subject: Email subject
+            body: Email body content
+            recipients: Recipient email addresses
+            session_id: Session the email belongs to, if any
+
+        Returns:
+            The bulk MailJob (may still be sending); a job with no
+            recipients has failed and is not registered
+        """
+        job = self._new_batch_job('bulk', subject, body, session_id)
+        self._submit_batch(job, recipients)
+        if job.total == 0:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+        return job
+
+    def submit_merge(self, plan: MergePlan, rows: Iterable[dict],
+                     session_id: Optional[str] = None) -> MailJob:
+        """
+        Queue a personalized email per recipient row
+
+        Rows are consumed, rendered and queued from a background thread,
+        so the call returns at once and the job's total grows as rows are
+        queued. Pass a RowSpool rather than a request stream. A row that
+        cannot be rendered is recorded as failed on its own.
+
+        Args:
+            plan: Compiled merge plan for the finalized draft
+            rows: Recipient rows (each with an email column)
+            session_id: Session the email belongs to, if any
+
+        Returns:
+            The merge MailJob (queued or sending)
+        """
+        job = self._new_batch_job('merge', '', '', session_id)
+        threading.Thread(
+            target=self._submit_batch,
+            args=(job, rows, plan.render),
+            name=f'mail-merge-{job.job_id[:8]}',
+            daemon=True
+        ).start()
+        return job
+
+    def _new_batch_job(self, kind: str, subject: str, body: str,
+                       session_id: Optional[str]) -> MailJob:
+        """Register a bulk or merge job that is still being submitted"""
+        self.start()
+        self._prune_finished()
+
+        job = MailJob(
+            job_id=generate_session_id(),
+            subject=subject,
+            body=body,
+            session_id=session_id,
+            kind=kind,
+            submitted=False
+        )
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def _submit_batch(self, job: MailJob, items: Iterable,
+                      render: Optional[Callable] = None):
+        """
+        Chunk and queue bulk recipients or merge messages
+
+        Args:
+            job: Job from ``_new_batch_job``
+            items: Recipient addresses, or rows when ``render`` is given
+            render: Turns a row into a (recipient_email, subject, body)
+                message; rows it rejects with MergeRowError fail alone
+        """
+        chunk_size = max(1, int(self._settings.get('MAIL_BULK_CHUNK_SIZE', 100)))
+        timeout = float(self._settings.get('MAIL_BULK_PUT_TIMEOUT', 30))
+
+        if render is not None:
+            items = self._render_rows(job, items, render)
+        items = iter(items)
+        chunks: Dict[str, list] = {}
+        queue_full = False
+
+        try:
+            for item in items:
+                domain = recipient_domain(_item_email(item))
+                chunk = chunks.setdefault(domain, [])
+                chunk.append(item)
+                if len(chunk) >= min(chunk_size, self._queue.burst_for(domain)):
+                    del chunks[domain]
+                    queue_full = not self._enqueue_chunk(job, chunk, domain, timeout)
+                    if queue_full:
+                        break
+
+            if queue_full:
+                # Drain whatever is left so every recipient gets a result
+                rejected = [item for chunk in chunks.values() for item in chunk]
+                rejected.extend(items)
+                if rejected:
+                    self._record_results(job, [
+                        {'email': _item_email(item), 'status': 'failed', 'error': 'Mail queue is full'}
+                        for item in rejected
+                    ], count=True)
+                chunks = {}
+        except Exception as e:
+            if render is None:
+                raise
+            # Merge rows are submitted from a background thread
+            _safe_log(f"Mail job {job.job_id} submission stopped: {e}", 'error')
+        finally:
+            # Recipients read before a malformed upload still go out
+            for domain, chunk in chunks.items():
+                self._enqueue_chunk(job, chunk, domain, timeout)
+
+            with self._lock:
+                job.submitted = True
+                self._maybe_finish(job)
+
+    def _render_rows(self, job: MailJob, rows: Iterable[dict], render: Callable):
+        """Render merge rows, recording rows that cannot be rendered as failed"""
+        for row in rows:
+            try:
+                yield render(row)
+            except MergeRowError as e:
+                self._record_results(job, [
+                    {'email': e.recipient_email, 'status': 'failed', 'error': str(e)}
+                ], count=True)
+
+    def replay_outbox(self) -> int:
+        """
+        Re-queue messages left unfinished by a previous process
+
+        Jobs keep their original ids so clients can keep polling them.
+        Recovered entries are queued from a background thread so startup
+        is not blocked by a full queue.
+
+        Returns:
+            Number of outbox entries recovered
+        """
+        entries = outbox_service.recover()
+        if not entries:
+            return 0
+
+        self.start()
+        items = []
+        bulk_jobs = {}
+
+        with self._lock:
+            for entry in entries:
+                job = self._jobs.get(entry['job'])
+                if job is None:
+                    job = MailJob(
+                        job_id=entry['job'],
+                        subject=entry['subject'],
+                        body=entry['body'],
+                        recipient=entry['recipients'][0] if entry['kind'] == 'single' else '',
+                        session_id=entry.get('session_id'),
+                        kind=entry['kind'],
+                        submitted=entry['kind'] == 'single'
+                    )
+                    self._jobs[job.job_id] = job
+
+                if job.kind != 'single':
+                    job.total += len(entry['recipients'])
+                    bulk_jobs[job.job_id] = job
+                    items.append((job, entry['recipients'], entry['id']))
+                else:
+                    items.append((job, None, entry['id']))
+
+            for job in bulk_jobs.values():
+                job.submitted = True
+
+        def enqueue_recovered():
+            for item in items:
+                job, chunk, _ = item
+                recipients = chunk or [job.recipient]
+                self._queue.put(item, recipient_domain(_item_email(recipients[0])), len(recipients))
+
+        threading.Thread(target=enqueue_recovered, name='outbox-replay', daemon=True).start()
+
+        _safe_log(f"Replaying {len(items)} unfinished outbox entries")
+        return len(items)
+
+    def get_job(self, job_id: str) -> Optional[MailJob]:
+        """
+        Retrieve job by ID
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            MailJob if known, None otherwise
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return queue depth and job counts by status"""
+        with self._lock:
+            counts = {'queued': 0, 'sending': 0, 'sent': 0, 'failed': 0, 'partial': 0}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+
+            return {
+                'depth': self._queue.qsize() if self._queue else 0,
+                'capacity': self._queue.maxsize if self._queue else 0,
+                'workers': len(self._workers),
+                **counts,
+                'throttle': self._queue.get_stats() if self._queue else {}
+            }
+
+    def _enqueue_chunk(self, job: MailJob, chunk: list, domain: str, timeout: float) -> bool:
+        """Queue one bulk chunk; on timeout its recipients fail. Returns success."""
+        with self._lock:
+            entry_id = f"{job.job_id}.{job.total}"
+            job.total += len(chunk)
+
+        outbox_service.add(entry_id, job.job_id, job.kind, job.subject, job.body,
+                           chunk, job.session_id)
+
+        try:
+            self._queue.put((job, chunk, entry_id), domain, len(chunk), timeout=timeout)
+            return True
+        except queue.Full:
+            outbox_service.mark_done(entry_id)
+            self._record_results(job, [
+                {'email': _item_email(item), 'status': 'failed', 'error': 'Mail queue is full'}
+                for item in chunk
+            ])
+            return False
+
+    def _worker_loop(self):
+        """Deliver queued jobs until the process exits"""
+        while True:
+            job, chunk, entry_id = self._queue.get()
+            # A worker must never exit, or the pool shrinks for good
+            try:
+                if chunk is None:
+                    self._process(job)
+                else:
+                    self._process_chunk(job, chunk)
+            except Exception as e:
+                _safe_log(f"Mail worker error on job {job.job_id}: {e}", 'error')
+                if chunk is None and not job.is_finished:
+                    self._settle(job, 'failed', str(e))
+
+            try:
+                outbox_service.mark_done(entry_id)
+            except Exception as e:
+                _safe_log(f"Failed to mark outbox entry {entry_id} done: {e}", 'error')
+
+    def _process(self, job: MailJob):
+        """Send one job and record the outcome"""
+        job.started_at = datetime.utcnow()
+        job.status = 'sending'
+
+        try:
+            email_service.send_email(job.subject, job.body, job.recipient)
+        except Exception as e:
+            _safe_log(f"Mail job {job.job_id} failed: {e}", 'error')
+            self._settle(job, 'failed', str(e))
+            return
+
+        # The mail is out; a session store error must not change the job's outcome
+        if job.session_id:
+            try:
+                session_service.update_session(job.session_id, receiver_mail=job.recipient)
+            except Exception as e:
+                _safe_log(f"Failed to record recipient on session {job.session_id}: {e}", 'error')
+        self._settle(job, 'sent')
+
+    def _settle(self, job: MailJob, status: str, error: str = ''):
+        """Finish a single-recipient job"""
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        job.status = status
+        with self._lock:
+            self._finished.append(job.job_id)
+
+    def _process_chunk(self, job: MailJob, chunk: list):
+        """Send one bulk or merge chunk over a single pooled connection"""
+        with self._lock:
+            if job.started_at is None:
+                job.started_at = datetime.utcnow()
+                job.status = 'sending'
+
+        # Filled in item order, so recipients already attempted keep their result
+        results = []
+        try:
+            if job.kind == 'merge':
+                email_service.send_personalized(chunk, results=results)
+            else:
+                email_service.send_bulk(job.subject, job.body, chunk, results=results)
+        except Exception as e:
+            _safe_log(f"Mail job {job.job_id} chunk failed: {e}", 'error')
+            results.extend(
+                {'email': _item_email(item), 'status': 'failed', 'error': str(e)}
+                for item in chunk[len(results):]
+            )
+
+        self._record_results(job, results)
+
+    def _record_results(self, job: MailJob, results: List[dict], count: bool = False):
+        """Append per-recipient results to a bulk job"""
+        with self._lock:
+            if count:
+                job.total += len(results)
+            job.results.extend(results)
+            for result in results:
+                if result['status'] == 'sent':
+                    job.sent_count += 1
+                else:
+                    job.failed_count += 1
+            self._maybe_finish(job)
+
+    def _maybe_finish(self, job: MailJob):
+        """Settle a bulk job once every recipient has a result (lock held)"""
+        if job.is_finished or not job.submitted:
+            return
+        if job.sent_count + job.failed_count < job.total:
+            return
+
+        job.finished_at = datetime.utcnow()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        if job.total == 0:
+            job.status = 'failed'
+            job.error = 'No recipients'
+        elif job.failed_count == 0:
+            job.status = 'sent'
+        elif job.sent_count == 0:
+            job.status = 'failed'
+        else:
+            job.status = 'partial'
+        self._finished.append(job.job_id)
+
+    def _prune_finished(self):
+        """Forget finished jobs older than the retention window"""
+        retention = int(self._settings.get('MAIL_JOB_RETENTION', 3600))
+        cutoff = datetime.utcnow() - timedelta(seconds=retention)
+
+        with self._lock:
+            while self._finished:
+                job = self._jobs.get(self._finished[0])
+                if job is not None and job.finished_at > cutoff:
+                    break
+                self._finished.popleft()
+                if job is not None:
+                    del self._jobs[job.job_id]
+
+
+# Global mail queue instance (workers start on first submit)
+mail_queue_service = MailQueueService()
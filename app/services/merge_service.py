@@ -0,0 +1,229 @@
+"""
+Mail Merge Service
+Compiles a finalized draft once and personalizes it per recipient row
+"""
+import csv
+import io
+import json
+import re
+import tempfile
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.models.state import EmailContent
+
+
+# Matches placeholders such as [Recipient] or [Your Name]
+PLACEHOLDER_PATTERN = re.compile(r'\[([A-Za-z][A-Za-z0-9 _\-/]{0,48})\]')
+
+# Row columns tried (in order) for a placeholder when its own name is absent
+PLACEHOLDER_ALIASES = {
+    'recipient': ('recipient', 'name', 'recipient_name', 'first_name'),
+    'name': ('name', 'recipient', 'recipient_name', 'first_name'),
+}
+
+# Row columns that carry the recipient address
+EMAIL_COLUMNS = ('email', 'recipient_email', 'to', 'email_address')
+
+
+class MergeRowError(ValueError):
+    """Raised when one recipient row cannot be rendered"""
+
+    def __init__(self, recipient_email: str, message: str):
+        super().__init__(message)
+        self.recipient_email = recipient_email
+
+
+def normalize_key(name: str) -> str:
+    """Normalize a placeholder or column name: "Your Name" -> "your_name" """
+    return re.sub(r'[\s\-/]+', '_', name.strip().lower())
+
+
+class MergePlan:
+    """
+    Substitution plan for one draft
+
+    Subject and body are split once into alternating literal and
+    placeholder segments; rendering a row is a single ``join`` with no
+    reparsing or regex work.
+    """
+
+    def __init__(self, subject: str, body: str, defaults: Optional[Dict[str, str]] = None):
+        self._subject = self._compile(subject)
+        self._body = self._compile(body)
+        self._defaults = {normalize_key(k): str(v) for k, v in (defaults or {}).items()}
+
+    @classmethod
+    def compile(cls, content: str, topic: str, defaults: Optional[Dict[str, str]] = None) -> 'MergePlan':
+        """
+        Parse a finalized draft and compile it
+
+        Args:
+            content: Finalized email content
+            topic: Email topic (used for the subject when none is present)
+            defaults: Values for placeholders missing from a row
+
+        Returns:
+            MergePlan ready to render rows
+        """
+        email_content = EmailContent.parse_from_content(content, topic)
+        return cls(email_content.subject, email_content.body, defaults)
+
+    @property
+    def placeholders(self) -> List[str]:
+        """Normalized placeholder names used by the draft"""
+        names = []
+        for segments in (self._subject, self._body):
+            for key, _ in segments[1::2]:
+                if key not in names:
+                    names.append(key)
+        return names
+
+    def render(self, row: Dict[str, str]) -> Tuple[str, str, str]:
+        """
+        Render the draft for one recipient row
+
+        Placeholders without a value in the row or the defaults are left
+        as written (e.g. "[Recipient]").
+
+        Args:
+            row: Recipient data with an email column
+
+        Returns:
+            Tuple of (recipient_email, subject, body)
+
+        Raises:
+            MergeRowError: If a row value puts a line break in the subject
+        """
+        values = {normalize_key(k): str(v).strip() for k, v in row.items() if k and v not in (None, '')}
+
+        recipient_email = ''
+        for column in EMAIL_COLUMNS:
+            if column in values:
+                recipient_email = values[column]
+                break
+
+        subject = self._render(self._subject, values)
+        if '\r' in subject or '\n' in subject:
+            raise MergeRowError(recipient_email, 'Row value puts a line break in the subject')
+
+        return recipient_email, subject, self._render(self._body, values)
+
+    def _render(self, segments: list, values: Dict[str, str]) -> str:
+        if len(segments) == 1:
+            return segments[0]
+
+        parts = segments[:]
+        for index in range(1, len(parts), 2):
+            key, original = parts[index]
+            parts[index] = self._lookup(key, values, original)
+        return ''.join(parts)
+
+    def _lookup(self, key: str, values: Dict[str, str], original: str) -> str:
+        for candidate in PLACEHOLDER_ALIASES.get(key, (key,)):
+            if candidate in values:
+                return values[candidate]
+        return self._defaults.get(key, original)
+
+    @staticmethod
+    def _compile(text: str) -> list:
+        """Split text into [literal, (key, original), literal, ...]"""
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            segments.append(text[position:match.start()])
+            segments.append((normalize_key(match.group(1)), match.group(0)))
+            position = match.end()
+        segments.append(text[position:])
+        return segments
+
+
+class RowSpool:
+    """
+    Recipient rows buffered to a temporary file
+
+    Reading the upload into the spool happens up front, so a request can
+    return while the rows are queued from another thread. Small uploads
+    stay in memory; larger ones roll over to disk. Rows that are not
+    objects are skipped. Iterating the spool yields the rows once and
+    closes it.
+    """
+
+    def __init__(self, rows: Iterable[dict], max_memory: int = 1024 * 1024):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.count = 0
+        try:
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                self._file.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.count += 1
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __iter__(self) -> Iterator[dict]:
+        try:
+            self._file.seek(0)
+            for line in self._file:
+                yield json.loads(line)
+        finally:
+            self._file.close()
+
+    def close(self):
+        self._file.close()
+
+
+def iter_csv_rows(stream: IO[bytes]) -> Iterator[Dict[str, str]]:
+    """
+    Stream rows from a CSV upload with a header line
+
+    Args:
+        stream: Binary file-like object
+
+    Yields:
+        One dict per row
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    yield from csv.DictReader(text)
+
+
+def iter_json_rows(stream: IO[bytes], chunk_size: int = 65536) -> Iterator[Dict[str, str]]:
+    """
+    Stream rows from a JSON array or JSON-lines upload
+
+    Objects are decoded incrementally, so the file is never loaded whole.
+
+    Args:
+        stream: Binary file-like object
+        chunk_size: Bytes read per step
+
+    Yields:
+        One dict per JSON object
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace')
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not buffer:
+            if eof:
+                return
+            data = text.read(chunk_size)
+            eof = not data
+            buffer += data
+            continue
+
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise ValueError("Malformed JSON in recipient upload")
+            data = text.read(chunk_size)
+            eof = not data
+            buffer += data
+            continue
+
+        buffer = buffer[end:]
+        if isinstance(row, dict):
+            yield row
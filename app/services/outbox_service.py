@@ -0,0 +1,350 @@
+"""
+Outbox Service
+Crash-safe, append-only spool of outbound emails awaiting delivery
+"""
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+LOG_FILENAME = 'outbox-{slot}.log'
+LOCK_FILENAME = 'outbox-{slot}.lock'
+
+# Single log written before the spool had one slot per process
+LEGACY_LOG_FILENAME = 'outbox.log'
+LEGACY_LOCK_FILENAME = '.lock'
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "💾"
+        print(f"{emoji} {message}")
+
+
+class _CommitBatch:
+    """Records written together by one fsync"""
+
+    __slots__ = ('event', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error: Optional[Exception] = None
+
+
+class OutboxService:
+    """
+    Durable outbox for outbound email
+
+    Every message is appended to the process's log as an ``add`` record
+    before it is queued, and a ``done`` record is appended once the SMTP
+    server has accepted (or permanently rejected) it. Writes are
+    group-committed by a single writer thread: concurrent callers share
+    one fsync.
+
+    Each process owns one slot of ``OUTBOX_DIR`` (``outbox-<n>.log``,
+    held with an flock), so every worker of a multi-process deployment
+    has a working outbox. On startup the process compacts its own log and
+    adopts the logs of slots no live process holds, keeping the entries
+    without a ``done`` record; those are handed back for replay.
+
+    Delivery is at-least-once: a crash between the SMTP accept and the
+    ``done`` record replays that message.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._buffer: List[bytes] = []
+        self._batch = _CommitBatch()
+        self._pending: Dict[str, bool] = {}
+        self._recovered: List[dict] = []
+        self._file = None
+        self._lock_file = None
+        self.slot: Optional[int] = None
+        self._opened = False
+        self.enabled = False
+        self._stats = {'commits': 0, 'records': 0, 'compactions': 0}
+
+    def open(self) -> bool:
+        """
+        Open the spool, recovering unfinished entries (idempotent)
+
+        Returns:
+            True if the outbox is enabled and usable
+        """
+        with self._lock:
+            if self._opened:
+                return self.enabled
+            self._opened = True
+
+            if os.environ.get('OUTBOX_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+                return False
+
+            directory = os.environ.get('OUTBOX_DIR', 'outbox')
+            max_slots = int(os.environ.get('OUTBOX_MAX_SLOTS', 64))
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self.slot = self._claim_slot(directory, max_slots)
+                if self.slot is None:
+                    _safe_log(f"All {max_slots} outbox slots in {directory} are in use; outbox disabled", 'error')
+                    return False
+
+                path = os.path.join(directory, LOG_FILENAME.format(slot=self.slot))
+                self._recovered = self._compact(path, directory)
+                self._pending = {entry['id']: True for entry in self._recovered}
+                self._file = open(path, 'ab')
+            except OSError as e:
+                _safe_log(f"Failed to open outbox: {e}", 'error')
+                return False
+
+            writer = threading.Thread(target=self._writer_loop, name='outbox-writer', daemon=True)
+            writer.start()
+            self.enabled = True
+
+        if self._recovered:
+            _safe_log(f"Outbox recovered {len(self._recovered)} unfinished entries")
+        return True
+
+    def recover(self) -> List[dict]:
+        """
+        Return entries that were unfinished when the process last stopped
+
+        Each entry is handed out only once per process.
+        """
+        self.open()
+        with self._lock:
+            entries, self._recovered = self._recovered, []
+        return entries
+
+    def add(self, entry_id: str, job_id: str, kind: str, subject: str, body: str,
+            recipients: List[str], session_id: Optional[str] = None):
+        """
+        Durably record a message before it is queued
+
+        Blocks until the record has been fsynced together with any other
+        records written concurrently, for at most OUTBOX_ADD_TIMEOUT seconds.
+
+        Raises:
+            RuntimeError: If the record could not be persisted in time
+        """
+        if not self.open():
+            return
+
+        batch = self._append({
+            'op': 'add',
+            'id': entry_id,
+            'job': job_id,
+            'kind': kind,
+            'subject': subject,
+            'body': body,
+            'recipients': recipients,
+            'session_id': session_id
+        }, entry_id)
+        if not batch.event.wait(float(os.environ.get('OUTBOX_ADD_TIMEOUT', 10))):
+            # The caller will not queue it, so it must not be replayed if it lands late
+            self.mark_done(entry_id)
+            raise RuntimeError("Timed out persisting outbound email")
+
+        if batch.error is not None:
+            self.mark_done(entry_id)
+            raise RuntimeError(f"Failed to persist outbound email: {batch.error}")
+
+    def mark_done(self, entry_id: str):
+        """Record that a message no longer needs delivery (does not wait)"""
+        if not self.enabled:
+            return
+        self._append({'op': 'done', 'id': entry_id})
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return spool counters"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'slot': self.slot,
+                'pending': len(self._pending),
+                **self._stats
+            }
+
+    def _append(self, record: dict, entry_id: Optional[str] = None) -> _CommitBatch:
+        """Buffer a record for the writer thread; returns its commit batch"""
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._cond:
+            if entry_id is not None:
+                self._pending[entry_id] = True
+            elif record['op'] == 'done':
+                self._pending.pop(record['id'], None)
+            self._buffer.append(line)
+            self._cond.notify()
+            return self._batch
+
+    def _writer_loop(self):
+        """Write buffered records, one fsync per batch"""
+        interval = float(os.environ.get('OUTBOX_COMMIT_INTERVAL', 0.002))
+        compact_bytes = int(os.environ.get('OUTBOX_COMPACT_BYTES', 16 * 1024 * 1024))
+
+        while True:
+            with self._cond:
+                while not self._buffer:
+                    self._cond.wait()
+
+            # Let concurrent writers join this commit
+            if interval > 0:
+                time.sleep(interval)
+
+            with self._cond:
+                lines, self._buffer = self._buffer, []
+                batch, self._batch = self._batch, _CommitBatch()
+
+            # Any error fails this batch only; the writer must never exit
+            # while callers wait on its batches
+            try:
+                self._file.write(b''.join(lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                batch.error = e
+                _safe_log(f"Outbox write failed: {e}", 'error')
+
+            with self._lock:
+                self._stats['commits'] += 1
+                self._stats['records'] += len(lines)
+                idle = not self._pending and not self._buffer
+
+            batch.event.set()
+
+            # Nothing is in flight, so the whole log can be dropped
+            if idle and batch.error is None:
+                try:
+                    if self._file.tell() > compact_bytes:
+                        self._file.truncate(0)
+                        os.fsync(self._file.fileno())
+                        with self._lock:
+                            self._stats['compactions'] += 1
+                except Exception as e:
+                    _safe_log(f"Outbox truncate failed: {e}", 'error')
+
+    def _compact(self, path: str, directory: str) -> List[dict]:
+        """
+        Rewrite this process's log keeping only unfinished entries, taking
+        in those of orphaned logs; return them
+        """
+        entries = self._read_log(path)
+        adopted = self._adopt_orphans(directory, path)
+        for _, _, orphan_entries in adopted:
+            for entry_id, record in orphan_entries.items():
+                entries.setdefault(entry_id, record)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as tmp:
+            for record in entries.values():
+                tmp.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory(directory)
+
+        # The entries are durable in our log now, so the orphaned logs can go
+        for lock_file, orphan_path, _ in adopted:
+            try:
+                os.remove(orphan_path)
+            finally:
+                lock_file.close()
+        if adopted:
+            self._fsync_directory(directory)
+            _safe_log(f"Outbox adopted {len(adopted)} logs from stopped processes")
+
+        self._stats['compactions'] += 1
+        return list(entries.values())
+
+    def _adopt_orphans(self, directory: str, own_path: str) -> List[Tuple[object, str, Dict[str, dict]]]:
+        """Lock and read every other log whose slot no live process holds"""
+        candidates = [(LEGACY_LOCK_FILENAME, os.path.join(directory, LEGACY_LOG_FILENAME))]
+        for orphan_path in sorted(glob.glob(os.path.join(directory, LOG_FILENAME.format(slot='*')))):
+            slot = os.path.basename(orphan_path)[len('outbox-'):-len('.log')]
+            candidates.append((LOCK_FILENAME.format(slot=slot), orphan_path))
+
+        adopted = []
+        for lock_name, orphan_path in candidates:
+            if orphan_path == own_path or not os.path.exists(orphan_path):
+                continue
+            lock_file = self._try_lock(os.path.join(directory, lock_name))
+            if lock_file is None:
+                continue
+            try:
+                adopted.append((lock_file, orphan_path, self._read_log(orphan_path)))
+            except OSError:
+                lock_file.close()
+                raise
+        return adopted
+
+    @staticmethod
+    def _read_log(path: str) -> Dict[str, dict]:
+        """Entries of a log that have no ``done`` record"""
+        entries: Dict[str, dict] = {}
+        if not os.path.exists(path):
+            return entries
+
+        with open(path, 'rb') as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash mid-append
+                    continue
+                if record.get('op') == 'add':
+                    entries[record['id']] = record
+                elif record.get('op') == 'done':
+                    entries.pop(record.get('id'), None)
+        return entries
+
+    def _claim_slot(self, directory: str, max_slots: int) -> Optional[int]:
+        """Lock the first free slot so this process owns its log"""
+        for slot in range(max(1, max_slots)):
+            lock_file = self._try_lock(os.path.join(directory, LOCK_FILENAME.format(slot=slot)))
+            if lock_file is not None:
+                self._lock_file = lock_file
+                return slot
+        return None
+
+    @staticmethod
+    def _try_lock(path: str):
+        """Open and exclusively flock a lock file; None if another process holds it"""
+        lock_file = open(path, 'w')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return None
+
+    @staticmethod
+    def _fsync_directory(directory: str):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# Global outbox instance (opened on first use or at startup replay)
+outbox_service = OutboxService()
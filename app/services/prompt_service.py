@@ -0,0 +1,194 @@
+"""
+Prompt Assembly Service
+Builds token-budgeted chat prompts and compacts feedback history
+"""
+import os
+import textwrap
+from typing import List, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+
+# Static system prompt, dedented once at import
+SYSTEM_PROMPT = textwrap.dedent("""
+    You are an Expert Email Writer Assistant specialized in creating professional, clear, and engaging emails.
+    Your job is to write or rewrite emails based on the given topic and human feedback.
+
+    Instructions:
+    - Write in proper email format with appropriate greeting, body, and closing
+    - Use a professional yet friendly tone that's suitable for business communication
+    - Keep the email concise, clear, and actionable
+    - Include appropriate subject line suggestions when relevant
+    - Apply any human feedback to improve the email's effectiveness
+    - Ensure the email serves its intended purpose (request, update, invitation, etc.)
+    - Use proper email etiquette and formatting
+
+    Email Structure Guidelines:
+    - Start with appropriate greeting (Dear [Name], Hi [Name], Hello, etc.)
+    - Clear and engaging opening line
+    - Well-organized body paragraphs with clear purpose
+    - Professional closing with call-to-action if needed
+    - Appropriate sign-off (Best regards, Sincerely, etc.)
+
+    Tone Guidelines:
+    - Professional yet approachable
+    - Clear and direct communication
+    - Respectful and courteous
+    - Action-oriented when applicable
+
+    Output Rule:
+    Return only the email content in proper email format — no extra explanations, notes, or commentary.
+""").strip()
+
+USER_MESSAGE_TEMPLATE = """Email Topic/Purpose: {topic}
+
+Human Feedback for Improvement: {feedback}
+
+Previous Email Draft: {previous_content}"""
+
+TRUNCATION_MARKER = '\n[...]\n'
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+class PromptBuilder:
+    """
+    Assembles chat messages within a token budget
+
+    The system message is built once and shared by every request. The
+    user message is fitted to ``token_budget`` by trimming the previous
+    draft from the middle, then the feedback, then the topic.
+
+    Feedback history is compacted incrementally: the most recent
+    ``recent_feedback`` entries are sent verbatim and older entries are
+    folded, once each, into a rolling summary capped at
+    ``summary_tokens``.
+    """
+
+    def __init__(self, token_budget: int = 3000, recent_feedback: int = 3, summary_tokens: int = 150):
+        self.token_budget = token_budget
+        self.recent_feedback = max(1, recent_feedback)
+        self.summary_tokens = summary_tokens
+        self.system_message = SystemMessage(content=SYSTEM_PROMPT)
+        self._system_tokens = estimate_tokens(SYSTEM_PROMPT)
+        self._template_tokens = estimate_tokens(USER_MESSAGE_TEMPLATE.format(
+            topic='', feedback='', previous_content=''
+        ))
+
+    @classmethod
+    def from_env(cls) -> 'PromptBuilder':
+        """Build from LLM_PROMPT_* settings"""
+        return cls(
+            token_budget=int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 3000)),
+            recent_feedback=int(os.environ.get('LLM_PROMPT_RECENT_FEEDBACK', 3)),
+            summary_tokens=int(os.environ.get('LLM_PROMPT_SUMMARY_TOKENS', 150))
+        )
+
+    def build_messages(self, topic: str, feedback: str = "", previous_content: str = "") -> List[BaseMessage]:
+        """
+        Build the chat messages for one generation
+
+        Args:
+            topic: Email topic/purpose
+            feedback: Feedback text (already compacted)
+            previous_content: Previous draft content
+
+        Returns:
+            [SystemMessage, HumanMessage]
+        """
+        return [self.system_message, HumanMessage(content=self.build_user_message(topic, feedback, previous_content))]
+
+    def build_user_message(self, topic: str, feedback: str = "", previous_content: str = "") -> str:
+        """Render the user message, trimmed to the token budget"""
+        available = self.token_budget - self._system_tokens - self._template_tokens
+
+        feedback = feedback or 'No specific feedback'
+        previous_content = previous_content or 'No previous draft - create new email'
+
+        overflow = estimate_tokens(topic) + estimate_tokens(feedback) + estimate_tokens(previous_content) - available
+        if overflow > 0:
+            previous_content, overflow = self._trim(previous_content, overflow, keep_tail=True)
+        if overflow > 0:
+            feedback, overflow = self._trim(feedback, overflow, keep_tail=True)
+        if overflow > 0:
+            topic, overflow = self._trim(topic, overflow, keep_tail=False)
+
+        return USER_MESSAGE_TEMPLATE.format(
+            topic=topic,
+            feedback=feedback,
+            previous_content=previous_content
+        )
+
+    def compact_feedback(self, feedback_history: List[str], summary: str = "",
+                         summarized_count: int = 0) -> Tuple[str, str, int]:
+        """
+        Fold older feedback into the rolling summary
+
+        Only entries that have aged out of the recent window since the
+        last call are processed, so the work per refinement is constant.
+
+        Args:
+            feedback_history: All feedback for the session, oldest first
+            summary: Rolling summary stored on the session
+            summarized_count: How many history entries the summary covers
+
+        Returns:
+            Tuple of (feedback_text, new_summary, new_summarized_count)
+        """
+        cutoff = max(summarized_count, len(feedback_history) - self.recent_feedback)
+
+        if cutoff > summarized_count:
+            summary = self._fold(summary, feedback_history[summarized_count:cutoff])
+            summarized_count = cutoff
+
+        recent = ' | '.join(feedback_history[summarized_count:])
+        if summary and recent:
+            feedback_text = f"Earlier requests (summary): {summary} | Latest: {recent}"
+        elif summary:
+            feedback_text = f"Earlier requests (summary): {summary}"
+        else:
+            feedback_text = recent
+
+        return feedback_text, summary, summarized_count
+
+    def _fold(self, summary: str, entries: List[str]) -> str:
+        """Merge entries into the summary, dropping repeats and the oldest clauses"""
+        clauses = [c for c in summary.split('; ') if c] if summary else []
+        seen = {c.casefold() for c in clauses}
+
+        for entry in entries:
+            clause = ' '.join(entry.split()).rstrip('.;')
+            if clause and clause.casefold() not in seen:
+                clauses.append(clause)
+                seen.add(clause.casefold())
+
+        # Later instructions win, so drop from the front when over budget
+        while len(clauses) > 1 and estimate_tokens('; '.join(clauses)) > self.summary_tokens:
+            clauses.pop(0)
+
+        folded = '; '.join(clauses)
+        if estimate_tokens(folded) > self.summary_tokens:
+            folded = folded[-self.summary_tokens * 4:]
+        return folded
+
+    @staticmethod
+    def _trim(text: str, overflow: int, keep_tail: bool) -> Tuple[str, int]:
+        """Cut ``overflow`` tokens from text; returns (text, remaining overflow)"""
+        tokens = estimate_tokens(text)
+        keep_tokens = max(0, tokens - overflow - estimate_tokens(TRUNCATION_MARKER))
+        if keep_tokens <= 0:
+            return '', overflow - tokens
+
+        keep_chars = keep_tokens * 4
+        if keep_tail:
+            head = keep_chars * 2 // 3
+            trimmed = text[:head] + TRUNCATION_MARKER + text[len(text) - (keep_chars - head):]
+        else:
+            trimmed = text[:keep_chars] + TRUNCATION_MARKER
+        return trimmed, 0
+
+
+# Global prompt builder (configured from environment)
+prompt_builder = PromptBuilder.from_env()
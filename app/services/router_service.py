@@ -0,0 +1,195 @@
+"""
+Model Router Service
+Picks the model for each generation from request kind, prompt size and
+observed per-model latency and error rate
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from app.services.llm_provider_service import LLMProvider, create_provider
+
+
+DRAFT = 'draft'
+REFINE = 'refine'
+
+
+class _ModelHealth:
+    """Exponentially weighted latency and error rate of one model"""
+
+    __slots__ = ('calls', 'failures', 'latency_ewma', 'error_ewma', 'updated_at')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.updated_at = 0.0
+
+
+class ModelRouter:
+    """
+    Orders candidate models for a request
+
+    ``rules`` maps a request kind (``draft`` or ``refine``) to model ids in
+    preference order; ``fallbacks`` are appended to every route.
+    Refinements whose prompt exceeds ``large_prompt_tokens`` take the
+    draft route. Models whose smoothed latency is above ``max_latency`` or
+    whose error rate is above ``max_error_rate`` move behind healthy ones
+    until ``recovery_seconds`` pass without new observations.
+    """
+
+    def __init__(self, providers: Dict[str, LLMProvider], rules: Dict[str, List[str]],
+                 fallbacks: Optional[List[str]] = None, large_prompt_tokens: int = 1500,
+                 max_latency: float = 8.0, max_error_rate: float = 0.3,
+                 recovery_seconds: float = 60.0, alpha: float = 0.2):
+        self.providers = providers
+        self.rules = {kind: [m for m in models if m in providers] for kind, models in rules.items()}
+        self.fallbacks = [m for m in (fallbacks or []) if m in providers]
+        self.large_prompt_tokens = large_prompt_tokens
+        self.max_latency = max_latency
+        self.max_error_rate = max_error_rate
+        self.recovery_seconds = recovery_seconds
+        self.alpha = alpha
+
+        self._lock = threading.Lock()
+        self._health = {model_id: _ModelHealth() for model_id in providers}
+        self._routed = {DRAFT: {}, REFINE: {}}
+
+    @classmethod
+    def from_env(cls, timeout: Optional[float] = None) -> Optional['ModelRouter']:
+        """
+        Build the router from LLM_* settings
+
+        LLM_DRAFT_MODEL and LLM_REFINE_MODEL default to LLM_MODEL, so an
+        unconfigured router sends everything to a single model.
+
+        Returns:
+            ModelRouter, or None when no model could be initialized
+        """
+        default_model = os.environ.get('LLM_MODEL', 'llama-3.1-8b-instant')
+        provider_name = os.environ.get('LLM_PROVIDER', 'groq')
+
+        def specs(value: str) -> List[str]:
+            return [s.strip() for s in value.split(',') if s.strip()]
+
+        draft_specs = specs(os.environ.get('LLM_DRAFT_MODEL', '') or default_model)
+        refine_specs = specs(os.environ.get('LLM_REFINE_MODEL', '') or default_model)
+        fallback_specs = specs(os.environ.get('LLM_FALLBACK_MODELS', ''))
+
+        providers: Dict[str, LLMProvider] = {}
+        ids: Dict[str, str] = {}
+        for spec in dict.fromkeys(draft_specs + refine_specs + fallback_specs):
+            provider = create_provider(spec, provider=provider_name, timeout=timeout)
+            if provider is None:
+                continue
+            providers.setdefault(provider.model_id, provider)
+            ids[spec] = provider.model_id
+
+        if not providers:
+            return None
+
+        return cls(
+            providers,
+            rules={
+                DRAFT: [ids[s] for s in draft_specs if s in ids],
+                REFINE: [ids[s] for s in refine_specs if s in ids]
+            },
+            fallbacks=[ids[s] for s in fallback_specs if s in ids],
+            large_prompt_tokens=int(os.environ.get('LLM_ROUTER_LARGE_PROMPT_TOKENS', 1500)),
+            max_latency=float(os.environ.get('LLM_ROUTER_MAX_LATENCY', 8)),
+            max_error_rate=float(os.environ.get('LLM_ROUTER_MAX_ERROR_RATE', 0.3)),
+            recovery_seconds=float(os.environ.get('LLM_ROUTER_RECOVERY_SECONDS', 60))
+        )
+
+    @property
+    def primary(self) -> LLMProvider:
+        """First-choice model for drafts"""
+        return self.providers[self._candidates(DRAFT)[0]]
+
+    def route(self, kind: str, prompt_tokens: int = 0) -> List[LLMProvider]:
+        """
+        Return providers to try, best first
+
+        Args:
+            kind: 'draft' or 'refine'
+            prompt_tokens: Estimated prompt size
+
+        Returns:
+            Non-empty list of providers
+        """
+        if kind == REFINE and prompt_tokens > self.large_prompt_tokens:
+            kind = DRAFT
+
+        candidates = self._candidates(kind)
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in candidates if self._is_healthy(m, now)]
+            degraded = sorted(
+                (m for m in candidates if m not in healthy),
+                key=lambda m: self._health[m].error_ewma
+            )
+            ordered = healthy + degraded
+            counts = self._routed.setdefault(kind, {})
+            counts[ordered[0]] = counts.get(ordered[0], 0) + 1
+
+        return [self.providers[m] for m in ordered]
+
+    def models(self, kind: str) -> List[str]:
+        """Model ids configured for ``kind`` (with fallbacks), ignoring health"""
+        return self._candidates(kind)
+
+    def record(self, model_id: str, latency: Optional[float], ok: bool):
+        """Record the outcome of one call to ``model_id``"""
+        with self._lock:
+            health = self._health.get(model_id)
+            if health is None:
+                return
+            now = time.monotonic()
+            if health.calls and now - health.updated_at > self.recovery_seconds:
+                # Start over after a quiet period instead of inheriting old failures
+                health.error_ewma = 0.0
+                health.latency_ewma = None
+            health.calls += 1
+            if not ok:
+                health.failures += 1
+            health.error_ewma += self.alpha * ((0.0 if ok else 1.0) - health.error_ewma)
+            if latency is not None:
+                if health.latency_ewma is None:
+                    health.latency_ewma = latency
+                else:
+                    health.latency_ewma += self.alpha * (latency - health.latency_ewma)
+            health.updated_at = now
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return routes, per-model health and routing counts"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'routes': {kind: self._candidates(kind) for kind in (DRAFT, REFINE)},
+                'models': {
+                    model_id: {
+                        'calls': h.calls,
+                        'failures': h.failures,
+                        'latency_ewma': round(h.latency_ewma, 4) if h.latency_ewma is not None else None,
+                        'error_rate': round(h.error_ewma, 4),
+                        'healthy': self._is_healthy(model_id, now)
+                    }
+                    for model_id, h in self._health.items()
+                },
+                'routed': {kind: dict(counts) for kind, counts in self._routed.items()}
+            }
+
+    def _candidates(self, kind: str) -> List[str]:
+        models = self.rules.get(kind) or self.rules.get(DRAFT) or []
+        ordered = list(dict.fromkeys(models + self.fallbacks))
+        return ordered or list(self.providers)
+
+    def _is_healthy(self, model_id: str, now: float) -> bool:
+        """Check thresholds; stale observations count as healthy (lock held)"""
+        health = self._health[model_id]
+        if health.calls == 0 or now - health.updated_at > self.recovery_seconds:
+            return True
+        if health.error_ewma > self.max_error_rate:
+            return False
+        return health.latency_ewma is None or health.latency_ewma <= self.max_latency
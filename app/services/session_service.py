@@ -2,10 +2,18 @@
 Session Management Service
 Handles email session creation, storage, and retrieval
 """
+import os
+import threading
 from datetime import datetime
-from typing import Optional, Dict
-from app.models.state import EmailSession
-from app.utils.helpers import generate_session_id, is_session_expired
+from typing import Dict, Mapping, Optional
+from app.models.state import DraftHistory, EmailSession
+from app.services.session_store import (
+    MemorySessionBackend,
+    SessionBackend,
+    SessionConflictError,
+    create_backend
+)
+from app.utils.helpers import generate_session_id
 
 
 def _safe_log(message: str):
@@ -22,12 +30,78 @@ class SessionService:
     """
     Manages email generation sessions
     
-    Note: Currently using in-memory storage.
-    For production, replace with Redis or database.
+    Storage is delegated to a SessionBackend chosen by SESSION_BACKEND:
+    ``memory`` (default, lock-striped in-process map) or ``sqlite`` (a WAL
+    database shared by every worker process on the host). Backends that
+    hand out copies return the stored session from ``update_session``
+    and ``add_feedback``; callers should use those return values.
+    
+    A background reaper removes expired sessions in batches of
+    ``reap_batch``, so requests are never held up by expiry.
+    
+    Each session keeps its draft versions as deltas with a full snapshot
+    every ``snapshot_every`` versions, up to ``max_versions`` versions.
     """
     
-    def __init__(self):
-        self._sessions: Dict[str, EmailSession] = {}
+    def __init__(self, backend: Optional[SessionBackend] = None,
+                 reap_interval: float = 1.0, reap_batch: int = 500,
+                 snapshot_every: int = 10, max_versions: int = 50):
+        self.backend = backend or MemorySessionBackend()
+        self.reap_interval = reap_interval
+        self.reap_batch = max(1, reap_batch)
+        self.snapshot_every = snapshot_every
+        self.max_versions = max_versions
+        
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    @classmethod
+    def from_env(cls) -> 'SessionService':
+        """Build from SESSION_* environment settings"""
+        service = cls(backend=create_backend())
+        service._apply(os.environ)
+        return service
+    
+    def configure(self, settings: Mapping[str, object]):
+        """
+        Apply SESSION_* settings, e.g. from the app config
+        
+        The backend is rebuilt from the settings, so call this at startup
+        before any session is created.
+        
+        Args:
+            settings: Mapping of setting name to value
+        """
+        backend = create_backend(settings=settings)
+        with self._lock:
+            previous, self.backend = self.backend, backend
+            self._apply(settings)
+        previous.close()
+    
+    def _apply(self, settings: Mapping[str, object]):
+        """Set reaper and version history settings"""
+        self.reap_interval = float(settings.get('SESSION_REAP_INTERVAL', 1.0))
+        self.reap_batch = max(1, int(settings.get('SESSION_REAP_BATCH', 500)))
+        self.snapshot_every = int(settings.get('SESSION_SNAPSHOT_EVERY', 10))
+        self.max_versions = int(settings.get('SESSION_MAX_VERSIONS', 50))
+    
+    def start(self):
+        """Start the expiry reaper thread (idempotent)"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, name='session-reaper', daemon=True)
+            self._reaper.start()
+    
+    def stop(self):
+        """Stop the reaper thread and close the backend"""
+        self._stop.set()
+        reaper = self._reaper
+        if reaper is not None and reaper is not threading.current_thread():
+            reaper.join(timeout=5)
+        self.backend.close()
     
     def create_session(self, topic: str, generated_content: str) -> EmailSession:
         """
@@ -49,10 +123,14 @@ class SessionService:
             feedback_history=[],
             final_data='',
             receiver_mail='',
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
+            history=DraftHistory(self.snapshot_every, self.max_versions)
         )
         
-        self._sessions[session_id] = session
+        self.backend.create(session)
+        
+        if self._reaper is None:
+            self.start()
         _safe_log(f"Created session: {session_id}")
         
         return session
@@ -61,27 +139,16 @@ class SessionService:
         """
         Retrieve session by ID
         
+        Expired sessions are never returned, even if the reaper has not
+        reached them yet. With sliding expiry, a hit extends the session.
+        
         Args:
             session_id: Session identifier
             
         Returns:
             EmailSession if found, None otherwise
         """
-        session = self._sessions.get(session_id)
-        
-        if session:
-            # Check if session expired
-            try:
-                from flask import current_app
-                timeout = current_app.config.get('SESSION_TIMEOUT', 3600)
-            except RuntimeError:
-                timeout = 3600  # Default timeout
-            
-            if is_session_expired(session.created_at, timeout):
-                self.delete_session(session_id)
-                return None
-        
-        return session
+        return self.backend.get(session_id)
     
     def update_session(self, session_id: str, **kwargs) -> Optional[EmailSession]:
         """
@@ -93,14 +160,14 @@ class SessionService:
             
         Returns:
             Updated EmailSession if found, None otherwise
+            
+        Raises:
+            SessionConflictError: If the cached backend finds the session
+                was changed by another process since it was read
         """
-        session = self.get_session(session_id)
+        session = self.backend.update(session_id, kwargs)
         
         if session:
-            for key, value in kwargs.items():
-                if hasattr(session, key):
-                    setattr(session, key, value)
-            
             _safe_log(f"Updated session: {session_id}")
         
         return session
@@ -116,14 +183,43 @@ class SessionService:
         Returns:
             Updated EmailSession if found, None otherwise
         """
-        session = self.get_session(session_id)
+        session = self.backend.append_feedback(session_id, feedback)
         
         if session:
-            session.feedback_history.append(feedback)
             _safe_log(f"Added feedback to session: {session_id}")
         
         return session
     
+    def restore_version(self, session_id: str, version: int) -> Optional[EmailSession]:
+        """
+        Make an earlier draft version the current draft
+        
+        The restored text is recorded as a new version, so the versions
+        after it stay available.
+        
+        Args:
+            session_id: Session identifier
+            version: Version number to restore
+            
+        Returns:
+            Updated EmailSession if found, None otherwise
+            
+        Raises:
+            ValueError: If the session does not keep that version
+            SessionConflictError: As for ``update_session``
+        """
+        session = self.backend.get(session_id)
+        if session is None:
+            return None
+        
+        content = session.history.get(version)
+        session = self.backend.update(session_id, {'generated_content': content})
+        
+        if session:
+            _safe_log(f"Restored version {version} of session: {session_id}")
+        
+        return session
+    
     def delete_session(self, session_id: str) -> bool:
         """
         Delete session
@@ -134,31 +230,45 @@ class SessionService:
         Returns:
             True if deleted, False if not found
         """
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        if self.backend.delete(session_id):
             _safe_log(f"Deleted session: {session_id}")
             return True
         return False
     
-    def cleanup_expired_sessions(self):
-        """Remove expired sessions from storage"""
-        try:
-            from flask import current_app
-            timeout = current_app.config.get('SESSION_TIMEOUT', 3600)
-        except RuntimeError:
-            timeout = 3600
-        
-        expired_sessions = [
-            sid for sid, session in self._sessions.items()
-            if is_session_expired(session.created_at, timeout)
-        ]
+    def cleanup_expired_sessions(self) -> int:
+        """
+        Remove every expired session from storage
         
-        for session_id in expired_sessions:
-            self.delete_session(session_id)
+        Returns:
+            Number of sessions removed
+        """
+        removed = 0
+        while True:
+            count, more = self.backend.reap(self.reap_batch)
+            removed += count
+            if not more:
+                break
         
-        if expired_sessions:
-            _safe_log(f"Cleaned up {len(expired_sessions)} expired sessions")
+        if removed:
+            _safe_log(f"Cleaned up {removed} expired sessions")
+        return removed
+    
+    def get_stats(self) -> Dict[str, object]:
+        """Return backend session counts and expiry settings"""
+        return {
+            **self.backend.get_stats(),
+            'timeout': self.backend.timeout,
+            'sliding': self.backend.sliding
+        }
+    
+    def _reap_loop(self):
+        """Drain expired sessions until stopped"""
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.cleanup_expired_sessions()
+            except Exception as e:
+                _safe_log(f"Session reaper error: {e}")
 
 
 # Global session service instance
-session_service = SessionService()
+session_service = SessionService.from_env()
@@ -0,0 +1,1103 @@
+"""
+Session Storage Backends
+In-memory and SQLite storage behind the SessionService
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from app.models.state import EmailSession
+from app.utils.helpers import is_enabled
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "💾"
+        print(f"{emoji} {message}")
+
+
+def _apply_changes(session: EmailSession, changes: Dict[str, object]):
+    """Set the given attributes, ignoring names the session does not have"""
+    for key, value in changes.items():
+        if hasattr(session, key):
+            setattr(session, key, value)
+
+
+class SessionConflictError(RuntimeError):
+    """Raised when a session changed in another process since it was read"""
+
+
+class SessionBackend:
+    """
+    Base class for session storage
+
+    Backends own expiry: ``get`` never returns an expired session and
+    ``reap`` removes expired sessions in bounded batches. ``update`` and
+    ``append_feedback`` are atomic read-modify-writes of one session and
+    return the session as stored afterwards.
+    """
+
+    name = 'base'
+
+    def __init__(self, timeout: float = 3600, sliding: bool = False):
+        self.timeout = timeout
+        self.sliding = sliding
+
+    def create(self, session: EmailSession):
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[EmailSession]:
+        raise NotImplementedError
+
+    def update(self, session_id: str, changes: Dict[str, object]) -> Optional[EmailSession]:
+        raise NotImplementedError
+
+    def append_feedback(self, session_id: str, feedback: str) -> Optional[EmailSession]:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def reap(self, limit: int) -> Tuple[int, bool]:
+        """
+        Remove up to ``limit`` expired sessions
+
+        Returns:
+            Tuple of (sessions removed, whether expired sessions remain)
+        """
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, object]:
+        return {'backend': self.name}
+
+    def close(self):
+        """Release resources (pending writes are flushed first)"""
+
+
+class _Entry:
+    """A stored session with its expiry deadline, size and read-modify-write lock"""
+
+    __slots__ = ('session', 'deadline', 'size', 'used_at', 'written_at', 'lock')
+
+    def __init__(self, session: EmailSession, deadline: float):
+        self.session = session
+        self.deadline = deadline
+        self.size = 0
+        self.used_at = self.written_at = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class _Shard:
+    """One stripe of the session map, with its own lock, heap and byte count"""
+
+    __slots__ = ('lock', 'entries', 'hot', 'heap', 'bytes', 'stats')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Least recently used first
+        self.entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        # Uncompressed sessions, least recently written first
+        self.hot: 'OrderedDict[str, None]' = OrderedDict()
+        self.heap: List[Tuple[float, str]] = []
+        self.bytes = 0
+        self.stats = {'created': 0, 'expired': 0, 'deleted': 0, 'evicted': 0, 'compressed': 0}
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Lock-striped in-process session map
+
+    Sessions are spread over ``shards`` stripes by session id, each with
+    its own lock, so requests for different sessions rarely contend.
+    Shard locks are only held for dictionary and heap operations;
+    read-modify-writes of one session take that session's own lock.
+
+    Each shard keeps a min-heap of expiry deadlines with one entry per
+    live session. With sliding expiry a hit only moves the deadline; the
+    heap entry is rescheduled when ``reap`` reaches it.
+
+    Memory is bounded by ``budget_bytes`` for the whole store (0 for no
+    limit): every write updates the session's approximate size, and once
+    the total is over budget the least recently used sessions are evicted.
+    Each shard keeps its sessions in access order, so the store-wide LRU
+    session is the oldest of the shards' heads. During ``reap``, drafts
+    not written for ``compress_after`` seconds are zlib-compressed in place.
+    """
+
+    name = 'memory'
+
+    def __init__(self, timeout: float = 3600, sliding: bool = False, shards: int = 16,
+                 budget_bytes: int = 0, compress_after: float = 300, compress_min_size: int = 512):
+        super().__init__(timeout, sliding)
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self.budget_bytes = budget_bytes
+        self.compress_after = compress_after
+        self.compress_min_size = compress_min_size
+        # Only one thread evicts at a time; it keeps going until under budget
+        self._evicting = threading.Lock()
+
+    def create(self, session: EmailSession):
+        deadline = time.monotonic() + self.timeout
+        entry = _Entry(session, deadline)
+        shard = self._shard(session.session_id)
+        with shard.lock:
+            shard.entries[session.session_id] = entry
+            heapq.heappush(shard.heap, (deadline, session.session_id))
+            shard.stats['created'] += 1
+        self._resize(shard, session.session_id, entry, session.nbytes())
+
+    def get(self, session_id: str) -> Optional[EmailSession]:
+        entry = self._get_entry(session_id)
+        return entry.session if entry is not None else None
+
+    def update(self, session_id: str, changes: Dict[str, object]) -> Optional[EmailSession]:
+        entry = self._get_entry(session_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            _apply_changes(entry.session, changes)
+            size = entry.session.nbytes()
+        self._resize(self._shard(session_id), session_id, entry, size)
+        return entry.session
+
+    def append_feedback(self, session_id: str, feedback: str) -> Optional[EmailSession]:
+        entry = self._get_entry(session_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            entry.session.feedback_history.append(feedback)
+            size = entry.session.nbytes()
+        self._resize(self._shard(session_id), session_id, entry, size)
+        return entry.session
+
+    def delete(self, session_id: str) -> bool:
+        shard = self._shard(session_id)
+        with shard.lock:
+            # The heap entry is discarded when reap pops it
+            if self._drop(shard, session_id) is None:
+                return False
+            shard.stats['deleted'] += 1
+        return True
+
+    def reap(self, limit: int) -> Tuple[int, bool]:
+        """
+        Pop up to ``limit`` due heap entries per shard, one shard lock at a
+        time, and compress up to ``limit`` cold drafts per shard outside
+        the shard lock
+        """
+        removed, more = 0, False
+        for shard in self._shards:
+            count, shard_more = self._reap_shard(shard, limit)
+            removed += count
+            more = more or shard_more
+            self._compact_heap(shard)
+            if self.compress_after >= 0:
+                self._compress_cold(shard, limit)
+        return removed, more
+
+    def get_stats(self) -> Dict[str, object]:
+        stats = {'active': 0, 'expiry_heap': 0, 'bytes': 0, 'cold': 0,
+                 'created': 0, 'expired': 0, 'deleted': 0, 'evicted': 0, 'compressed': 0}
+        for shard in self._shards:
+            with shard.lock:
+                stats['active'] += len(shard.entries)
+                stats['expiry_heap'] += len(shard.heap)
+                stats['bytes'] += shard.bytes
+                stats['cold'] += len(shard.entries) - len(shard.hot)
+                for key, value in shard.stats.items():
+                    stats[key] += value
+        return {
+            'backend': self.name,
+            **stats,
+            'budget_bytes': self.budget_bytes,
+            'shards': len(self._shards)
+        }
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _get_entry(self, session_id: str) -> Optional[_Entry]:
+        """Look up a live entry, expiring or sliding it as needed"""
+        if not session_id:
+            return None
+
+        now = time.monotonic()
+        shard = self._shard(session_id)
+        with shard.lock:
+            entry = shard.entries.get(session_id)
+            if entry is None:
+                return None
+
+            if entry.deadline <= now:
+                # The heap entry is discarded when reap pops it
+                self._drop(shard, session_id)
+                shard.stats['expired'] += 1
+                return None
+
+            shard.entries.move_to_end(session_id)
+            entry.used_at = now
+            if self.sliding:
+                entry.deadline = now + self.timeout
+
+        return entry
+
+    def _drop(self, shard: _Shard, session_id: str) -> Optional[_Entry]:
+        """Remove an entry and its byte count (lock held)"""
+        entry = shard.entries.pop(session_id, None)
+        if entry is not None:
+            shard.hot.pop(session_id, None)
+            shard.bytes -= entry.size
+        return entry
+
+    def _resize(self, shard: _Shard, session_id: str, entry: _Entry, size: int):
+        """Record a written session's new size and evict to stay in budget"""
+        with shard.lock:
+            if shard.entries.get(session_id) is not entry:
+                # Removed while it was being written
+                return
+            shard.bytes += size - entry.size
+            entry.size = size
+            entry.used_at = entry.written_at = time.monotonic()
+            shard.entries.move_to_end(session_id)
+            shard.hot[session_id] = None
+            shard.hot.move_to_end(session_id)
+
+        if self.budget_bytes > 0 and self._total_bytes() > self.budget_bytes:
+            self._evict(session_id)
+
+    def _total_bytes(self) -> int:
+        # Unlocked reads of the shard counters; exact enough for a budget
+        return sum(shard.bytes for shard in self._shards)
+
+    def _evict(self, keep: str):
+        """Evict store-wide least recently used sessions until under budget"""
+        if not self._evicting.acquire(blocking=False):
+            return
+        try:
+            while self._total_bytes() > self.budget_bytes:
+                # Each shard's head is its least recently used session
+                oldest = None
+                for shard in self._shards:
+                    with shard.lock:
+                        for session_id, entry in shard.entries.items():
+                            if session_id != keep:
+                                if oldest is None or entry.used_at < oldest[0]:
+                                    oldest = (entry.used_at, shard, session_id, entry)
+                                break
+                if oldest is None:
+                    return
+
+                _, shard, session_id, entry = oldest
+                with shard.lock:
+                    # Skip if it was used or removed since we looked
+                    if shard.entries.get(session_id) is entry and entry.used_at == oldest[0]:
+                        self._drop(shard, session_id)
+                        shard.stats['evicted'] += 1
+        finally:
+            self._evicting.release()
+
+    def _compress_cold(self, shard: _Shard, limit: int):
+        """
+        Compress drafts of sessions not written for ``compress_after`` seconds
+
+        The shard lock is only held to take candidates off the hot list and
+        to record their new sizes; each draft is compressed under its own
+        session lock, so requests for the shard's other sessions never wait
+        on zlib.
+        """
+        cutoff = time.monotonic() - self.compress_after
+        candidates = []
+        with shard.lock:
+            while shard.hot and len(candidates) < limit:
+                session_id = next(iter(shard.hot))
+                entry = shard.entries.get(session_id)
+                if entry is None:
+                    del shard.hot[session_id]
+                    continue
+                if entry.written_at > cutoff:
+                    break
+                del shard.hot[session_id]
+                candidates.append((session_id, entry))
+
+        for session_id, entry in candidates:
+            if not entry.lock.acquire(blocking=False):
+                # Being written right now; its write puts it back on the hot list
+                continue
+            try:
+                if entry.written_at > cutoff:
+                    # Written since it was picked, and back on the hot list
+                    continue
+                compressed = entry.session.compress(self.compress_min_size)
+                size = entry.session.nbytes()
+            finally:
+                entry.lock.release()
+
+            with shard.lock:
+                if compressed:
+                    shard.stats['compressed'] += 1
+                if shard.entries.get(session_id) is entry:
+                    shard.bytes += size - entry.size
+                    entry.size = size
+
+    def _compact_heap(self, shard: _Shard):
+        """Rebuild a shard's heap once deleted sessions make up most of it"""
+        with shard.lock:
+            if len(shard.heap) <= 2 * len(shard.entries) + 64:
+                return
+            shard.heap = [(entry.deadline, sid) for sid, entry in shard.entries.items()]
+            heapq.heapify(shard.heap)
+
+    def _reap_shard(self, shard: _Shard, limit: int) -> Tuple[int, bool]:
+        """
+        Pop up to ``limit`` due heap entries of one shard
+
+        Entries for deleted sessions are dropped and entries whose deadline
+        slid forward are pushed back with the new deadline.
+        """
+        now = time.monotonic()
+        removed = 0
+        with shard.lock:
+            heap = shard.heap
+            for _ in range(limit):
+                if not heap or heap[0][0] > now:
+                    break
+                _, session_id = heapq.heappop(heap)
+                entry = shard.entries.get(session_id)
+                if entry is None:
+                    continue
+                if entry.deadline > now:
+                    heapq.heappush(heap, (entry.deadline, session_id))
+                    continue
+                self._drop(shard, session_id)
+                removed += 1
+            shard.stats['expired'] += removed
+            return removed, bool(heap) and heap[0][0] <= now
+
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)",
+)
+
+# Fixed statement texts, so each connection's statement cache reuses the
+# prepared statements
+_SELECT = "SELECT data, expires_at FROM sessions WHERE session_id = ?"
+_INSERT = "INSERT OR REPLACE INTO sessions (session_id, data, expires_at, version) VALUES (?, ?, ?, 0)"
+_UPDATE = "UPDATE sessions SET data = ?, expires_at = ?, version = version + 1 WHERE session_id = ?"
+_TOUCH = "UPDATE sessions SET expires_at = ? WHERE session_id = ? AND expires_at < ?"
+_DELETE = "DELETE FROM sessions WHERE session_id = ?"
+_REAP = ("DELETE FROM sessions WHERE session_id IN "
+         "(SELECT session_id FROM sessions WHERE expires_at <= ? LIMIT ?)")
+_COUNT = "SELECT COUNT(*) FROM sessions"
+_LOAD = "SELECT data, expires_at, version FROM sessions WHERE session_id = ?"
+_STORE = ("UPDATE sessions SET data = ?, expires_at = ?, version = version + 1 "
+          "WHERE session_id = ? AND version = ?")
+
+
+class _Write:
+    """One queued write and its outcome"""
+
+    __slots__ = ('fn', 'result', 'error', 'done')
+
+    def __init__(self, fn: Callable[[sqlite3.Connection], object]):
+        self.fn = fn
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Sessions in an SQLite database shared by every process on the host
+
+    The database runs in WAL mode, so readers never block the writer or
+    each other. Each session is one row holding its ``to_record`` JSON
+    and a wall-clock ``expires_at`` (indexed for reaping).
+
+    Writes are group-committed by a single writer thread per process:
+    concurrent callers queue their write, the writer runs up to
+    ``batch_size`` of them in one ``BEGIN IMMEDIATE`` transaction and
+    wakes them after the commit. Each write runs in its own savepoint, so
+    a write that raises is rolled back alone. Read-modify-writes run
+    inside that transaction, which holds the database write lock, so they
+    are atomic across processes too. Reads use one connection per thread.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = 'sessions.db', timeout: float = 3600, sliding: bool = False,
+                 commit_interval: float = 0.001, batch_size: int = 256, busy_timeout: float = 5.0):
+        super().__init__(timeout, sliding)
+        self.path = path
+        self.commit_interval = commit_interval
+        self.batch_size = max(1, batch_size)
+        self.busy_timeout = busy_timeout
+
+        self._cond = threading.Condition()
+        self._buffer: List[_Write] = []
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {'commits': 0, 'writes': 0, 'errors': 0}
+
+    def create(self, session: EmailSession):
+        data = json.dumps(session.to_record(), separators=(',', ':'))
+        expires_at = time.time() + self.timeout
+        self._write(lambda conn: conn.execute(_INSERT, (session.session_id, data, expires_at)))
+
+    def get(self, session_id: str) -> Optional[EmailSession]:
+        if not session_id:
+            return None
+        now = time.time()
+        row = self._reader().execute(_SELECT, (session_id,)).fetchone()
+        if row is None or row[1] <= now:
+            # Expired rows are removed by reap
+            return None
+
+        if self.sliding:
+            # Best effort: callers do not wait for the new deadline to commit
+            expires_at = now + self.timeout
+            self._write(lambda conn: conn.execute(_TOUCH, (expires_at, session_id, expires_at)), wait=False)
+        return EmailSession.from_record(json.loads(row[0]))
+
+    def update(self, session_id: str, changes: Dict[str, object]) -> Optional[EmailSession]:
+        return self._modify(session_id, lambda session: _apply_changes(session, changes))
+
+    def append_feedback(self, session_id: str, feedback: str) -> Optional[EmailSession]:
+        return self._modify(session_id, lambda session: session.feedback_history.append(feedback))
+
+    def delete(self, session_id: str) -> bool:
+        return self._write(lambda conn: conn.execute(_DELETE, (session_id,)).rowcount > 0)
+
+    def reap(self, limit: int) -> Tuple[int, bool]:
+        removed = self._write(lambda conn: conn.execute(_REAP, (time.time(), limit)).rowcount)
+        return removed, removed >= limit
+
+    def load(self, session_id: str) -> Optional[Tuple[EmailSession, int, float]]:
+        """
+        Read a live session with its version
+
+        Returns:
+            Tuple of (session, version, expires_at), or None
+        """
+        row = self._reader().execute(_LOAD, (session_id,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return EmailSession.from_record(json.loads(row[0])), row[2], row[1]
+
+    def store_many(self, writes: List[Tuple[str, Optional[str], int, float]]) -> List[Optional[int]]:
+        """
+        Write many sessions in one transaction, each only if unchanged
+
+        Args:
+            writes: (session_id, record JSON, expected version, expires_at);
+                a None record only moves the expiry (never conflicts)
+
+        Returns:
+            Per write, the new version, or None if the row was changed by
+            another writer or no longer exists
+        """
+        def apply(conn: sqlite3.Connection) -> List[Optional[int]]:
+            versions = []
+            for session_id, data, version, expires_at in writes:
+                if data is None:
+                    conn.execute(_TOUCH, (expires_at, session_id, expires_at))
+                    versions.append(version)
+                elif conn.execute(_STORE, (data, expires_at, session_id, version)).rowcount:
+                    versions.append(version + 1)
+                else:
+                    versions.append(None)
+            return versions
+
+        return self._write(apply) if writes else []
+
+    def get_stats(self) -> Dict[str, object]:
+        try:
+            active = self._reader().execute(_COUNT).fetchone()[0]
+        except sqlite3.Error:
+            active = None
+        with self._cond:
+            return {
+                'backend': self.name,
+                'path': self.path,
+                'active': active,
+                'queued_writes': len(self._buffer),
+                **self._stats
+            }
+
+    def close(self):
+        """Flush queued writes and stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        writer = self._writer
+        if writer is not None:
+            writer.join(timeout=10)
+
+    def _modify(self, session_id: str, mutate: Callable[[EmailSession], None]) -> Optional[EmailSession]:
+        """Atomically load, change and store one live session"""
+        if not session_id:
+            return None
+
+        def apply(conn: sqlite3.Connection) -> Optional[EmailSession]:
+            now = time.time()
+            row = conn.execute(_SELECT, (session_id,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            session = EmailSession.from_record(json.loads(row[0]))
+            mutate(session)
+            expires_at = now + self.timeout if self.sliding else row[1]
+            data = json.dumps(session.to_record(), separators=(',', ':'))
+            conn.execute(_UPDATE, (data, expires_at, session_id))
+            return session
+
+        return self._write(apply)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self._start()
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _start(self):
+        """Create the schema and start the writer thread (idempotent)"""
+        if self._writer is not None:
+            return
+        with self._cond:
+            if self._writer is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._writer = threading.Thread(target=self._writer_loop, args=(conn,),
+                                            name='session-db-writer', daemon=True)
+            self._writer.start()
+        _safe_log(f"Session database opened: {self.path}")
+
+    def _write(self, fn: Callable[[sqlite3.Connection], object], wait: bool = True):
+        """
+        Queue a write for the next group commit
+
+        Raises:
+            RuntimeError: If the backend is closed or the write failed
+        """
+        self._start()
+        write = _Write(fn)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Session database is closed")
+            self._buffer.append(write)
+            self._cond.notify()
+        if not wait:
+            return None
+
+        write.done.wait()
+        if write.error is not None:
+            raise RuntimeError(f"Session database write failed: {write.error}")
+        return write.result
+
+    def _writer_loop(self, conn: sqlite3.Connection):
+        """Run queued writes, one transaction per batch"""
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if not self._buffer and self._closed:
+                    break
+
+            # Let concurrent writers join this commit
+            if self.commit_interval > 0:
+                time.sleep(self.commit_interval)
+
+            with self._cond:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+
+            self._commit(conn, batch)
+
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for write in batch:
+                # One bad write must not fail the batch or stop the writer,
+                # and must leave nothing of itself in the commit
+                conn.execute('SAVEPOINT w')
+                try:
+                    write.result = write.fn(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO w')
+                    write.error = e
+                conn.execute('RELEASE w')
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for write in batch:
+                write.error = write.error or e
+            _safe_log(f"Session database commit failed: {e}", 'error')
+
+        with self._cond:
+            self._stats['commits'] += 1
+            self._stats['writes'] += len(batch)
+            self._stats['errors'] += sum(1 for write in batch if write.error is not None)
+        for write in batch:
+            write.done.set()
+
+
+class _Cached:
+    """A cached session, its stored version and the changes not yet flushed"""
+
+    __slots__ = ('session', 'version', 'expires_at', 'loaded_at', 'ops', 'dirty', 'touched',
+                 'flushing', 'lock')
+
+    def __init__(self, session: EmailSession, version: int, expires_at: float):
+        self.session = session
+        self.version = version
+        self.expires_at = expires_at
+        self.loaded_at = time.monotonic()
+        self.ops: List[Tuple[str, object]] = []
+        self.dirty = False
+        self.touched = False
+        # Set while a flush of this entry is in flight
+        self.flushing = False
+        self.lock = threading.Condition()
+
+
+def _overwrite(target: EmailSession, source: EmailSession):
+    """Copy every stored field, keeping the object callers already hold"""
+    # Slots rather than properties, so the copy is not recorded as a new draft version
+    for key in EmailSession.__slots__:
+        setattr(target, key, getattr(source, key))
+
+
+def _replay(session: EmailSession, ops: List[Tuple[str, object]]):
+    for kind, value in ops:
+        if kind == 'feedback':
+            session.feedback_history.append(value)
+        else:
+            _apply_changes(session, value)
+
+
+class CachedSessionBackend(SessionBackend):
+    """
+    Per-process read-through, write-behind cache over a SQLiteSessionBackend
+
+    Reads are served from the cache; clean entries older than ``ttl``
+    seconds are re-read so changes made by other processes show up.
+    A read may therefore be up to ``ttl`` seconds behind other processes.
+
+    Every stored row carries a version, and the two kinds of change are
+    handled differently:
+
+    - ``append_feedback`` is write-behind. The cached session changes in
+      place and the append is recorded; dirty sessions are coalesced and
+      flushed by a background thread every ``flush_interval`` seconds, or
+      as soon as ``flush_size`` are dirty, in one group commit. A flush
+      writes a session only if its version is still the one this process
+      read; when another process got there first, the session is re-read
+      and the pending appends are replayed on top. Appends commute, so no
+      feedback is lost.
+    - ``update`` (field assignments such as a new draft or final text) is
+      written through, and only if the stored version is still the one
+      the cached view is based on. Values computed from a stale view are
+      never merged: the update fails with SessionConflictError, the cached
+      view is refreshed, and the caller can retry from the current state.
+
+    Creates and deletes are written through.
+
+    ``close`` (called from SessionService.stop and at process exit)
+    flushes everything still dirty. Writes buffered at the moment of a
+    hard crash are lost.
+    """
+
+    name = 'cached'
+
+    def __init__(self, store: 'SQLiteSessionBackend', max_entries: int = 10000, ttl: float = 1.0,
+                 flush_interval: float = 0.05, flush_size: int = 256, max_retries: int = 5):
+        super().__init__(store.timeout, store.sliding)
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_size = max(1, flush_size)
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._entries: 'OrderedDict[str, _Cached]' = OrderedDict()
+        self._dirty: Dict[str, _Cached] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {'hits': 0, 'misses': 0, 'flushes': 0, 'flushed': 0, 'conflicts': 0, 'dropped': 0}
+
+    def create(self, session: EmailSession):
+        self.store.create(session)
+        with self._cond:
+            self._put(session.session_id, _Cached(session, 0, time.time() + self.timeout))
+
+    def get(self, session_id: str) -> Optional[EmailSession]:
+        entry = self._entry(session_id)
+        if entry is None:
+            return None
+        if self.sliding:
+            with entry.lock:
+                entry.touched = True
+            self._mark_dirty(session_id, entry)
+        return entry.session
+
+    def update(self, session_id: str, changes: Dict[str, object]) -> Optional[EmailSession]:
+        """
+        Write field changes through, conditional on the cached version
+
+        Raises:
+            SessionConflictError: If another process changed the session
+                since this process read it
+        """
+        entry = self._entry(session_id)
+        if entry is None:
+            return None
+
+        with entry.lock:
+            # Our own in-flight flush would otherwise look like a conflict
+            entry.lock.wait_for(lambda: not entry.flushing)
+            candidate = EmailSession.from_record(entry.session.to_record())
+            _apply_changes(candidate, changes)
+            expires_at = time.time() + self.timeout if self.sliding else entry.expires_at
+            data = json.dumps(candidate.to_record(), separators=(',', ':'))
+            version = self.store.store_many([(session_id, data, entry.version, expires_at)])[0]
+            if version is not None:
+                _overwrite(entry.session, candidate)
+                entry.version, entry.expires_at = version, expires_at
+                entry.loaded_at = time.monotonic()
+                # Pending appends were part of this write
+                entry.ops = []
+                entry.touched = False
+                return entry.session
+
+        with self._cond:
+            self._stats['conflicts'] += 1
+        self._rebase(session_id, entry, [])
+        with self._cond:
+            if self._entries.get(session_id) is not entry:
+                # Deleted or expired meanwhile
+                return None
+        raise SessionConflictError(f"Session {session_id} was changed by another request; please retry")
+
+    def append_feedback(self, session_id: str, feedback: str) -> Optional[EmailSession]:
+        return self._record(session_id, 'feedback', feedback)
+
+    def delete(self, session_id: str) -> bool:
+        with self._cond:
+            self._entries.pop(session_id, None)
+            self._dirty.pop(session_id, None)
+        return self.store.delete(session_id)
+
+    def reap(self, limit: int) -> Tuple[int, bool]:
+        # Expired cache entries are dropped on access or by LRU eviction
+        return self.store.reap(limit)
+
+    def flush(self) -> int:
+        """
+        Write every dirty session now
+
+        Sessions that lose a version race are rebased and retried right
+        away, up to ``max_retries`` times; any still conflicting stay
+        dirty for the next flush.
+
+        Returns:
+            Number of sessions written
+        """
+        written = 0
+        for _ in range(self.max_retries + 1):
+            count, conflicts = self._flush_once()
+            written += count
+            if not conflicts:
+                break
+        return written
+
+    def _flush_once(self) -> Tuple[int, int]:
+        """One group commit of the dirty sessions; returns (written, conflicts)"""
+        with self._cond:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0, 0
+
+        now = time.time()
+        writes, snapshots = [], []
+        for session_id, entry in dirty.items():
+            with entry.lock:
+                ops, entry.ops = entry.ops, []
+                touched, entry.touched = entry.touched, False
+                if not ops and not touched:
+                    entry.dirty = False
+                    continue
+                entry.flushing = True
+                if self.sliding:
+                    entry.expires_at = now + self.timeout
+                data = None
+                if ops:
+                    data = json.dumps(entry.session.to_record(), separators=(',', ':'))
+                # Stays dirty (never refreshed from the store) until written
+                writes.append((session_id, data, entry.version, entry.expires_at))
+                snapshots.append((session_id, entry, ops))
+
+        written = conflicts = 0
+        try:
+            try:
+                versions = self.store.store_many(writes)
+            except RuntimeError as e:
+                # Keep the changes and try again on the next flush
+                _safe_log(f"Session cache flush failed: {e}", 'error')
+                for session_id, entry, ops in snapshots:
+                    self._requeue(session_id, entry, ops)
+                return 0, 0
+
+            for (session_id, entry, ops), version in zip(snapshots, versions):
+                if version is not None:
+                    with entry.lock:
+                        entry.version = version
+                        entry.loaded_at = time.monotonic()
+                        if not entry.ops and not entry.touched:
+                            entry.dirty = False
+                    written += 1
+                else:
+                    conflicts += 1
+                    self._rebase(session_id, entry, ops)
+        finally:
+            for _, entry, _ in snapshots:
+                with entry.lock:
+                    entry.flushing = False
+                    entry.lock.notify_all()
+
+        with self._cond:
+            self._stats['flushes'] += 1
+            self._stats['flushed'] += written
+            self._stats['conflicts'] += conflicts
+        return written, conflicts
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._cond:
+            stats = {
+                'backend': self.name,
+                'cached': len(self._entries),
+                'dirty': len(self._dirty),
+                **self._stats
+            }
+        return {**stats, 'store': self.store.get_stats()}
+
+    def close(self):
+        """Flush dirty sessions, stop the flusher and close the store"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join(timeout=10)
+        for _ in range(10):
+            self.flush()
+            with self._cond:
+                if not self._dirty:
+                    break
+        self.store.close()
+
+    def _entry(self, session_id: str) -> Optional[_Cached]:
+        """Cached entry, re-read when stale; None if missing or expired"""
+        if not session_id:
+            return None
+
+        with self._cond:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                fresh = entry.dirty or time.monotonic() - entry.loaded_at < self.ttl
+                if entry.expires_at <= time.time() and not entry.dirty:
+                    del self._entries[session_id]
+                    entry = None
+                elif fresh:
+                    self._entries.move_to_end(session_id)
+                    self._stats['hits'] += 1
+                    return entry
+            self._stats['misses'] += 1
+
+        loaded = self.store.load(session_id)
+        with self._cond:
+            current = self._entries.get(session_id)
+            if current is not None and current.dirty:
+                # Changed locally while we were reading
+                return current
+            if loaded is None:
+                self._entries.pop(session_id, None)
+                return None
+            session, version, expires_at = loaded
+            if current is not None:
+                if version < current.version:
+                    # A flush from this process landed after our read
+                    return current
+                # Refresh in place so sessions handed out earlier stay current
+                with current.lock:
+                    _overwrite(current.session, session)
+                    current.version, current.expires_at = version, expires_at
+                    current.loaded_at = time.monotonic()
+                return current
+            entry = _Cached(session, version, expires_at)
+            self._put(session_id, entry)
+            return entry
+
+    def _record(self, session_id: str, kind: str, value) -> Optional[EmailSession]:
+        """Apply a change to the cached session and queue it for the next flush"""
+        entry = self._entry(session_id)
+        if entry is None:
+            return None
+        with entry.lock:
+            _replay(entry.session, [(kind, value)])
+            entry.ops.append((kind, value))
+        self._mark_dirty(session_id, entry)
+        return entry.session
+
+    def _mark_dirty(self, session_id: str, entry: _Cached):
+        with self._cond:
+            entry.dirty = True
+            self._dirty[session_id] = entry
+            if session_id not in self._entries:
+                self._put(session_id, entry)
+            self._start_locked()
+            if len(self._dirty) >= self.flush_size:
+                self._cond.notify()
+
+    def _requeue(self, session_id: str, entry: _Cached, ops: List[Tuple[str, object]]):
+        with entry.lock:
+            entry.ops = ops + entry.ops
+        self._mark_dirty(session_id, entry)
+
+    def _rebase(self, session_id: str, entry: _Cached, ops: List[Tuple[str, object]]):
+        """Another process wrote the session: replay our changes on its version"""
+        loaded = self.store.load(session_id)
+        if loaded is None:
+            # Deleted or expired meanwhile
+            with self._cond:
+                self._entries.pop(session_id, None)
+                self._stats['dropped'] += 1
+            _safe_log(f"Dropped changes to deleted session: {session_id}", 'error')
+            return
+
+        fresh, version, expires_at = loaded
+        with entry.lock:
+            pending = ops + entry.ops
+            _replay(fresh, pending)
+            _overwrite(entry.session, fresh)
+            entry.version, entry.expires_at = version, expires_at
+            entry.loaded_at = time.monotonic()
+            entry.ops = pending
+        self._mark_dirty(session_id, entry)
+
+    def _put(self, session_id: str, entry: _Cached):
+        """Insert and evict clean least recently used entries (lock held)"""
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        excess = len(self._entries) - self.max_entries
+        # Dirty entries are rotated to the back rather than evicted, so the
+        # scan is bounded by how many are dirty
+        scanned = 0
+        while excess > 0 and scanned < len(self._entries):
+            old_id, old = self._entries.popitem(last=False)
+            if old_id in self._dirty or old_id == session_id:
+                self._entries[old_id] = old
+                scanned += 1
+            else:
+                excess -= 1
+
+    def _start_locked(self):
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-cache-flusher',
+                                             daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        """Flush on a timer, or early once enough sessions are dirty"""
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if len(self._dirty) < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                _safe_log(f"Session cache flush error: {e}", 'error')
+
+
+def create_backend(name: Optional[str] = None,
+                   settings: Optional[Mapping[str, object]] = None) -> SessionBackend:
+    """
+    Build the session backend selected by SESSION_BACKEND
+
+    Args:
+        name: 'memory' or 'sqlite' (defaults to SESSION_BACKEND)
+        settings: SESSION_* settings, e.g. the app config (defaults to
+            the environment)
+
+    Raises:
+        ValueError: For an unknown backend name
+    """
+    if settings is None:
+        settings = os.environ
+    name = (name or settings.get('SESSION_BACKEND', 'memory')).lower()
+    timeout = float(settings.get('SESSION_TIMEOUT', 3600))
+    sliding = is_enabled(settings.get('SESSION_SLIDING_EXPIRY', False))
+
+    if name == 'memory':
+        return MemorySessionBackend(
+            timeout=timeout,
+            sliding=sliding,
+            shards=int(settings.get('SESSION_SHARDS', 16)),
+            budget_bytes=int(settings.get('SESSION_MEMORY_BUDGET', 256 * 1024 * 1024)),
+            compress_after=float(settings.get('SESSION_COMPRESS_AFTER', 300))
+        )
+    if name == 'sqlite':
+        store = SQLiteSessionBackend(
+            path=settings.get('SESSION_DB_PATH', 'sessions.db'),
+            timeout=timeout,
+            sliding=sliding,
+            commit_interval=float(settings.get('SESSION_DB_COMMIT_INTERVAL', 0.001)),
+            batch_size=int(settings.get('SESSION_DB_BATCH_SIZE', 256))
+        )
+        if not is_enabled(settings.get('SESSION_CACHE_ENABLED', True)):
+            return store
+        return CachedSessionBackend(
+            store,
+            max_entries=int(settings.get('SESSION_CACHE_SIZE', 10000)),
+            ttl=float(settings.get('SESSION_CACHE_TTL', 1.0)),
+            flush_interval=float(settings.get('SESSION_CACHE_FLUSH_INTERVAL', 0.05)),
+            flush_size=int(settings.get('SESSION_CACHE_FLUSH_SIZE', 256))
+        )
+    raise ValueError(f"Unknown session backend: {name}")
@@ -0,0 +1,257 @@
+"""
+Similarity Service
+MinHash/LSH index that finds earlier drafts for near-duplicate topics
+"""
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional speed-up
+    np = None
+
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Words that do not change what an email is about
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'about', 're', 'regarding', 'for', 'to', 'of', 'on', 'in', 'at',
+    'with', 'and', 'or', 'please', 'my', 'our', 'your', 'me', 'us', 'i', 'we', 'is',
+    'email', 'mail', 'write', 'send', 'some', 'this', 'that', 'from'
+})
+
+
+def topic_shingles(topic: str) -> FrozenSet[str]:
+    """
+    Content words of a topic plus adjacent word pairs
+
+    "Schedule a meeting about Q3 budget" and "schedule meeting re: Q3
+    budget" both give {schedule, meeting, q3, budget, schedule meeting,
+    meeting q3, q3 budget}.
+    """
+    words = [w for w in _TOKEN.findall(topic.lower()) if w not in STOPWORDS]
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures over string shingles
+
+    Uses ``num_perm`` universal hash functions ``(a * x + b) mod p`` over
+    32-bit shingle hashes. NumPy is used when installed; otherwise the
+    per-shingle hash rows are memoized, since topics reuse a small
+    vocabulary.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1, row_cache_size: int = 65536):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        # a, b < 2**29 keeps a * x + b below 2**61 for 32-bit x
+        self._a = [rng.randrange(1, 1 << 29) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, 1 << 29) for _ in range(num_perm)]
+        self._ab = list(zip(self._a, self._b))
+        self._rows: Dict[str, Tuple[int, ...]] = {}
+        self._row_cache_size = row_cache_size
+        if np is not None:
+            self._np_a = np.array(self._a, dtype=np.uint64)[:, None]
+            self._np_b = np.array(self._b, dtype=np.uint64)[:, None]
+
+    def signature(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        """Return the MinHash signature (all-max for an empty set)"""
+        if not shingles:
+            return (_MAX_HASH,) * self.num_perm
+
+        if np is not None:
+            hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles]
+            x = np.array(hashes, dtype=np.uint64)[None, :]
+            values = ((self._np_a * x + self._np_b) % _MERSENNE_PRIME) & _MAX_HASH
+            return tuple(int(v) for v in values.min(axis=1))
+
+        return tuple(map(min, zip(*[self._row(s) for s in shingles])))
+
+    def _row(self, shingle: str) -> Tuple[int, ...]:
+        """All ``num_perm`` hash values of one shingle (memoized)"""
+        row = self._rows.get(shingle)
+        if row is None:
+            x = zlib.crc32(shingle.encode('utf-8'))
+            row = tuple([((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self._ab])
+            if len(self._rows) >= self._row_cache_size:
+                self._rows.clear()
+            self._rows[shingle] = row
+        return row
+
+
+class _Entry:
+    __slots__ = ('topic', 'shingles', 'bands', 'content', 'expires_at')
+
+    def __init__(self, topic, shingles, bands, content, expires_at):
+        self.topic = topic
+        self.shingles = shingles
+        self.bands = bands
+        self.content = content
+        self.expires_at = expires_at
+
+
+class SimilarityIndex:
+    """
+    Recent (topic, draft) pairs searchable by topic similarity
+
+    Signatures are split into ``bands`` of equal width; topics sharing any
+    band land in the same bucket and are verified with exact Jaccard
+    similarity of their shingles. At most ``max_candidates`` bucket
+    members are verified per lookup, which keeps lookups well under a
+    millisecond at 100k entries. Entries are evicted least recently
+    used first and expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 100000, ttl: float = 86400, max_candidates: int = 64):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_candidates = max_candidates
+        self.hasher = MinHasher(num_perm)
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[FrozenSet[str], _Entry]' = OrderedDict()
+        # Per band: bucket key -> members in insertion order (dict used as an ordered set)
+        self._buckets: List[Dict[int, Dict[FrozenSet[str], None]]] = [{} for _ in range(bands)]
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @classmethod
+    def from_env(cls) -> Optional['SimilarityIndex']:
+        """Build from LLM_SIMILAR_* settings (None unless enabled)"""
+        if os.environ.get('LLM_SIMILAR_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            threshold=float(os.environ.get('LLM_SIMILAR_THRESHOLD', 0.8)),
+            num_perm=int(os.environ.get('LLM_SIMILAR_NUM_PERM', 64)),
+            bands=int(os.environ.get('LLM_SIMILAR_BANDS', 16)),
+            max_entries=int(os.environ.get('LLM_SIMILAR_MAX_ENTRIES', 100000)),
+            ttl=float(os.environ.get('LLM_SIMILAR_TTL', 86400))
+        )
+
+    def lookup(self, topic: str) -> Optional[str]:
+        """
+        Find the draft of the most similar earlier topic
+
+        Args:
+            topic: New email topic
+
+        Returns:
+            The earlier draft, adapted to the new topic, or None
+        """
+        shingles = topic_shingles(topic)
+        if not shingles:
+            return None
+        bands = self._band_keys(shingles)
+        now = time.monotonic()
+
+        with self._lock:
+            best, best_score = None, 0.0
+            seen = set()
+            if shingles in self._entries:
+                best, best_score = shingles, 1.0
+                bands = ()
+            for band, key in enumerate(bands):
+                # Newest members first
+                for member in reversed(self._buckets[band].get(key, {})):
+                    if member in seen:
+                        continue
+                    seen.add(member)
+                    score = jaccard(shingles, member)
+                    if score > best_score:
+                        best, best_score = member, score
+                    if len(seen) >= self.max_candidates:
+                        break
+                if len(seen) >= self.max_candidates:
+                    break
+
+            entry = self._entries.get(best) if best is not None else None
+            if entry is not None and entry.expires_at <= now:
+                self._remove(best)
+                entry = None
+
+            if entry is None or best_score < self.threshold:
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(best)
+            self._stats['hits'] += 1
+            cached_topic, content = entry.topic, entry.content
+
+        return self.adapt(content, cached_topic, topic)
+
+    def add(self, topic: str, content: str):
+        """Index a generated draft under its topic"""
+        shingles = topic_shingles(topic)
+        if not shingles or not content:
+            return
+        bands = self._band_keys(shingles)
+
+        with self._lock:
+            if shingles in self._entries:
+                self._remove(shingles)
+            self._entries[shingles] = _Entry(topic, shingles, bands, content, time.monotonic() + self.ttl)
+            for band, key in enumerate(bands):
+                self._buckets[band].setdefault(key, {})[shingles] = None
+            self._stats['stores'] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    @staticmethod
+    def adapt(content: str, cached_topic: str, topic: str) -> str:
+        """Swap the earlier topic for the new one where it appears verbatim"""
+        if cached_topic == topic:
+            return content
+        return re.sub(re.escape(cached_topic), lambda _: topic, content, flags=re.IGNORECASE)
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return hit/miss counters and index size"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'threshold': self.threshold,
+                'numpy': np is not None
+            }
+
+    def _band_keys(self, shingles: FrozenSet[str]) -> List[int]:
+        signature = self.hasher.signature(shingles)
+        rows = self.rows
+        return [hash(signature[i * rows:(i + 1) * rows]) for i in range(self.bands)]
+
+    def _remove(self, shingles: FrozenSet[str]):
+        """Drop an entry and its bucket memberships (lock held)"""
+        entry = self._entries.pop(shingles, None)
+        if entry is None:
+            return
+        for band, key in enumerate(entry.bands):
+            bucket = self._buckets[band].get(key)
+            if bucket is None:
+                continue
+            bucket.pop(shingles, None)
+            if not bucket:
+                del self._buckets[band][key]
@@ -0,0 +1,262 @@
+"""
+Speculation Service
+Pre-generates likely refinements of a draft in the background
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, List, Optional
+from app.services.prompt_service import prompt_builder
+from app.services.template_service import FEEDBACK_KEYWORDS, classify_feedback
+from app.services.throttle_service import TokenBucket
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "🔮"
+        print(f"{emoji} {message}")
+
+
+# Feedback sent to the model when preparing each class of refinement
+SPECULATIVE_FEEDBACK = {
+    'concise': 'Make it shorter and more concise',
+    'formal': 'Make it more formal and professional',
+    'casual': 'Make it more casual and friendly',
+    'urgent': 'Make it sound urgent and important',
+    'detail': 'Add more detail and elaborate'
+}
+
+
+def _draft_key(draft: str) -> str:
+    return hashlib.sha256(draft.encode('utf-8')).hexdigest()
+
+
+class _Speculation:
+    """Prepared variants of one session draft"""
+
+    __slots__ = ('draft_key', 'futures')
+
+    def __init__(self, draft_key: str):
+        self.draft_key = draft_key
+        self.futures: Dict[str, Future] = {}
+
+
+class SpeculationService:
+    """
+    Background pre-generation of the most likely refinements
+
+    After a draft is produced, ``schedule`` queues the top ``classes``
+    (see FEEDBACK_KEYWORDS) on a small pool. When the user's feedback is
+    exactly one of a class's known phrases (see FEEDBACK_PHRASES),
+    ``take`` serves the prepared variant, waiting for it if it is already
+    running. Any other feedback goes to the model.
+
+    Speculation never competes hard with real traffic: a token bucket
+    caps how many speculative calls start per second, at most
+    ``max_pending`` are queued, calls are skipped while the LLM already
+    has ``max_load`` requests in flight or its breaker is not closed, and
+    a session's pending work is cancelled as soon as its draft changes.
+    """
+
+    def __init__(self, enabled: bool = False, classes: Optional[List[str]] = None,
+                 workers: int = 2, max_pending: int = 32, rate: float = 1.0, burst: float = 10,
+                 max_load: int = 8, max_sessions: int = 1000, wait_timeout: float = 20.0):
+        self.enabled = enabled
+        self.classes = [c for c in (classes or ['concise', 'formal', 'casual']) if c in FEEDBACK_KEYWORDS]
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_load = max_load
+        self.max_sessions = max_sessions
+        self.wait_timeout = wait_timeout
+
+        self._budget = TokenBucket(rate, burst)
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sessions: 'OrderedDict[str, _Speculation]' = OrderedDict()
+        self._pending = 0
+        self._stats = {
+            'scheduled': 0,
+            'skipped_budget': 0,
+            'skipped_load': 0,
+            'generated': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'hits': 0,
+            'misses': 0
+        }
+
+    @classmethod
+    def from_env(cls) -> 'SpeculationService':
+        """Build from LLM_SPECULATE_* settings"""
+        classes = os.environ.get('LLM_SPECULATE_CLASSES', 'concise,formal,casual')
+        return cls(
+            enabled=os.environ.get('LLM_SPECULATE_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+            classes=[c.strip() for c in classes.split(',') if c.strip()],
+            workers=int(os.environ.get('LLM_SPECULATE_WORKERS', 2)),
+            max_pending=int(os.environ.get('LLM_SPECULATE_MAX_PENDING', 32)),
+            rate=float(os.environ.get('LLM_SPECULATE_RATE', 1.0)),
+            burst=float(os.environ.get('LLM_SPECULATE_BURST', 10)),
+            max_load=int(os.environ.get('LLM_SPECULATE_MAX_LOAD', 8)),
+            max_sessions=int(os.environ.get('LLM_SPECULATE_MAX_SESSIONS', 1000)),
+            wait_timeout=float(os.environ.get('LLM_TIMEOUT', 20))
+        )
+
+    def schedule(self, session) -> int:
+        """
+        Queue speculative refinements of the session's current draft
+
+        Any earlier speculation for the session is cancelled.
+
+        Args:
+            session: EmailSession whose draft was just produced
+
+        Returns:
+            Number of variants queued
+        """
+        if not self.enabled or not self.classes or not session.generated_content:
+            return 0
+
+        history = list(session.feedback_history)
+        summary, summarized_count = session.feedback_summary, session.summarized_count
+        spec = _Speculation(_draft_key(session.generated_content))
+
+        queued = 0
+        with self._lock:
+            self._cancel_locked(session.session_id)
+            self._sessions[session.session_id] = spec
+            while len(self._sessions) > self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                self._cancel_spec(oldest)
+
+            now = time.monotonic()
+            for name in self.classes:
+                if self._pending >= self.max_pending or self._budget.delay_for(1, now) > 0:
+                    self._stats['skipped_budget'] += 1
+                    continue
+                self._budget.consume(1, now)
+                self._pending += 1
+
+                # Mirror the prompt the feedback route would build
+                feedback_text, _, _ = prompt_builder.compact_feedback(
+                    history + [SPECULATIVE_FEEDBACK[name]], summary, summarized_count
+                )
+                spec.futures[name] = self._get_executor().submit(
+                    self._run, session.topic, feedback_text, session.generated_content
+                )
+                queued += 1
+
+            self._stats['scheduled'] += queued
+
+        return queued
+
+    def take(self, session_id: str, feedback: str, draft: str) -> Optional[str]:
+        """
+        Serve a prepared variant if the feedback matches one
+
+        The session's remaining speculation is cancelled either way, since
+        the draft is about to change.
+
+        Args:
+            session_id: Session identifier
+            feedback: The user's feedback
+            draft: The draft the feedback applies to
+
+        Returns:
+            Prepared email content, or None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            spec = self._sessions.pop(session_id, None)
+        if spec is None:
+            return None
+
+        name = classify_feedback(feedback)
+        future = spec.futures.pop(name, None) if name else None
+        self._cancel_spec(spec)
+
+        content = None
+        if future is not None and spec.draft_key == _draft_key(draft):
+            try:
+                # Already queued or running for this exact request, so wait for it
+                content = future.result(timeout=self.wait_timeout)
+            except (CancelledError, FuturesTimeoutError):
+                content = None
+
+        with self._lock:
+            self._stats['hits' if content else 'misses'] += 1
+
+        if content:
+            _safe_log(f"Served speculative '{name}' refinement for session: {session_id}")
+        return content
+
+    def cancel(self, session_id: str):
+        """Drop pending speculation for a session"""
+        with self._lock:
+            self._cancel_locked(session_id)
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return speculation counters"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'enabled': self.enabled,
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'pending': self._pending,
+                'sessions': len(self._sessions)
+            }
+
+    def _run(self, topic: str, feedback_text: str, draft: str) -> Optional[str]:
+        """Generate one variant unless the LLM is busy"""
+        from app.services.llm_service import llm_service
+
+        try:
+            if llm_service.in_flight() >= self.max_load:
+                with self._lock:
+                    self._stats['skipped_load'] += 1
+                return None
+
+            content = llm_service.generate_speculative(topic, feedback_text, draft)
+            with self._lock:
+                self._stats['generated' if content else 'failed'] += 1
+            return content
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _cancel_locked(self, session_id: str):
+        """Cancel and forget a session's speculation (lock held)"""
+        spec = self._sessions.pop(session_id, None)
+        if spec is not None:
+            self._cancel_spec(spec)
+
+    def _cancel_spec(self, spec: _Speculation):
+        """Cancel variants that have not started; running ones finish unused"""
+        cancelled = sum(1 for future in spec.futures.values() if future.cancel())
+        if cancelled:
+            # Cancelled futures never run, so release their pending slots here
+            with self._lock:
+                self._pending -= cancelled
+                self._stats['cancelled'] += cancelled
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='speculate')
+        return self._executor
+
+
+# Global speculation service (disabled unless LLM_SPECULATE_ENABLED)
+speculation_service = SpeculationService.from_env()
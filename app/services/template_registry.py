@@ -0,0 +1,277 @@
+"""
+Template Registry
+Loads email templates and their keywords from a directory and classifies
+topics with a single compiled keyword automaton
+"""
+import os
+import string
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.utils.aho_corasick import AhoCorasick
+
+
+def _safe_log(message: str, level: str = 'info'):
+    """Safe logging that works both inside and outside app context"""
+    try:
+        from flask import current_app
+        if level == 'error':
+            current_app.logger.error(message)
+        else:
+            current_app.logger.info(message)
+    except RuntimeError:
+        # Outside app context, use print
+        emoji = "❌" if level == 'error' else "📄"
+        print(f"{emoji} {message}")
+
+
+DEFAULT_TEMPLATE = 'general'
+TEMPLATE_EXTENSION = '.txt'
+HEADER_SEPARATOR = '---'
+
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'email_templates')
+
+# Used only if the template directory is missing or has no 'general' template
+_BUILTIN_GENERAL = """Subject: Regarding {topic}
+
+Dear [Recipient],
+
+I'm writing to you about {topic}. Please let me know when would be a convenient time to discuss it.
+
+Best regards,
+[Your Name]"""
+
+
+def compile_template(body: str) -> Tuple[str, ...]:
+    """
+    Split a template body into the literal text around its placeholders
+
+    ``topic.join(segments)`` then renders the template exactly like
+    ``body.format(topic=topic)`` without re-parsing the format string.
+
+    Raises:
+        ValueError: If the body has a placeholder other than a plain {topic}
+    """
+    segments = []
+    literal = ''
+    for text, field, spec, conversion in string.Formatter().parse(body):
+        literal += text
+        if field is None:
+            continue
+        if field != 'topic' or spec or conversion:
+            raise ValueError(f"unsupported placeholder {{{field}}}; only {{topic}} is allowed")
+        segments.append(literal)
+        literal = ''
+    segments.append(literal)
+    return tuple(segments)
+
+
+class EmailTemplate(NamedTuple):
+    """One template file"""
+    name: str
+    body: str
+    keywords: Tuple[str, ...]
+    priority: int
+    segments: Tuple[str, ...]
+
+    def render(self, topic: str) -> str:
+        """Fill in the topic"""
+        return topic.join(self.segments)
+
+
+def parse_template_file(name: str, text: str) -> EmailTemplate:
+    """
+    Parse a template file
+
+    Files start with ``key: value`` header lines, then a ``---`` line,
+    then the template body with ``{topic}`` placeholders::
+
+        keywords: meeting, schedule, appointment
+        priority: 60
+        ---
+        Subject: Meeting Request - {topic}
+        ...
+
+    Files without a header are plain bodies with no keywords. The body is
+    compiled with ``compile_template``.
+    """
+    keywords: Tuple[str, ...] = ()
+    priority = 0
+    body = text
+
+    head, sep, rest = text.partition(f"\n{HEADER_SEPARATOR}\n")
+    if sep and all(':' in line for line in head.splitlines() if line.strip()):
+        body = rest
+        for line in head.splitlines():
+            key, _, value = line.partition(':')
+            key = key.strip().lower()
+            if key == 'keywords':
+                keywords = tuple(k.strip().lower() for k in value.split(',') if k.strip())
+            elif key == 'priority':
+                priority = int(value.strip() or 0)
+
+    body = body.strip('\n')
+    return EmailTemplate(name=name, body=body, keywords=keywords, priority=priority,
+                         segments=compile_template(body))
+
+
+class TemplateRegistry:
+    """
+    Directory-backed template registry
+
+    Every ``*.txt`` file in ``directory`` is a template named after the
+    file. All keywords of all templates are compiled into one
+    Aho-Corasick automaton, so classifying a topic costs one pass over
+    the topic regardless of the number of templates. When several
+    templates match, the highest ``priority`` wins, then the most
+    keyword hits, then the longest matched keyword.
+
+    File modification times are checked at most every ``check_interval``
+    seconds and the registry rebuilds itself when anything changed.
+    """
+
+    def __init__(self, directory: str = DEFAULT_TEMPLATE_DIR, check_interval: float = 2.0):
+        self.directory = directory
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        # (templates, matcher) swapped as one tuple so readers never see a mix
+        self._compiled: Tuple[Dict[str, EmailTemplate], AhoCorasick] = ({}, AhoCorasick(()))
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._stats = {'reloads': 0, 'errors': 0}
+
+        self.reload()
+
+    @classmethod
+    def from_env(cls) -> 'TemplateRegistry':
+        """Build from TEMPLATE_DIR and TEMPLATE_RELOAD_INTERVAL"""
+        return cls(
+            directory=os.environ.get('TEMPLATE_DIR', '') or DEFAULT_TEMPLATE_DIR,
+            check_interval=float(os.environ.get('TEMPLATE_RELOAD_INTERVAL', 2))
+        )
+
+    @property
+    def templates(self) -> Dict[str, EmailTemplate]:
+        """Current templates by name"""
+        self._maybe_reload()
+        return self._compiled[0]
+
+    def get(self, name: str) -> EmailTemplate:
+        """Template by name, or the default template"""
+        templates = self.templates
+        return templates.get(name) or templates[DEFAULT_TEMPLATE]
+
+    def classify(self, topic: str) -> str:
+        """
+        Pick the template for a topic
+
+        Args:
+            topic: Email topic (any case)
+
+        Returns:
+            Template name (DEFAULT_TEMPLATE when no keyword matches)
+        """
+        self._maybe_reload()
+        return self._classify(self._compiled, topic)
+
+    def classify_many(self, topics: List[str]) -> List[EmailTemplate]:
+        """
+        Pick the templates for many topics against one registry snapshot
+
+        Args:
+            topics: Email topics (any case)
+
+        Returns:
+            One template per topic, in order
+        """
+        self._maybe_reload()
+        compiled = self._compiled
+        templates = compiled[0]
+        return [templates[self._classify(compiled, topic)] for topic in topics]
+
+    @staticmethod
+    def _classify(compiled: Tuple[Dict[str, EmailTemplate], AhoCorasick], topic: str) -> str:
+        templates, matcher = compiled
+        scores: Dict[str, List[int]] = {}
+        for _, keyword, name in matcher.iter_matches(topic.lower()):
+            score = scores.get(name)
+            if score is None:
+                scores[name] = [templates[name].priority, 1, len(keyword)]
+            else:
+                score[1] += 1
+                score[2] = max(score[2], len(keyword))
+
+        if not scores:
+            return DEFAULT_TEMPLATE
+        return max(scores, key=scores.get)
+
+    def reload(self) -> bool:
+        """
+        Load every template file and rebuild the matcher
+
+        Returns:
+            True if the templates were (re)loaded
+        """
+        signature = self._directory_signature()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if signature == self._signature and self._compiled[0]:
+                return False
+            if signature is None:
+                _safe_log(f"Template directory unavailable: {self.directory}", 'error')
+
+            templates: Dict[str, EmailTemplate] = {}
+            for filename, _, _ in signature or ():
+                name = filename[:-len(TEMPLATE_EXTENSION)]
+                try:
+                    with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                        templates[name] = parse_template_file(name, f.read())
+                except (OSError, ValueError) as e:
+                    self._stats['errors'] += 1
+                    _safe_log(f"Skipping template {filename}: {e}", 'error')
+
+            if DEFAULT_TEMPLATE not in templates:
+                templates[DEFAULT_TEMPLATE] = EmailTemplate(
+                    DEFAULT_TEMPLATE, _BUILTIN_GENERAL, (), 0, compile_template(_BUILTIN_GENERAL)
+                )
+
+            matcher = AhoCorasick(
+                (keyword, name) for name, template in templates.items() for keyword in template.keywords
+            )
+            self._compiled = (templates, matcher)
+            self._signature = signature
+            self._stats['reloads'] += 1
+
+        _safe_log(f"Loaded {len(templates)} email templates from {self.directory}")
+        return True
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return registry size and reload counters"""
+        with self._lock:
+            templates, matcher = self._compiled
+            return {
+                'directory': self.directory,
+                'templates': len(templates),
+                'keywords': sum(len(t.keywords) for t in templates.values()),
+                'automaton_states': matcher.states,
+                **self._stats
+            }
+
+    def _maybe_reload(self):
+        if self.check_interval < 0 or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self.reload()
+
+    def _directory_signature(self) -> Optional[Tuple]:
+        """Sorted (filename, mtime_ns, size) of every template file"""
+        try:
+            entries = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(TEMPLATE_EXTENSION) and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+            return tuple(sorted(entries))
+        except OSError:
+            return None
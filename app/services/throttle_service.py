@@ -0,0 +1,270 @@
+"""
+Throttle Service
+Token buckets and a per-recipient-domain send scheduler
+"""
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Classic token bucket
+
+    ``rate`` tokens are added per second up to ``burst``. A rate of 0 or
+    less means unlimited. Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def delay_for(self, cost: float, now: float) -> float:
+        """Seconds until ``cost`` tokens are available (0 if now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # A cost above the burst size is admitted on a full bucket and
+        # paid back by going negative, so the long-run rate still holds
+        needed = min(cost, self.burst)
+        if self._tokens >= needed:
+            return 0.0
+        return (needed - self._tokens) / self.rate
+
+    def consume(self, cost: float, now: float):
+        """Take ``cost`` tokens"""
+        if self.unlimited:
+            return
+        self._refill(now)
+        self._tokens -= cost
+
+    def full_at(self, now: float) -> float:
+        """Time at which the bucket is back to ``burst`` (``now`` if it is)"""
+        if self.unlimited:
+            return now
+        self._refill(now)
+        return now + max(0.0, self.burst - self._tokens) / self.rate
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+
+def parse_domain_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse ``"gmail.com=2:20,yahoo.com=1:10"`` into {domain: (rate, burst)}
+
+    Args:
+        spec: Comma-separated ``domain=rate:burst`` pairs
+
+    Returns:
+        Mapping of lowercase domain to (rate per second, burst size)
+    """
+    limits = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part or '=' not in part:
+            continue
+        domain, _, values = part.partition('=')
+        rate, _, burst = values.partition(':')
+        rate = float(rate)
+        limits[domain.strip().lower()] = (rate, float(burst) if burst else max(1.0, rate))
+    return limits
+
+
+def recipient_domain(recipient_email: str) -> str:
+    """Return the lowercase domain of an email address"""
+    return recipient_email.rpartition('@')[2].lower()
+
+
+class DomainScheduler:
+    """
+    Bounded multi-queue that releases work per recipient domain
+
+    Each domain has its own FIFO and token bucket, and every item also
+    draws from a shared sender-account bucket. ``get`` hands out the
+    domain that becomes sendable first, so a throttled domain waits on its
+    own timer while other domains keep flowing. Ready domains are served
+    round-robin. A domain with nothing queued keeps its bucket only until
+    it has refilled, since a full bucket is the same as a new one.
+    """
+
+    def __init__(self, maxsize: int, domain_rate: float, domain_burst: float,
+                 sender_rate: float, sender_burst: float,
+                 domain_limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.maxsize = maxsize
+        self._domain_rate = domain_rate
+        self._domain_burst = domain_burst
+        self._domain_limits = domain_limits or {}
+        self._sender = TokenBucket(sender_rate, sender_burst)
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._queues: Dict[str, deque] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._idle = []
+        self._ready = []
+        self._seq = itertools.count()
+        self._size = 0
+        self._stats = {'dispatched': 0, 'deferrals': 0}
+
+    @classmethod
+    def from_env(cls, maxsize: int,
+                 settings: Optional[Mapping[str, object]] = None) -> 'DomainScheduler':
+        """Build a scheduler from THROTTLE_* settings (defaults to the environment)"""
+        if settings is None:
+            settings = os.environ
+        return cls(
+            maxsize,
+            domain_rate=float(settings.get('THROTTLE_DOMAIN_RATE', 5)),
+            domain_burst=float(settings.get('THROTTLE_DOMAIN_BURST', 20)),
+            sender_rate=float(settings.get('THROTTLE_SENDER_RATE', 20)),
+            sender_burst=float(settings.get('THROTTLE_SENDER_BURST', 100)),
+            domain_limits=parse_domain_limits(settings.get('THROTTLE_DOMAIN_LIMITS', ''))
+        )
+
+    def burst_for(self, domain: str) -> float:
+        """Largest number of messages that may go to ``domain`` at once"""
+        rate, burst = self._domain_limits.get(domain, (self._domain_rate, self._domain_burst))
+        burst = burst if rate > 0 else float('inf')
+        if not self._sender.unlimited:
+            burst = min(burst, self._sender.burst)
+        return burst
+
+    def put(self, item: Any, domain: str, cost: int = 1,
+            block: bool = True, timeout: Optional[float] = None):
+        """
+        Add an item for ``domain`` costing ``cost`` messages
+
+        Raises:
+            queue.Full: If the scheduler is at capacity
+        """
+        with self._not_full:
+            if self.maxsize > 0 and self._size >= self.maxsize:
+                if not block:
+                    raise queue.Full
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._size >= self.maxsize:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Full
+                    self._not_full.wait(remaining)
+
+            self._prune(time.monotonic())
+            pending = self._queues.get(domain)
+            if pending is None:
+                pending = self._queues[domain] = deque()
+            pending.append((item, cost))
+            self._size += 1
+
+            if len(pending) == 1:
+                self._schedule(domain, time.monotonic())
+            self._not_empty.notify()
+
+    def put_nowait(self, item: Any, domain: str, cost: int = 1):
+        self.put(item, domain, cost, block=False)
+
+    def get(self) -> Any:
+        """Block until some domain may send, then return its next item"""
+        with self._not_empty:
+            while True:
+                if not self._ready:
+                    self._not_empty.wait()
+                    continue
+
+                now = time.monotonic()
+                ready_at, _, domain = self._ready[0]
+                if ready_at > now:
+                    self._not_empty.wait(ready_at - now)
+                    continue
+
+                item, cost = self._queues[domain][0]
+                bucket = self._bucket(domain)
+                delay = bucket.delay_for(cost, now)
+                if delay > 0:
+                    # Domain is throttled; look again when it refills
+                    self._stats['deferrals'] += 1
+                    heapq.heapreplace(self._ready, (now + delay, next(self._seq), domain))
+                    continue
+
+                sender_delay = self._sender.delay_for(cost, now)
+                if sender_delay > 0:
+                    self._stats['deferrals'] += 1
+                    self._not_empty.wait(sender_delay)
+                    continue
+
+                heapq.heappop(self._ready)
+                self._queues[domain].popleft()
+                bucket.consume(cost, now)
+                self._sender.consume(cost, now)
+                self._size -= 1
+                self._stats['dispatched'] += 1
+
+                if self._queues[domain]:
+                    self._schedule(domain, now)
+                else:
+                    del self._queues[domain]
+                    self._retire(domain, bucket, now)
+                self._prune(now)
+
+                self._not_full.notify()
+                return item
+
+    def qsize(self) -> int:
+        with self._lock:
+            return self._size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return dispatch counters and the busiest domains"""
+        with self._lock:
+            busiest = sorted(self._queues.items(), key=lambda kv: len(kv[1]), reverse=True)[:10]
+            return {
+                **self._stats,
+                'domains': len(self._queues),
+                'buckets': len(self._buckets),
+                'top_domains': {domain: len(pending) for domain, pending in busiest}
+            }
+
+    def _schedule(self, domain: str, now: float):
+        """Enter ``domain`` into the ready heap (lock held)"""
+        heapq.heappush(self._ready, (now, next(self._seq), domain))
+
+    def _retire(self, domain: str, bucket: TokenBucket, now: float):
+        """Drop the bucket of a domain whose queue emptied once it refills (lock held)"""
+        full_at = bucket.full_at(now)
+        if full_at <= now:
+            del self._buckets[domain]
+        else:
+            heapq.heappush(self._idle, (full_at, domain))
+
+    def _prune(self, now: float):
+        """Drop buckets of idle domains that have refilled (lock held)"""
+        while self._idle and self._idle[0][0] <= now:
+            _, domain = heapq.heappop(self._idle)
+            if domain in self._queues:
+                # Active again; it is retired anew when its queue empties
+                continue
+            bucket = self._buckets.get(domain)
+            if bucket is not None:
+                self._retire(domain, bucket, now)
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate, burst = self._domain_limits.get(domain, (self._domain_rate, self._domain_burst))
+            bucket = self._buckets[domain] = TokenBucket(rate, burst)
+        return bucket
@@ -0,0 +1,77 @@
+"""
+Aho-Corasick Utilities
+Finds every occurrence of many keywords in one pass over the text
+"""
+from collections import deque
+from typing import Dict, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+
+T = TypeVar('T')
+
+
+class AhoCorasick(Generic[T]):
+    """
+    Multi-pattern substring matcher
+
+    Built once from ``(keyword, payload)`` pairs; ``iter_matches`` then
+    runs in time linear in the text length plus the number of matches,
+    however many keywords there are. Matching is case-sensitive, so
+    callers normalize case on both sides.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, T]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, T]]] = [[]]
+
+        for keyword, payload in keywords:
+            if keyword:
+                self._add(keyword, payload)
+        self._build_links()
+
+    @property
+    def states(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, T]]:
+        """
+        Yield every keyword occurrence
+
+        Yields:
+            Tuple of (end index, keyword, payload)
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, payload in out[state]:
+                yield index, keyword, payload
+
+    def _add(self, keyword: str, payload: T):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((keyword, payload))
+
+    def _build_links(self):
+        """Breadth-first failure links; outputs inherit their fallback's"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
@@ -0,0 +1,160 @@
+"""
+Circuit Breaker Utilities
+Stops calling a failing or slow dependency and probes it for recovery
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker over a rolling window
+
+    The breaker trips when, over the last ``window_size`` calls (and at
+    least ``min_calls``), the share of failures or of calls slower than
+    ``slow_call_seconds`` reaches its threshold. After ``open_seconds`` it
+    admits up to ``half_open_max_calls`` probe calls; one success closes
+    it again, any failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window_size: int = 20, min_calls: int = 5,
+                 error_rate_threshold: float = 0.5, slow_call_seconds: float = 10.0,
+                 slow_rate_threshold: float = 0.5, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._window = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._latency_ewma: Optional[float] = None
+        self._stats = {'trips': 0, 'rejected': 0, 'successes': 0, 'failures': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may proceed
+
+        In half-open state this reserves a probe slot, which is released
+        by the matching ``record_success`` / ``record_failure``, or by
+        ``release`` if the call never reached the dependency.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self, latency: Optional[float] = None):
+        """Record a successful call and its latency in seconds"""
+        with self._lock:
+            self._stats['successes'] += 1
+            self._observe_latency(latency)
+            slow = latency is not None and latency > self.slow_call_seconds
+
+            if self._state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if slow:
+                    self._trip()
+                else:
+                    self._state = self.CLOSED
+                    self._window.clear()
+                return
+
+            self._window.append((True, slow))
+            self._evaluate()
+
+    def record_failure(self, latency: Optional[float] = None):
+        """Record a failed (or timed-out) call"""
+        with self._lock:
+            self._stats['failures'] += 1
+
+            if self._state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._trip()
+                return
+
+            self._window.append((False, latency is not None and latency > self.slow_call_seconds))
+            self._evaluate()
+
+    def release(self):
+        """Give back a probe slot for a call that was abandoned before it ran"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def expected_latency(self) -> Optional[float]:
+        """Smoothed latency of recent successful calls, if any were observed"""
+        with self._lock:
+            return self._latency_ewma
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return state, window rates and counters"""
+        with self._lock:
+            calls = len(self._window)
+            errors = sum(1 for ok, _ in self._window if not ok)
+            slow = sum(1 for _, is_slow in self._window if is_slow)
+            return {
+                'state': self._current_state(time.monotonic()),
+                'window_calls': calls,
+                'error_rate': round(errors / calls, 4) if calls else 0.0,
+                'slow_rate': round(slow / calls, 4) if calls else 0.0,
+                'latency_ewma': round(self._latency_ewma, 4) if self._latency_ewma is not None else None,
+                **self._stats
+            }
+
+    def _current_state(self, now: float) -> str:
+        """Move open -> half-open once the cool-down has passed (lock held)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _evaluate(self):
+        """Trip if the window crosses a threshold (lock held)"""
+        calls = len(self._window)
+        if calls < self.min_calls:
+            return
+        errors = sum(1 for ok, _ in self._window if not ok)
+        slow = sum(1 for _, is_slow in self._window if is_slow)
+        if errors / calls >= self.error_rate_threshold or slow / calls >= self.slow_rate_threshold:
+            self._trip()
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self._stats['trips'] += 1
+
+    def _observe_latency(self, latency: Optional[float]):
+        if latency is None:
+            return
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
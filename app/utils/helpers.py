@@ -2,8 +2,12 @@
 Helper Utilities
 Miscellaneous utility functions
 """
+import csv
+import io
+import json
 import uuid
 from datetime import datetime, timedelta
+from typing import IO, Iterator, Mapping
 
 
 def generate_session_id() -> str:
@@ -26,6 +30,28 @@ def is_session_expired(created_at: datetime, timeout_seconds: int) -> bool:
     return datetime.utcnow() > expiry_time
 
 
+def iter_recipients(stream: IO[bytes]) -> Iterator[str]:
+    """
+    Stream recipient addresses from an uploaded file
+    
+    Accepts one address per line or CSV; the first cell containing "@"
+    on each row is used, so header rows and extra columns are skipped.
+    
+    Args:
+        stream: Binary file-like object (e.g. an uploaded file)
+        
+    Yields:
+        Stripped email addresses
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+    for row in csv.reader(text):
+        for cell in row:
+            cell = cell.strip()
+            if '@' in cell:
+                yield cell
+                break
+
+
 def sanitize_email_content(content: str) -> str:
     """
     Sanitize email content (remove potentially harmful content)
@@ -74,3 +100,32 @@ def format_success_response(data: dict, message: str = None) -> dict:
     if message:
         response['message'] = message
     return response
+
+
+def format_sse_event(event: str, data: dict) -> str:
+    """
+    Format a server-sent event
+    
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+        
+    Returns:
+        SSE frame ready to write to the response stream
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def is_enabled(value) -> bool:
+    """
+    Read a flag setting
+    
+    Args:
+        value: A bool from the app config or a string from the environment
+        
+    Returns:
+        True for True, '1', 'true' or 'yes'
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
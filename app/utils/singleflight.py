@@ -0,0 +1,82 @@
+"""
+Single-Flight Utilities
+Coalesces concurrent identical calls into one execution
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """One in-flight execution shared by every caller with the same key"""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    The first caller for a key (the leader) executes the function; callers
+    arriving while it runs wait and receive the same result, or the same
+    exception. Once the call finishes the key is forgotten, so later
+    callers start a fresh execution.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {'executions': 0, 'coalesced': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Execute ``fn`` for ``key`` or join the execution already running
+
+        Args:
+            key: Identity of the call
+            fn: Zero-argument function to run
+
+        Returns:
+            Tuple of (result, shared) where shared is True for followers
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats['executions'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result, False
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return execution and coalescing counters"""
+        with self._lock:
+            return {
+                **self._stats,
+                'in_flight': len(self._calls)
+            }
@@ -0,0 +1,110 @@
+"""
+Session store concurrency stress test
+
+Runs a mix of get_session / add_feedback / update_session from 1..N
+threads against one SessionService and reports throughput per thread
+count, for a single stripe (one global lock) and for the striped store,
+or for the SQLite backend with ``--backend sqlite``. Afterwards it
+checks that no feedback was lost.
+
+Each operation is followed by ``--io-us`` microseconds of simulated
+request I/O (LLM or SMTP wait) outside the store, as in a real request.
+Pure in-memory operations on CPython are bounded by the GIL, so with
+``--io-us 0`` expect flat rather than linear numbers for both stores.
+
+Usage:
+    python -m benchmarks.bench_session_store --threads 1,2,4,8 --ops 20000
+    python -m benchmarks.bench_session_store --backend sqlite --io-us 0
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from app.services.session_service import SessionService
+from app.services.session_store import MemorySessionBackend, SQLiteSessionBackend
+
+
+def worker(app, store, session_ids, ops, io_seconds, seed, added):
+    rng = random.Random(seed)
+    count = 0
+    with app.app_context():
+        for _ in range(ops):
+            session_id = rng.choice(session_ids)
+            roll = rng.random()
+            if roll < 0.7:
+                store.get_session(session_id)
+            elif roll < 0.9:
+                if store.add_feedback(session_id, 'make it shorter') is not None:
+                    count += 1
+            else:
+                store.update_session(session_id, generated_content=f"draft {rng.random()}")
+            if io_seconds:
+                time.sleep(io_seconds)
+    added.append(count)
+
+
+def run(app, backend, threads, ops, sessions, io_seconds):
+    store = SessionService(backend)
+    with app.app_context():
+        session_ids = [store.create_session(f"topic {i}", 'draft').session_id for i in range(sessions)]
+
+    added = []
+    pool = [
+        threading.Thread(target=worker, args=(app, store, session_ids, ops // threads, io_seconds, seed, added))
+        for seed in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    store.stop()
+
+    stored = sum(len(store.get_session(sid).feedback_history) for sid in session_ids)
+    assert stored == sum(added), f"lost feedback: {sum(added) - stored} of {sum(added)}"
+    return (ops // threads) * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--ops', type=int, default=20000, help='operations per run (split across threads)')
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--io-us', type=float, default=50, help='simulated request I/O per operation')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.logger.setLevel(logging.WARNING)
+    thread_counts = [int(t) for t in args.threads.split(',')]
+
+    print(f"{args.ops} ops over {args.sessions} sessions, {args.io_us:g}us I/O per op")
+    if args.backend == 'sqlite':
+        with tempfile.TemporaryDirectory() as directory:
+            base = None
+            for threads in thread_counts:
+                backend = SQLiteSessionBackend(os.path.join(directory, f"sessions-{threads}.db"))
+                rate = run(app, backend, threads, args.ops, args.sessions, args.io_us / 1e6)
+                base = base or rate
+                print(f"  sqlite     threads={threads:<3} {rate:>12,.0f} ops/s  x{rate / base:.2f}")
+        return
+
+    for shards in (1, args.shards):
+        base = None
+        for threads in thread_counts:
+            backend = MemorySessionBackend(shards=shards)
+            rate = run(app, backend, threads, args.ops, args.sessions, args.io_us / 1e6)
+            base = base or rate
+            print(f"  shards={shards:<3} threads={threads:<3} {rate:>12,.0f} ops/s  x{rate / base:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Template rendering microbenchmark
+
+Compares bulk fallback generation through TemplateService.render_many
+with the per-call path (one generate_email per topic) and with the
+previous str.format rendering.
+
+Usage:
+    python -m benchmarks.bench_template_render --topics 5000 --feedback "make it formal"
+"""
+import argparse
+import logging
+import random
+import time
+
+from flask import Flask
+
+from app.services.template_service import template_service
+
+
+WORDS = [
+    'meeting', 'schedule', 'follow up', 'thank you', 'request', 'proposal',
+    'invitation', 'budget', 'Q3 planning', 'vendor contract', 'hiring', 'launch',
+    'quarterly review', 'offsite', 'partnership', 'support ticket', 'renewal'
+]
+
+
+def make_topics(count: int, unique: int, seed: int = 7):
+    rng = random.Random(seed)
+    pool = [' '.join(rng.sample(WORDS, 3)) + f" #{i}" for i in range(unique)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def format_path(topics, feedback):
+    """Pre-change path: classify, then str.format on the raw body"""
+    registry = template_service.registry
+    out = []
+    for topic in topics:
+        content = registry.get(registry.classify(topic.lower())).body.format(topic=topic)
+        if feedback:
+            content = template_service._apply_feedback(content, feedback, topic)
+        out.append(content)
+    return out
+
+
+def per_call_path(topics, feedback):
+    return [template_service.generate_email(topic, feedback) for topic in topics]
+
+
+def batch_path(topics, feedback):
+    return template_service.render_many(topics, feedback)
+
+
+def bench(fn, topics, feedback, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(topics, feedback)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topics', type=int, default=5000)
+    parser.add_argument('--unique', type=int, default=1000, help='distinct topics in the batch')
+    parser.add_argument('--feedback', default='')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    topics = make_topics(args.topics, args.unique)
+
+    # Log through a quiet app logger, as in production
+    app = Flask(__name__)
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        assert batch_path(topics, args.feedback) == per_call_path(topics, args.feedback)
+
+        print(f"{args.topics} topics ({args.unique} unique), feedback={args.feedback!r}")
+        baseline = None
+        for name, fn in (('str.format', format_path), ('generate_email', per_call_path),
+                         ('render_many', batch_path)):
+            seconds = bench(fn, topics, args.feedback, args.repeat)
+            baseline = baseline or seconds
+            print(f"  {name:<15} {args.topics / seconds:>12,.0f} emails/s  "
+                  f"{seconds * 1e6 / args.topics:>7.2f} us/email  x{baseline / seconds:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -58,7 +58,12 @@ export default function EmailGenerator() {
 
     setLoading(true)
     try {
-      const response = await emailApi.generateDraft(topic)
+      let streamed = ''
+      const response = await emailApi.generateDraftStream(topic, (text) => {
+        streamed += text
+        setGeneratedContent(streamed)
+        setCurrentStep(2)
+      })
       
       if (response.success) {
         setSessionId(response.session_id)
@@ -85,7 +90,11 @@ export default function EmailGenerator() {
 
     setLoading(true)
     try {
-      const response = await emailApi.processFeedback(sessionId, feedback)
+      let streamed = ''
+      const response = await emailApi.processFeedbackStream(sessionId, feedback, (text) => {
+        streamed += text
+        setGeneratedContent(streamed)
+      })
       
       if (response.success) {
         setGeneratedContent(response.content)
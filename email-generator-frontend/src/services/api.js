@@ -10,6 +10,46 @@ const api = axios.create({
   timeout: 30000, // 30 seconds timeout
 })
 
+// POST to a server-sent-events endpoint, calling onToken for each chunk.
+// Resolves with the "done" payload.
+const streamEvents = async (path, body, onToken) => {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  })
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}))
+    throw new Error(data.error || 'Request failed')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      const event = frame.match(/^event: (.*)$/m)?.[1]
+      const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}')
+
+      if (event === 'token') onToken?.(data.text)
+      else if (event === 'done') return data
+      else if (event === 'error') throw new Error(data.error || 'Generation failed')
+    }
+  }
+
+  throw new Error('Stream ended unexpectedly')
+}
+
 // API Service Functions
 export const emailApi = {
   // Generate initial email draft
@@ -22,6 +62,20 @@ export const emailApi = {
     }
   },
 
+  // Generate initial email draft, streaming tokens to onToken
+  generateDraftStream: async (topic, onToken) => {
+    return streamEvents('/api/generate/stream', { topic }, onToken)
+  },
+
+  // Process feedback, streaming the regenerated email to onToken
+  processFeedbackStream: async (sessionId, feedback, onToken) => {
+    return streamEvents(
+      '/api/feedback/stream',
+      { session_id: sessionId, feedback },
+      onToken
+    )
+  },
+
   // Process feedback and regenerate
   processFeedback: async (sessionId, feedback) => {
     try {
@@ -47,17 +101,42 @@ export const emailApi = {
     }
   },
 
-  // Send email
+  // Send email (queued server-side; poll until delivered or failed)
   sendEmail: async (sessionId, email) => {
+    let job
     try {
       const response = await api.post('/api/send-email', {
         session_id: sessionId,
         email,
       })
-      return response.data
+      job = response.data
     } catch (error) {
       throw new Error(error.response?.data?.error || 'Failed to send email')
     }
+
+    const deadline = Date.now() + 60000
+    while (job.status === 'queued' || job.status === 'sending') {
+      if (Date.now() > deadline) {
+        throw new Error('Email is still queued, check back shortly')
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+      job = await emailApi.getSendStatus(job.job_id)
+    }
+
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Failed to send email')
+    }
+    return { ...job, message: `Email sent successfully to ${email}` }
+  },
+
+  // Get delivery status of a queued email
+  getSendStatus: async (jobId) => {
+    try {
+      const response = await api.get(`/api/send-email/${jobId}`)
+      return response.data
+    } catch (error) {
+      throw new Error(error.response?.data?.error || 'Failed to fetch send status')
+    }
   },
 
   // Get session details
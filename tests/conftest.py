@@ -0,0 +1,35 @@
+"""
+Test Configuration
+Environment and fixtures shared by the test suite
+"""
+import os
+import pytest
+
+# Config refuses to load without these. Sessions stay in memory, and the
+# outbox and background speculation stay off so tests never write a
+# spool or call a model
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('SMTP_USER', 'sender@example.com')
+os.environ.setdefault('SMTP_PASSWORD', 'test-password')
+os.environ['SESSION_BACKEND'] = 'memory'
+os.environ['OUTBOX_ENABLED'] = 'false'
+os.environ['LLM_SPECULATE_ENABLED'] = 'false'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Application in testing mode, logging under a temporary directory"""
+    from app import create_app
+    from app.config import Config
+
+    class TestConfig(Config):
+        TESTING = True
+
+    # setup_logging creates logs/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,66 @@
+"""
+Aho-Corasick Tests
+Multi-pattern matching against a brute-force search
+"""
+import random
+from app.utils.aho_corasick import AhoCorasick
+
+
+def _brute_force(keywords, text):
+    return sorted(
+        (start + len(keyword) - 1, keyword, payload)
+        for keyword, payload in keywords
+        for start in range(len(text) - len(keyword) + 1)
+        if text.startswith(keyword, start)
+    )
+
+
+def test_overlapping_and_nested_keywords():
+    keywords = [('he', 1), ('she', 2), ('his', 3), ('hers', 4)]
+    matcher = AhoCorasick(keywords)
+
+    matches = list(matcher.iter_matches('ushers'))
+
+    assert sorted(matches) == [(3, 'he', 1), (3, 'she', 2), (5, 'hers', 4)]
+
+
+def test_matches_are_yielded_in_text_order():
+    matcher = AhoCorasick([('meeting', 'meeting'), ('call', 'meeting'), ('thank', 'thank')])
+
+    ends = [end for end, _, _ in matcher.iter_matches('thank you for the call about the meeting')]
+
+    assert ends == sorted(ends)
+    assert len(ends) == 3
+
+
+def test_keyword_inside_another_keyword():
+    matcher = AhoCorasick([('schedule', 'a'), ('dule', 'b'), ('e', 'c')])
+
+    found = {(keyword, end) for end, keyword, _ in matcher.iter_matches('reschedule')}
+
+    assert found == {('e', 1), ('e', 5), ('schedule', 9), ('dule', 9), ('e', 9)}
+
+
+def test_same_keyword_with_several_payloads():
+    matcher = AhoCorasick([('review', 'meeting'), ('review', 'followup')])
+
+    payloads = sorted(payload for _, _, payload in matcher.iter_matches('quarterly review'))
+
+    assert payloads == ['followup', 'meeting']
+
+
+def test_empty_keywords_and_text():
+    matcher = AhoCorasick([('', 'ignored'), ('abc', 1)])
+
+    assert list(matcher.iter_matches('')) == []
+    assert list(matcher.iter_matches('xyz')) == []
+    assert matcher.states == 4
+
+
+def test_agrees_with_brute_force():
+    rng = random.Random(7)
+    for _ in range(50):
+        keywords = [(''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))), n) for n in range(8)]
+        text = ''.join(rng.choice('abcd') for _ in range(60))
+
+        assert sorted(AhoCorasick(keywords).iter_matches(text)) == _brute_force(keywords, text)
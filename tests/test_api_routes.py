@@ -0,0 +1,123 @@
+"""
+API Route Tests
+Draft version history and mail merge uploads
+"""
+import io
+import json
+import pytest
+from app.routes import api_routes
+from app.services.session_service import session_service
+
+
+@pytest.fixture
+def session():
+    session = session_service.create_session('Team offsite', 'Subject: Offsite\n\nDraft one.')
+    session_service.update_session(session.session_id, generated_content='Subject: Offsite\n\nDraft two.')
+    return session_service.update_session(session.session_id, generated_content='Subject: Offsite\n\nDraft three.')
+
+
+def test_versions_are_listed(client, session):
+    response = client.get(f'/api/session/{session.session_id}/versions')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['current'] == 3
+    assert [v['version'] for v in data['versions']] == [1, 2, 3]
+
+
+def test_version_text_is_returned(client, session):
+    response = client.get(f'/api/session/{session.session_id}/versions/2')
+
+    assert response.status_code == 200
+    assert response.get_json()['generated_content'] == 'Subject: Offsite\n\nDraft two.'
+
+
+def test_restore_records_a_new_version(client, session):
+    response = client.post(f'/api/session/{session.session_id}/versions/1/restore')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert (data['version'], data['restored_from']) == (4, 1)
+    assert session_service.get_session(session.session_id).generated_content == 'Subject: Offsite\n\nDraft one.'
+    # The versions after the restored one are kept
+    assert client.get(f'/api/session/{session.session_id}/versions/3').status_code == 200
+
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/versions/9'),
+    ('post', '/versions/9/restore'),
+])
+def test_unknown_version_is_not_found(client, session, method, path):
+    response = getattr(client, method)(f'/api/session/{session.session_id}{path}')
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/versions'),
+    ('get', '/versions/1'),
+    ('post', '/versions/1/restore'),
+])
+def test_unknown_session_is_not_found(client, method, path):
+    response = getattr(client, method)(f'/api/session/missing{path}')
+
+    assert response.status_code == 404
+
+
+class _Job:
+    def to_dict(self, include_results=True):
+        return {'job_id': 'job-1', 'kind': 'merge', 'status': 'queued'}
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    submitted = []
+
+    def submit_merge(plan, rows, session_id=None):
+        submitted.append((plan, list(rows), session_id))
+        return _Job()
+
+    monkeypatch.setattr(api_routes.mail_queue_service, 'submit_merge', submit_merge)
+    return submitted
+
+
+def test_merge_upload_is_queued(client, session, submitted):
+    session_service.update_session(session.session_id, final_data='Subject: Hi [Recipient]\n\nDear [Recipient],')
+    rows = [{'email': 'ana@example.com', 'recipient': 'Ana'}, {'email': 'bo@example.com', 'recipient': 'Bo'}]
+    upload = '\n'.join(json.dumps(row) for row in rows).encode('utf-8')
+
+    response = client.post('/api/send-email/merge', data={
+        'session_id': session.session_id,
+        'file': (io.BytesIO(upload), 'rows.jsonl')
+    }, content_type='multipart/form-data')
+
+    data = response.get_json()
+    assert response.status_code == 202
+    assert (data['job_id'], data['rows'], data['placeholders']) == ('job-1', 2, ['recipient'])
+    plan, queued, session_id = submitted[0]
+    assert queued == rows
+    assert session_id == session.session_id
+    assert plan.render(rows[0])[1] == 'Hi Ana'
+
+
+def test_merge_requires_a_finalized_email(client, session, submitted):
+    response = client.post('/api/send-email/merge', json={
+        'session_id': session.session_id,
+        'rows': [{'email': 'ana@example.com'}]
+    })
+
+    assert response.status_code == 400
+    assert submitted == []
+
+
+def test_merge_upload_without_rows_is_rejected(client, session, submitted):
+    session_service.update_session(session.session_id, final_data='Subject: Hi\n\nHello.')
+
+    response = client.post('/api/send-email/merge', data={
+        'session_id': session.session_id,
+        'file': (io.BytesIO(b'email,recipient\n'), 'rows.csv')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'No recipient rows found'
+    assert submitted == []
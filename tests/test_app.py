@@ -0,0 +1,49 @@
+"""
+Application Factory Tests
+Service settings are taken from the config class
+"""
+import os
+import pytest
+from app import create_app
+from app.config import Config
+from app.services.email_service import email_service
+from app.services.mail_queue_service import mail_queue_service
+from app.services.session_service import session_service
+from app.services.session_store import MemorySessionBackend, SQLiteSessionBackend
+
+
+@pytest.fixture
+def restore_services():
+    yield
+    session_service.configure(os.environ)
+    email_service.configure(os.environ)
+    mail_queue_service.configure(os.environ)
+
+
+def test_services_use_the_config_class(tmp_path, monkeypatch, restore_services):
+    class SQLiteConfig(Config):
+        TESTING = True
+        SESSION_BACKEND = 'sqlite'
+        SESSION_DB_PATH = str(tmp_path / 'sessions.db')
+        SESSION_CACHE_ENABLED = False
+        SESSION_MAX_VERSIONS = 5
+        SMTP_USER = 'config@example.com'
+        SMTP_POOL_SIZE = 2
+        MAIL_JOB_RETENTION = 60
+
+    monkeypatch.chdir(tmp_path)
+    app = create_app(SQLiteConfig)
+
+    assert isinstance(session_service.backend, SQLiteSessionBackend)
+    assert session_service.backend.path == SQLiteConfig.SESSION_DB_PATH
+    assert session_service.max_versions == 5
+    session = session_service.create_session('Team offsite', 'Subject: Offsite\n\nDraft.')
+    assert session_service.get_session(session.session_id).topic == 'Team offsite'
+
+    pool = email_service._get_pool()
+    assert (pool.user, pool.max_size) == ('config@example.com', 2)
+    assert mail_queue_service._settings is app.config
+
+
+def test_default_config_keeps_sessions_in_memory(app):
+    assert isinstance(session_service.backend, MemorySessionBackend)
@@ -0,0 +1,132 @@
+"""
+Circuit Breaker Tests
+State transitions and probe accounting
+"""
+import time
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    settings = dict(window_size=10, min_calls=4, error_rate_threshold=0.5,
+                    slow_call_seconds=1.0, slow_rate_threshold=0.5,
+                    open_seconds=0.05, half_open_max_calls=1)
+    settings.update(overrides)
+    return CircuitBreaker(**settings)
+
+
+def _trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def _half_open(breaker: CircuitBreaker):
+    _trip(breaker)
+    time.sleep(breaker.open_seconds + 0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_stays_closed_below_min_calls():
+    breaker = _breaker()
+    for _ in range(breaker.min_calls - 1):
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_on_error_rate():
+    breaker = _breaker()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    stats = breaker.get_stats()
+    assert stats['trips'] == 1
+    assert stats['rejected'] == 1
+
+
+def test_opens_on_slow_calls():
+    breaker = _breaker()
+    for _ in range(2):
+        breaker.record_success(0.1)
+    for _ in range(2):
+        breaker.record_success(5.0)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_admits_limited_probes():
+    breaker = _breaker(half_open_max_calls=2)
+    _half_open(breaker)
+
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_probe_success_closes():
+    breaker = _breaker()
+    _half_open(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_success(0.1)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()['window_calls'] == 0
+
+
+def test_slow_probe_reopens():
+    breaker = _breaker()
+    _half_open(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_success(5.0)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_probe_failure_reopens():
+    breaker = _breaker()
+    _half_open(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.get_stats()['trips'] == 2
+
+
+def test_release_returns_the_probe_slot():
+    breaker = _breaker()
+    _half_open(breaker)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_release_when_closed_changes_nothing():
+    breaker = _breaker()
+    breaker.release()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()['window_calls'] == 0
+
+
+def test_expected_latency_tracks_successes():
+    breaker = _breaker()
+    assert breaker.expected_latency() is None
+
+    breaker.record_success(1.0)
+    breaker.record_success(2.0)
+
+    assert 1.0 < breaker.expected_latency() < 2.0
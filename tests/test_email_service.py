@@ -0,0 +1,166 @@
+"""
+Email Service Tests
+Per-recipient outcomes of pooled bulk and personalized sends
+"""
+import smtplib
+import pytest
+from app.services.email_service import EmailService, SMTPConnectionPool, _PooledConnection
+
+
+class FakeSMTP:
+    """SMTP connection whose behaviour depends on the recipient's local part"""
+
+    def __init__(self, log: list):
+        self.log = log
+
+    def sendmail(self, sender, recipients, data):
+        recipient = recipients[0]
+        if recipient.startswith('refused'):
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b'No such user')})
+        if recipient.startswith('drop') and recipient not in self.log:
+            self.log.append(recipient)
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        if recipient.startswith('crash'):
+            raise RuntimeError('unexpected failure')
+        if recipient.startswith('unsupported'):
+            raise smtplib.SMTPNotSupportedError('SMTPUTF8 not supported by server')
+        self.log.append((recipient, data))
+
+    def send_message(self, msg):
+        self.sendmail(msg['From'], [msg['To']], msg.as_bytes())
+
+    def noop(self):
+        return 250, b'OK'
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def smtp_log():
+    return []
+
+
+@pytest.fixture
+def pool(smtp_log, monkeypatch):
+    pool = SMTPConnectionPool('smtp.example.com', 587, 'sender@example.com', 'secret', max_messages=2)
+    monkeypatch.setattr(pool, '_connect', lambda: _PooledConnection(FakeSMTP(smtp_log)))
+    return pool
+
+
+@pytest.fixture
+def service(pool, monkeypatch):
+    service = EmailService()
+    monkeypatch.setattr(service, '_get_pool', lambda: pool)
+    return service
+
+
+def _delivered(smtp_log):
+    return [entry[0] for entry in smtp_log if isinstance(entry, tuple)]
+
+
+def test_bulk_reports_each_recipient(service, smtp_log):
+    results = service.send_bulk('Update', 'Hello all', [
+        'ana@example.com', 'not-an-address', 'refused@example.com', 'bo@example.com'
+    ])
+
+    assert [(r['email'], r['status']) for r in results] == [
+        ('ana@example.com', 'sent'),
+        ('not-an-address', 'failed'),
+        ('refused@example.com', 'failed'),
+        ('bo@example.com', 'sent'),
+    ]
+    assert results[1]['error'] == 'Invalid email format'
+    assert 'No such user' in results[2]['error']
+    assert _delivered(smtp_log) == ['ana@example.com', 'bo@example.com']
+
+
+def test_bulk_message_carries_each_recipient(service, smtp_log):
+    service.send_bulk('Update', 'Hello all', ['ana@example.com', 'bo@example.com'])
+
+    for recipient, data in (entry for entry in smtp_log if isinstance(entry, tuple)):
+        assert data.startswith(b'To: ' + recipient.encode('ascii') + b'\r\n')
+        assert b'Subject: Update' in data
+
+
+def test_bulk_rotates_connections_at_message_cap(service, pool):
+    results = service.send_bulk('Update', 'Hello', [f'user{n}@example.com' for n in range(5)])
+
+    assert all(r['status'] == 'sent' for r in results)
+    # Two messages per connection
+    assert pool.get_stats()['misses'] == 3
+    assert pool.get_stats()['in_use'] == 0
+
+
+def test_dropped_connection_is_retried_once(service, pool, smtp_log):
+    results = service.send_bulk('Update', 'Hello', ['drop@example.com', 'ana@example.com'])
+
+    assert [r['status'] for r in results] == ['sent', 'sent']
+    assert pool.get_stats()['reconnects'] == 1
+    assert _delivered(smtp_log) == ['drop@example.com', 'ana@example.com']
+
+
+def test_smtp_errors_fail_the_message_without_reconnecting(service, pool, smtp_log):
+    results = service.send_bulk('Update', 'Hello', [
+        'refused@example.com', 'unsupported@example.com', 'ana@example.com'
+    ])
+
+    assert [r['status'] for r in results] == ['failed', 'failed', 'sent']
+    assert 'SMTPUTF8' in results[1]['error']
+    assert pool.get_stats()['reconnects'] == 0
+    assert _delivered(smtp_log) == ['ana@example.com']
+
+
+def test_single_send_retries_only_a_dropped_connection(service, pool, smtp_log):
+    assert service.send_email('Hello', 'Body', 'drop@example.com')
+    assert pool.get_stats()['reconnects'] == 1
+
+    for recipient in ('refused@example.com', 'unsupported@example.com'):
+        with pytest.raises(RuntimeError):
+            service.send_email('Hello', 'Body', recipient)
+    assert pool.get_stats()['reconnects'] == 1
+    assert _delivered(smtp_log) == ['drop@example.com']
+
+
+def test_authentication_failure_fails_every_recipient(service, pool, monkeypatch):
+    attempts = []
+
+    def refuse():
+        attempts.append(1)
+        raise smtplib.SMTPAuthenticationError(535, b'Bad credentials')
+
+    monkeypatch.setattr(pool, '_connect', refuse)
+    results = service.send_bulk('Update', 'Hello', ['ana@example.com', 'bo@example.com'])
+
+    assert [r['status'] for r in results] == ['failed', 'failed']
+    assert all('authentication failed' in r['error'] for r in results)
+    assert len(attempts) == 1
+
+
+def test_unrenderable_personalized_message_fails_alone(service, smtp_log):
+    results = service.send_personalized([
+        ('ana@example.com', 'Hello Ana', 'Dear Ana,'),
+        ('eve@example.com', 'Hello\r\nBcc: all@example.com', 'Dear Eve,'),
+        ('bo@example.com', 'Hello Bo', 'Dear Bo,'),
+    ])
+
+    assert [r['status'] for r in results] == ['sent', 'failed', 'sent']
+    assert results[1]['error'].startswith('Invalid message')
+    assert _delivered(smtp_log) == ['ana@example.com', 'bo@example.com']
+
+
+def test_results_so_far_survive_an_unexpected_error(service, pool):
+    results = []
+
+    with pytest.raises(RuntimeError):
+        service.send_bulk('Update', 'Hello', ['ana@example.com', 'crash@example.com', 'bo@example.com'],
+                          results=results)
+
+    assert [r['email'] for r in results] == ['ana@example.com']
+    # The connection went back to the pool
+    assert pool.get_stats()['in_use'] == 0
+
+
+def test_send_email_rejects_invalid_recipient(service):
+    with pytest.raises(ValueError):
+        service.send_email('Hello', 'Body', 'not-an-address')
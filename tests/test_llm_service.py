@@ -0,0 +1,204 @@
+"""
+LLM Service Tests
+Per-model response caching, batch generation across routed models and
+circuit breaker accounting
+"""
+import threading
+import time
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+from app.services.cache_service import GenerationCache, make_cache_key
+from app.services.llm_provider_service import LLMProvider, LLMProviderError
+from app.services.llm_service import LLMService
+from app.services.router_service import DRAFT, REFINE, ModelRouter
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+class ScriptedProvider(LLMProvider):
+    """Model that fails when told to, or for prompts mentioning "unreachable" """
+
+    name = 'test'
+
+    def __init__(self, model: str, fail: bool = False):
+        super().__init__(model)
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        with self._lock:
+            self.calls += 1
+        if self.fail or 'unreachable' in messages[-1].content:
+            raise LLMProviderError(f'{self.model} is down')
+        return AIMessage(content=f'Subject: Hello\n\nWritten by {self.model}.')
+
+    def stream(self, messages):
+        yield AIMessageChunk(content=self.invoke(messages).content)
+
+
+def _service(draft, refine=None) -> LLMService:
+    providers = {p.model_id: p for p in draft + (refine or [])}
+    router = ModelRouter(providers, rules={
+        DRAFT: [p.model_id for p in draft],
+        REFINE: [p.model_id for p in (refine or draft)]
+    })
+    service = LLMService()
+    service._initialize_llm()
+    service.router = router
+    service.llm = router.primary
+    service.model = service.llm.model_id
+    service.cache = GenerationCache()
+    service.similar = None
+    service.breaker = CircuitBreaker(min_calls=2, open_seconds=0.05)
+    return service
+
+
+def _half_open(breaker: CircuitBreaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(breaker.open_seconds + 0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def _outcomes(breaker: CircuitBreaker) -> int:
+    stats = breaker.get_stats()
+    return stats['successes'] + stats['failures']
+
+
+def test_fallback_completion_is_cached_under_the_model_that_wrote_it():
+    down, up = ScriptedProvider('primary', fail=True), ScriptedProvider('fallback')
+    service = _service([down, up])
+
+    content = service.generate_email('Quarterly review')
+
+    assert content == 'Subject: Hello\n\nWritten by fallback.'
+    assert service.cache.get(make_cache_key(up.model_id, 'Quarterly review')) == content
+    assert service.cache.get(make_cache_key(down.model_id, 'Quarterly review')) is None
+
+    # Served from the cache while the primary is still down
+    assert service.generate_email('quarterly  REVIEW') == content
+    assert up.calls == 1
+
+
+def test_completion_from_a_model_off_the_route_is_not_served():
+    model = ScriptedProvider('current')
+    service = _service([model])
+    service.cache.put(make_cache_key('test:retired', 'Quarterly review'), 'Written by retired.')
+
+    assert service.generate_email('Quarterly review') == 'Subject: Hello\n\nWritten by current.'
+    assert model.calls == 1
+
+
+def test_refinements_are_cached_per_refine_model():
+    drafter, refiner = ScriptedProvider('drafter'), ScriptedProvider('refiner')
+    service = _service([drafter], refine=[refiner])
+
+    first = service.generate_email('Quarterly review', 'shorter', 'Subject: Hi\n\nOld draft.')
+    second = service.generate_email('Quarterly review', 'shorter', 'Subject: Hi\n\nOld draft.')
+
+    assert first == second == 'Subject: Hello\n\nWritten by refiner.'
+    assert (drafter.calls, refiner.calls) == (0, 1)
+
+
+def test_batch_moves_failed_items_to_the_next_model():
+    down, up = ScriptedProvider('primary', fail=True), ScriptedProvider('fallback')
+    service = _service([down, up])
+
+    results = service.generate_batch(['Team offsite', 'Budget review'])
+
+    assert [r['source'] for r in results] == ['llm', 'llm']
+    assert all(r['content'] == 'Subject: Hello\n\nWritten by fallback.' for r in results)
+    assert (down.calls, up.calls) == (2, 2)
+
+
+def test_batch_retries_only_the_items_that_failed():
+    primary, spare = ScriptedProvider('primary'), ScriptedProvider('spare')
+    service = _service([primary, spare])
+
+    results = service.generate_batch(['Team offsite', 'unreachable venue'])
+
+    assert [r['source'] for r in results] == ['llm', 'template']
+    assert results[0]['content'] == 'Subject: Hello\n\nWritten by primary.'
+    assert results[1]['error'] == 'spare is down'
+    assert (primary.calls, spare.calls) == (2, 1)
+
+
+def test_batch_past_its_deadline_uses_templates():
+    model = ScriptedProvider('primary')
+    service = _service([model])
+
+    results = service.generate_batch(['Team offsite'], deadline=time.monotonic() - 1)
+
+    assert results[0]['source'] == 'template'
+    assert model.calls == 0
+    assert service.get_stats()['fallbacks']['deadline'] == 1
+
+
+def test_probe_slot_is_released_when_prompt_building_fails(monkeypatch):
+    service = _service([ScriptedProvider('primary')])
+    _half_open(service.breaker)
+
+    def broken(*args):
+        raise ValueError('bad prompt')
+
+    monkeypatch.setattr(service, '_build_messages', broken)
+    content = service.generate_email('Quarterly review')
+
+    assert content  # template fallback
+    assert service.breaker.state == CircuitBreaker.HALF_OPEN
+    assert service.breaker.allow_request()
+
+
+def test_stream_releases_probe_slot_when_prompt_building_fails(monkeypatch):
+    service = _service([ScriptedProvider('primary')])
+    _half_open(service.breaker)
+
+    def broken(*args):
+        raise ValueError('bad prompt')
+
+    monkeypatch.setattr(service, '_build_messages', broken)
+    with pytest.raises(ValueError):
+        list(service.stream_email('Quarterly review'))
+
+    assert service.breaker.allow_request()
+
+
+def test_probe_success_closes_the_breaker():
+    service = _service([ScriptedProvider('primary')])
+    _half_open(service.breaker)
+
+    service.generate_email('Quarterly review')
+
+    assert service.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_batch_is_one_breaker_call():
+    service = _service([ScriptedProvider('primary')])
+    before = _outcomes(service.breaker)
+
+    results = service.generate_batch(['Team offsite', 'unreachable venue', 'Budget review', 'unreachable hotel'])
+
+    assert [r['source'] for r in results] == ['llm', 'template', 'llm', 'template']
+    assert _outcomes(service.breaker) - before == 1
+    assert service.breaker.get_stats()['successes'] == 1
+
+
+def test_batch_that_fails_entirely_is_one_failure():
+    service = _service([ScriptedProvider('primary', fail=True)])
+
+    results = service.generate_batch(['Team offsite', 'Budget review', 'Quarterly review'])
+
+    assert all(r['source'] == 'template' for r in results)
+    stats = service.breaker.get_stats()
+    assert (stats['successes'], stats['failures']) == (0, 1)
+    assert service.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_batch_while_half_open_uses_one_probe():
+    service = _service([ScriptedProvider('primary')])
+    _half_open(service.breaker)
+
+    results = service.generate_batch(['Team offsite', 'Budget review'])
+
+    assert [r['source'] for r in results] == ['llm', 'llm']
+    assert service.breaker.state == CircuitBreaker.CLOSED
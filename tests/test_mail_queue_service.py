@@ -0,0 +1,155 @@
+"""
+Mail Queue Tests
+Partial failure of bulk and merge jobs, and outbox replay
+"""
+import time
+import pytest
+from app.services import mail_queue_service as mail_queue_module
+from app.services.mail_queue_service import MailQueueService
+from app.services.merge_service import MergePlan, RowSpool
+from app.services.outbox_service import OutboxService
+
+
+class FakeSender:
+    """Stands in for EmailService; "down" recipients raise mid-chunk"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_email(self, subject, body, recipient_email):
+        self.sent.append((recipient_email, subject))
+        return True
+
+    def send_bulk(self, subject, body, recipients, results=None):
+        return self._send(((r, subject) for r in recipients), results)
+
+    def send_personalized(self, messages, results=None):
+        return self._send(((r, s) for r, s, _ in messages), results)
+
+    def _send(self, messages, results):
+        results = [] if results is None else results
+        for recipient_email, subject in messages:
+            if recipient_email.startswith('down'):
+                raise RuntimeError('connection reset')
+            if recipient_email.startswith('refused'):
+                results.append({'email': recipient_email, 'status': 'failed', 'error': '550 no such user'})
+                continue
+            self.sent.append((recipient_email, subject))
+            results.append({'email': recipient_email, 'status': 'sent', 'error': ''})
+        return results
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    sender = FakeSender()
+    for name in ('send_email', 'send_bulk', 'send_personalized'):
+        monkeypatch.setattr(mail_queue_module.email_service, name, getattr(sender, name))
+    return sender
+
+
+@pytest.fixture
+def mail_queue(monkeypatch):
+    monkeypatch.setenv('MAIL_QUEUE_WORKERS', '2')
+    monkeypatch.setenv('MAIL_BULK_CHUNK_SIZE', '10')
+    monkeypatch.setenv('THROTTLE_DOMAIN_RATE', '0')
+    monkeypatch.setenv('THROTTLE_SENDER_RATE', '0')
+    return MailQueueService()
+
+
+def _wait(job, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not job.is_finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.is_finished
+    return job
+
+
+def _results(job):
+    return {result['email']: result for result in job.results}
+
+
+def test_bulk_chunk_failure_keeps_earlier_results(mail_queue, sender):
+    recipients = ['ana@example.com', 'refused@example.com', 'down@example.com', 'cy@example.com']
+
+    job = _wait(mail_queue.submit_bulk('Hello', 'Body', recipients))
+
+    results = _results(job)
+    assert job.status == 'partial'
+    assert (job.total, job.sent_count, job.failed_count) == (4, 1, 3)
+    assert results['ana@example.com']['status'] == 'sent'
+    assert results['refused@example.com']['error'] == '550 no such user'
+    # Only recipients not yet attempted take the chunk's error
+    assert results['down@example.com']['error'] == 'connection reset'
+    assert results['cy@example.com']['error'] == 'connection reset'
+    assert sender.sent == [('ana@example.com', 'Hello')]
+
+
+def test_bulk_with_no_recipients_fails_and_is_not_kept(mail_queue, sender):
+    job = mail_queue.submit_bulk('Hello', 'Body', [])
+
+    assert job.status == 'failed'
+    assert job.error == 'No recipients'
+    assert mail_queue.get_job(job.job_id) is None
+
+
+def test_merge_row_that_cannot_render_fails_alone(mail_queue, sender):
+    plan = MergePlan('Hello [Recipient]', 'Dear [Recipient],')
+    rows = RowSpool([
+        {'email': 'ana@example.com', 'recipient': 'Ana'},
+        {'email': 'eve@example.com', 'recipient': 'Eve\r\nBcc: all@example.com'},
+        {'email': 'bo@other.example', 'recipient': 'Bo'},
+    ])
+
+    job = _wait(mail_queue.submit_merge(plan, rows))
+
+    results = _results(job)
+    assert job.status == 'partial'
+    assert (job.total, job.sent_count, job.failed_count) == (3, 2, 1)
+    assert 'line break' in results['eve@example.com']['error']
+    assert sorted(sender.sent) == [('ana@example.com', 'Hello Ana'), ('bo@other.example', 'Hello Bo')]
+
+
+def test_worker_survives_a_failing_job(mail_queue, sender, monkeypatch):
+    def broken(subject, body, recipient_email):
+        raise RuntimeError('smtp down')
+
+    monkeypatch.setattr(mail_queue_module.email_service, 'send_email', broken)
+    failed = _wait(mail_queue.submit('Hello', 'Body', 'ana@example.com'))
+    monkeypatch.setattr(mail_queue_module.email_service, 'send_email', sender.send_email)
+    jobs = [mail_queue.submit('Hello', 'Body', f'user{n}@example.com') for n in range(4)]
+
+    assert (failed.status, failed.error) == ('failed', 'smtp down')
+    assert [_wait(job).status for job in jobs] == ['sent'] * 4
+
+
+def test_outbox_entries_are_replayed_under_their_job_ids(mail_queue, sender, monkeypatch, tmp_path):
+    monkeypatch.setenv('OUTBOX_ENABLED', 'true')
+    monkeypatch.setenv('OUTBOX_DIR', str(tmp_path))
+    monkeypatch.setenv('OUTBOX_COMMIT_INTERVAL', '0')
+
+    # A previous process spooled a single and a bulk job, then died
+    previous = OutboxService()
+    previous.add('single-1', 'single-1', 'single', 'Ping', 'Body', ['ana@example.com'])
+    previous.add('bulk-1.0', 'bulk-1', 'bulk', 'News', 'Body', ['bo@example.com', 'cy@example.com'])
+    previous._lock_file.close()
+
+    outbox = OutboxService()
+    monkeypatch.setattr(mail_queue_module, 'outbox_service', outbox)
+
+    assert mail_queue.replay_outbox() == 2
+    single = _wait(mail_queue.get_job('single-1'))
+    bulk = _wait(mail_queue.get_job('bulk-1'))
+
+    assert (single.status, single.recipient) == ('sent', 'ana@example.com')
+    assert (bulk.status, bulk.total) == ('sent', 2)
+    assert sorted(sender.sent) == [('ana@example.com', 'Ping'), ('bo@example.com', 'News'),
+                                   ('cy@example.com', 'News')]
+
+    # Delivered entries are marked done, so the next restart replays only
+    # the entry added afterwards (its commit carries the done records)
+    deadline = time.monotonic() + 5
+    while outbox.get_stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    outbox.add('later', 'later', 'single', 'S', 'B', ['dee@example.com'])
+    outbox._lock_file.close()
+    assert [entry['id'] for entry in OutboxService().recover()] == ['later']
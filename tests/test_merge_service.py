@@ -0,0 +1,121 @@
+"""
+Mail Merge Tests
+Upload parsing, row spooling and per-row rendering
+"""
+import io
+import json
+import pytest
+from app.services.merge_service import (
+    MergePlan,
+    MergeRowError,
+    RowSpool,
+    iter_csv_rows,
+    iter_json_rows
+)
+
+
+ROWS = [
+    {'email': 'ana@example.com', 'recipient': 'Ana'},
+    {'email': 'bo@example.com', 'recipient': 'Bo "B" Li', 'note': 'brackets ] and braces }'},
+    {'email': 'cy@example.com', 'recipient': 'Cyé'},
+]
+
+
+def _stream(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode('utf-8'))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 65536])
+def test_json_array_rows(chunk_size):
+    rows = list(iter_json_rows(_stream(json.dumps(ROWS, indent=2)), chunk_size=chunk_size))
+
+    assert rows == ROWS
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 65536])
+def test_json_lines_rows(chunk_size):
+    text = '\n'.join(json.dumps(row, ensure_ascii=False) for row in ROWS) + '\n'
+
+    rows = list(iter_json_rows(_stream(text), chunk_size=chunk_size))
+
+    assert rows == ROWS
+
+
+def test_json_rows_with_byte_order_mark_and_non_objects():
+    text = '\ufeff[1, "two", {"email": "ana@example.com"}, null, {"email": "bo@example.com"}]'
+
+    rows = list(iter_json_rows(_stream(text), chunk_size=5))
+
+    assert rows == [{'email': 'ana@example.com'}, {'email': 'bo@example.com'}]
+
+
+def test_json_rows_are_read_lazily():
+    text = '\n'.join(json.dumps(row) for row in ROWS * 1000)
+    stream = _stream(text)
+    rows = iter_json_rows(stream, chunk_size=64)
+
+    assert next(rows) == ROWS[0]
+    # Only the text decoder's read-ahead has been consumed
+    assert stream.tell() < len(text) // 10
+
+
+def test_malformed_json_raises_after_earlier_rows():
+    rows = iter_json_rows(_stream('[{"email": "ana@example.com"}, {"email": '), chunk_size=8)
+
+    assert next(rows) == {'email': 'ana@example.com'}
+    with pytest.raises(ValueError):
+        next(rows)
+
+
+def test_empty_upload_has_no_rows():
+    assert list(iter_json_rows(_stream(''))) == []
+    assert list(iter_json_rows(_stream('[]'))) == []
+
+
+def test_csv_rows():
+    rows = list(iter_csv_rows(_stream('\ufeffemail,recipient\nana@example.com,Ana\nbo@example.com,"Li, Bo"\n')))
+
+    assert rows == [
+        {'email': 'ana@example.com', 'recipient': 'Ana'},
+        {'email': 'bo@example.com', 'recipient': 'Li, Bo'}
+    ]
+
+
+def test_row_spool_round_trip_and_skips_non_objects():
+    spool = RowSpool(ROWS + ['not a row'], max_memory=64)
+
+    assert spool.count == 3
+    assert list(spool) == ROWS
+
+
+def test_plan_renders_rows_with_aliases_and_defaults():
+    plan = MergePlan.compile(
+        'Subject: Hello [Recipient]\n\nDear [Recipient],\n\nSee you soon.\n\n[Your Name]',
+        'Greeting',
+        defaults={'Your Name': 'Sam'}
+    )
+
+    email, subject, body = plan.render({'Email': 'ana@example.com', 'First Name': 'Ana'})
+
+    assert plan.placeholders == ['recipient', 'your_name']
+    assert email == 'ana@example.com'
+    assert subject == 'Hello Ana'
+    assert body.startswith('Dear Ana,')
+    assert body.endswith('Sam')
+
+
+def test_plan_leaves_unknown_placeholders():
+    plan = MergePlan('Hello [Recipient]', 'Dear [Recipient], from [Your Name]')
+
+    assert plan.render({'email': 'ana@example.com'})[1:] == ('Hello [Recipient]', 'Dear [Recipient], from [Your Name]')
+
+
+def test_line_break_in_subject_fails_the_row():
+    plan = MergePlan('Hello [Recipient]', 'Dear [Recipient],')
+
+    with pytest.raises(MergeRowError) as error:
+        plan.render({'email': 'eve@example.com', 'recipient': 'Eve\r\nBcc: everyone@example.com'})
+
+    assert error.value.recipient_email == 'eve@example.com'
+    # Line breaks are fine in the body
+    assert plan.render({'email': 'ana@example.com', 'name': 'Ana'})[1] == 'Hello Ana'
@@ -0,0 +1,114 @@
+"""
+Outbox Tests
+Durable spool recovery across restarts and worker processes
+"""
+import json
+import pytest
+from app.services.outbox_service import OutboxService
+
+
+@pytest.fixture(autouse=True)
+def outbox_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTBOX_ENABLED', 'true')
+    monkeypatch.setenv('OUTBOX_DIR', str(tmp_path))
+    monkeypatch.setenv('OUTBOX_COMMIT_INTERVAL', '0')
+
+
+def _add(outbox: OutboxService, entry_id: str, recipients=('ana@example.com',)):
+    outbox.add(entry_id, entry_id.split('.')[0], 'bulk', 'Subject', 'Body', list(recipients), 'session-1')
+
+
+def _crash(outbox: OutboxService):
+    """Stand in for the process dying: its slot lock is released"""
+    outbox._lock_file.close()
+
+
+def _write_log(path, records):
+    path.write_bytes(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+
+
+def _record(entry_id: str) -> dict:
+    return {'op': 'add', 'id': entry_id, 'job': entry_id, 'kind': 'single', 'subject': 'S',
+            'body': 'B', 'recipients': ['ana@example.com'], 'session_id': None}
+
+
+def test_unfinished_entries_are_recovered_after_restart():
+    first = OutboxService()
+    _add(first, 'job1.0', ['ana@example.com', 'bo@example.com'])
+    _add(first, 'job2.0')
+    first.mark_done('job2.0')
+    # The next add commits together with the buffered done record
+    _add(first, 'job3.0')
+    _crash(first)
+
+    second = OutboxService()
+    recovered = {entry['id']: entry for entry in second.recover()}
+
+    assert second.slot == first.slot
+    assert set(recovered) == {'job1.0', 'job3.0'}
+    assert recovered['job1.0']['recipients'] == ['ana@example.com', 'bo@example.com']
+    assert recovered['job1.0']['session_id'] == 'session-1'
+    # Handed out once per process
+    assert second.recover() == []
+    assert second.get_stats()['pending'] == 2
+
+
+def test_done_entries_are_not_replayed_again():
+    first = OutboxService()
+    _add(first, 'job1.0')
+    _crash(first)
+
+    second = OutboxService()
+    assert [entry['id'] for entry in second.recover()] == ['job1.0']
+    second.mark_done('job1.0')
+    _add(second, 'job2.0')
+    second.mark_done('job2.0')
+    _add(second, 'job3.0')
+    _crash(second)
+
+    third = OutboxService()
+    assert [entry['id'] for entry in third.recover()] == ['job3.0']
+
+
+def test_each_live_process_gets_its_own_slot():
+    first, second = OutboxService(), OutboxService()
+    _add(first, 'job1.0')
+    _add(second, 'job2.0')
+
+    assert first.open() and second.open()
+    assert first.slot != second.slot
+    # A live process's log is never adopted
+    assert second.recover() == []
+
+
+def test_logs_of_stopped_processes_are_adopted(tmp_path):
+    _write_log(tmp_path / 'outbox-5.log', [_record('orphan1'), _record('orphan2'), {'op': 'done', 'id': 'orphan2'}])
+    _write_log(tmp_path / 'outbox.log', [_record('legacy')])
+
+    outbox = OutboxService()
+    recovered = sorted(entry['id'] for entry in outbox.recover())
+
+    assert recovered == ['legacy', 'orphan1']
+    assert not (tmp_path / 'outbox-5.log').exists()
+    assert not (tmp_path / 'outbox.log').exists()
+    # The adopted entries now live in this process's log
+    _crash(outbox)
+    assert sorted(entry['id'] for entry in OutboxService().recover()) == ['legacy', 'orphan1']
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    (tmp_path / 'outbox-0.log').write_bytes(
+        json.dumps(_record('whole')).encode('utf-8') + b'\n{"op": "add", "id": "tor'
+    )
+
+    assert [entry['id'] for entry in OutboxService().recover()] == ['whole']
+
+
+def test_disabled_outbox_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTBOX_ENABLED', 'false')
+    outbox = OutboxService()
+
+    _add(outbox, 'job1.0')
+
+    assert not outbox.open()
+    assert list(tmp_path.iterdir()) == []
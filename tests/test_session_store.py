@@ -0,0 +1,258 @@
+"""
+Session Store Tests
+Concurrency, consistency and memory budget of the session backends
+"""
+import json
+import threading
+import time
+from datetime import datetime
+import pytest
+from app.models.state import EmailSession
+from app.services.session_service import SessionService
+from app.services.session_store import (
+    CachedSessionBackend,
+    MemorySessionBackend,
+    SessionConflictError,
+    SQLiteSessionBackend
+)
+
+
+def _session(session_id: str, content: str = 'Subject: Hi\n\nHello there.') -> EmailSession:
+    return EmailSession(
+        session_id=session_id,
+        topic='Quarterly review',
+        generated_content=content,
+        feedback_history=[],
+        final_data='',
+        receiver_mail='',
+        created_at=datetime.utcnow()
+    )
+
+
+def _run_threads(count: int, target):
+    """Run ``target(index)`` on ``count`` threads released together"""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not errors
+
+
+@pytest.fixture
+def service():
+    service = SessionService(backend=MemorySessionBackend(shards=4), reap_interval=60)
+    yield service
+    service.stop()
+
+
+def test_concurrent_feedback_is_not_lost(service):
+    session = service.create_session('Quarterly review', 'Subject: Hi\n\nHello.')
+
+    def add(index):
+        for n in range(50):
+            service.add_feedback(session.session_id, f'{index}-{n}')
+
+    _run_threads(8, add)
+
+    history = service.get_session(session.session_id).feedback_history
+    assert len(history) == 400
+    assert set(history) == {f'{index}-{n}' for index in range(8) for n in range(50)}
+
+
+def test_concurrent_updates_do_not_drop_feedback(service):
+    session = service.create_session('Quarterly review', 'Subject: Hi\n\nHello.')
+
+    def work(index):
+        for n in range(50):
+            if index % 2:
+                service.update_session(session.session_id, receiver_mail=f'r{index}@example.com')
+            else:
+                service.add_feedback(session.session_id, f'{index}-{n}')
+
+    _run_threads(6, work)
+
+    stored = service.get_session(session.session_id)
+    assert len(stored.feedback_history) == 150
+    assert stored.receiver_mail in {'r1@example.com', 'r3@example.com', 'r5@example.com'}
+
+
+def _mixed_load(service: SessionService, session_ids, threads: int, ops: int, io_seconds: float):
+    """Run a read-heavy mix on ``threads`` threads; returns (ops per second, feedback added)"""
+    added = [0] * threads
+
+    def work(index):
+        for n in range(ops):
+            session_id = session_ids[(index * 7 + n) % len(session_ids)]
+            if n % 5 == 0:
+                service.add_feedback(session_id, f'{index}-{n}')
+                added[index] += 1
+            elif n % 5 == 1:
+                service.update_session(session_id, receiver_mail=f'r{index}@example.com')
+            else:
+                service.get_session(session_id)
+            # Request I/O (model or SMTP wait) happens outside the store
+            time.sleep(io_seconds)
+
+    start = time.perf_counter()
+    _run_threads(threads, work)
+    return threads * ops / (time.perf_counter() - start), sum(added)
+
+
+def test_throughput_scales_with_threads(service):
+    # Pure in-memory operations are bound by the GIL, so the load carries
+    # simulated request I/O as in benchmarks/bench_session_store.py; the
+    # store must not serialize requests around it
+    session_ids = [service.create_session(f'Topic {n}', 'Subject: Hi\n\nHello.').session_id for n in range(64)]
+
+    single, added_single = _mixed_load(service, session_ids, 1, 100, 0.002)
+    eight, added_eight = _mixed_load(service, session_ids, 8, 100, 0.002)
+
+    assert eight >= 4 * single
+    stored = sum(len(service.get_session(s).feedback_history) for s in session_ids)
+    assert stored == added_single + added_eight
+
+
+def test_memory_budget_evicts_least_recently_used_across_shards():
+    size = _session('probe').nbytes()
+    backend = MemorySessionBackend(shards=4, budget_bytes=int(size * 3.5), compress_after=-1)
+
+    for index in range(3):
+        backend.create(_session(f's{index}'))
+    # s0 becomes the most recently used, so s1 is the oldest
+    assert backend.get('s0') is not None
+    backend.create(_session('s3'))
+
+    assert backend.get('s1') is None
+    assert all(backend.get(session_id) is not None for session_id in ('s0', 's2', 's3'))
+    stats = backend.get_stats()
+    assert stats['evicted'] == 1
+    assert stats['bytes'] <= backend.budget_bytes
+
+
+def test_memory_budget_holds_under_concurrent_writes():
+    size = _session('probe').nbytes()
+    backend = MemorySessionBackend(shards=8, budget_bytes=size * 20, compress_after=-1)
+
+    def create(index):
+        for n in range(50):
+            backend.create(_session(f'{index}-{n}'))
+
+    _run_threads(8, create)
+
+    stats = backend.get_stats()
+    assert stats['bytes'] <= backend.budget_bytes
+    assert stats['active'] + stats['evicted'] == 400
+
+
+def test_compression_does_not_hold_the_shard_lock(monkeypatch):
+    backend = MemorySessionBackend(shards=1, compress_after=0)
+    backend.create(_session('cold', 'Subject: Hi\n\n' + 'A long draft line.\n' * 100))
+    backend.create(_session('other'))
+    started, release = threading.Event(), threading.Event()
+    compress = EmailSession.compress
+
+    def slow_compress(session, min_size=512):
+        started.set()
+        release.wait(5)
+        return compress(session, min_size)
+
+    monkeypatch.setattr(EmailSession, 'compress', slow_compress)
+    reaper = threading.Thread(target=backend.reap, args=(500,))
+    reaper.start()
+    try:
+        assert started.wait(5)
+        start = time.monotonic()
+        # Same shard as the session being compressed
+        assert backend.get('other') is not None
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        reaper.join(5)
+
+    stats = backend.get_stats()
+    assert (stats['compressed'], stats['cold']) == (1, 2)
+    assert stats['bytes'] == sum(entry.size for entry in backend._shards[0].entries.values())
+    assert backend.get('cold').generated_content.endswith('A long draft line.\n')
+
+
+def test_failed_sqlite_write_leaves_no_trace(tmp_path):
+    backend = SQLiteSessionBackend(path=str(tmp_path / 'sessions.db'), commit_interval=0.05)
+    backend.create(_session('a'))
+    backend.create(_session('b'))
+    session, version, expires_at = backend.load('a')
+    session.feedback_history.append('shorter')
+    writes = [('a', json.dumps(session.to_record()), version, expires_at),
+              ('b', object(), version, expires_at)]
+
+    def work(index):
+        if index:
+            # Shares the group commit with the failing write
+            backend.append_feedback('b', 'formal')
+        else:
+            with pytest.raises(RuntimeError):
+                backend.store_many(writes)
+
+    _run_threads(2, work)
+
+    stored, stored_version, _ = backend.load('a')
+    assert (stored.feedback_history, stored_version) == ([], version)
+    assert backend.load('b')[0].feedback_history == ['formal']
+    backend.close()
+
+
+def _cached(path: str, ttl: float = 0) -> CachedSessionBackend:
+    return CachedSessionBackend(SQLiteSessionBackend(path=path), ttl=ttl, flush_interval=0.01)
+
+
+def test_cached_feedback_from_two_processes_is_merged(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    # Two caches over one database stand in for two worker processes
+    first, second = _cached(path), _cached(path)
+    first.create(_session('shared'))
+
+    def add(index):
+        backend = first if index % 2 else second
+        for n in range(25):
+            backend.append_feedback('shared', f'{index}-{n}')
+
+    _run_threads(4, add)
+    first.close()
+    second.close()
+
+    reader = SQLiteSessionBackend(path=path)
+    try:
+        history = reader.get('shared').feedback_history
+    finally:
+        reader.close()
+    assert sorted(history) == sorted(f'{index}-{n}' for index in range(4) for n in range(25))
+
+
+def test_cached_update_from_stale_view_conflicts(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    # A long ttl keeps the second process working from the view it read
+    first, second = _cached(path), _cached(path, ttl=60)
+    try:
+        first.create(_session('shared'))
+        assert second.get('shared') is not None
+
+        first.update('shared', {'final_data': 'from first'})
+        with pytest.raises(SessionConflictError):
+            second.update('shared', {'final_data': 'from second'})
+
+        # The conflict refreshed the view, so a retry applies on top
+        assert second.get('shared').final_data == 'from first'
+        assert second.update('shared', {'final_data': 'from second'}).final_data == 'from second'
+    finally:
+        first.close()
+        second.close()
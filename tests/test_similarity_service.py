@@ -0,0 +1,26 @@
+"""
+Similarity Tests
+Near-duplicate topic lookup and its opt-in setting
+"""
+from app.services.similarity_service import SimilarityIndex, topic_shingles
+
+
+def test_index_is_off_unless_enabled(monkeypatch):
+    monkeypatch.delenv('LLM_SIMILAR_ENABLED', raising=False)
+    assert SimilarityIndex.from_env() is None
+
+    monkeypatch.setenv('LLM_SIMILAR_ENABLED', 'true')
+    assert isinstance(SimilarityIndex.from_env(), SimilarityIndex)
+
+
+def test_shingles_ignore_stopwords():
+    assert topic_shingles('Schedule a meeting about Q3 budget') == topic_shingles('schedule meeting re: Q3 budget')
+
+
+def test_near_duplicate_topic_reuses_draft():
+    index = SimilarityIndex()
+    index.add('Schedule a meeting about Q3 budget', 'Subject: Q3 budget\n\nLet us meet.')
+
+    assert index.lookup('schedule meeting re: Q3 budget') is not None
+    assert index.lookup('Thank you for the referral') is None
+    assert index.get_stats()['hits'] == 1
@@ -0,0 +1,129 @@
+"""
+Data Model Tests
+Draft version history and its use by EmailSession
+"""
+import json
+from datetime import datetime
+import pytest
+from app.models.state import DraftHistory, EmailSession
+from app.services.session_service import SessionService
+from app.services.session_store import MemorySessionBackend
+
+
+def _drafts(count: int):
+    """Drafts where every version edits, adds or removes a few lines"""
+    lines = [f'Line {n} of the draft.\n' for n in range(40)]
+    drafts = []
+    for version in range(count):
+        lines[version % 40] = f'Line {version % 40} rewritten in version {version}.\n'
+        if version % 3 == 0:
+            lines.insert(version % 17, f'Inserted in version {version}.\n')
+        if version % 5 == 4:
+            del lines[(version * 7) % len(lines)]
+        drafts.append(''.join(lines))
+    return drafts
+
+
+def _history(drafts, snapshot_every: int = 4, max_versions: int = 0) -> DraftHistory:
+    history = DraftHistory(snapshot_every, max_versions)
+    previous = None
+    for draft in drafts:
+        history.append(draft, previous)
+        previous = draft
+    return history
+
+
+def test_every_version_is_reconstructed():
+    drafts = _drafts(25)
+    history = _history(drafts)
+
+    assert history.latest == 25
+    assert [history.get(number) for number in range(1, 26)] == drafts
+
+
+def test_deltas_with_periodic_snapshots():
+    history = _history(_drafts(9), snapshot_every=4)
+
+    described = history.describe()
+    assert [entry['snapshot'] for entry in described] == [True, False, False, False,
+                                                         True, False, False, False, True]
+    assert all(entry['changed_lines'] for entry in described if not entry['snapshot'])
+
+
+def test_unchanged_text_is_not_a_new_version():
+    history = DraftHistory()
+    history.append('Hello.\n')
+    history.append('Hello.\n', 'Hello.\n')
+
+    assert history.latest == 1
+
+
+def test_trimming_keeps_newest_versions():
+    drafts = _drafts(12)
+    history = _history(drafts, snapshot_every=5, max_versions=5)
+
+    assert (history.first, history.latest) == (8, 12)
+    assert [history.get(number) for number in range(8, 13)] == drafts[7:]
+    with pytest.raises(ValueError):
+        history.get(7)
+
+
+def test_compressed_snapshots_still_reconstruct():
+    drafts = _drafts(10)
+    history = _history(drafts, snapshot_every=3)
+    history.compress(min_size=0)
+
+    assert any(isinstance(payload, bytes) for _, payload in history.versions)
+    assert [history.get(number) for number in range(1, 11)] == drafts
+
+
+def test_record_round_trip():
+    drafts = _drafts(15)
+    history = _history(drafts, snapshot_every=4, max_versions=10)
+    history.compress(min_size=0)
+
+    restored = DraftHistory.from_record(json.loads(json.dumps(history.to_record())))
+
+    assert (restored.first, restored.latest) == (history.first, history.latest)
+    assert [restored.get(n) for n in range(restored.first, 16)] == drafts[5:]
+    # Appending continues the snapshot cadence of the original
+    restored.append('Final draft.\n', drafts[-1])
+    history.append('Final draft.\n', drafts[-1])
+    assert restored.describe()[-1]['snapshot'] == history.describe()[-1]['snapshot']
+    assert restored.get(16) == 'Final draft.\n'
+
+
+def test_session_records_a_version_per_draft():
+    session = EmailSession(
+        session_id='s1',
+        topic='Quarterly review',
+        generated_content='First draft.\n',
+        feedback_history=[],
+        final_data='',
+        receiver_mail='',
+        created_at=datetime.utcnow()
+    )
+    session.generated_content = 'Second draft.\n'
+    session.generated_content = 'Second draft.\n'
+
+    restored = EmailSession.from_record(json.loads(json.dumps(session.to_record())))
+    assert restored.history.latest == 2
+    assert restored.history.get(1) == 'First draft.\n'
+
+
+def test_restore_version_adds_a_new_version():
+    service = SessionService(backend=MemorySessionBackend(), reap_interval=60)
+    try:
+        session = service.create_session('Quarterly review', 'First draft.\n')
+        service.update_session(session.session_id, generated_content='Second draft.\n')
+
+        restored = service.restore_version(session.session_id, 1)
+
+        assert restored.generated_content == 'First draft.\n'
+        assert restored.history.latest == 3
+        assert restored.history.get(2) == 'Second draft.\n'
+        with pytest.raises(ValueError):
+            service.restore_version(session.session_id, 9)
+        assert service.restore_version('missing', 1) is None
+    finally:
+        service.stop()
@@ -0,0 +1,92 @@
+"""
+Template Registry Tests
+Topic classification, template parsing and hot reload
+"""
+import os
+import pytest
+from app.services.template_registry import DEFAULT_TEMPLATE, TemplateRegistry, parse_template_file
+
+
+def _write(directory, name: str, keywords: str, priority: int, subject: str):
+    (directory / f'{name}.txt').write_text(
+        f"keywords: {keywords}\npriority: {priority}\n---\nSubject: {subject} - {{topic}}\n\nBody about {{topic}}.\n",
+        encoding='utf-8'
+    )
+
+
+@pytest.fixture
+def registry(tmp_path):
+    _write(tmp_path, 'meeting', 'meeting, schedule, call', 60, 'Meeting')
+    _write(tmp_path, 'thank', 'thank, thanks, grateful', 50, 'Thank You')
+    _write(tmp_path, 'followup', 'follow up, follow-up, checking in', 50, 'Follow-up')
+    (tmp_path / 'general.txt').write_text('Subject: Regarding {topic}\n\nHello.\n', encoding='utf-8')
+    return TemplateRegistry(str(tmp_path), check_interval=0)
+
+
+def test_classifies_by_keyword(registry):
+    assert registry.classify('Schedule a CALL for Friday') == 'meeting'
+    assert registry.classify('Thanks for the referral') == 'thank'
+    assert registry.classify('Quarterly numbers') == DEFAULT_TEMPLATE
+
+
+def test_priority_wins_over_hit_count(registry):
+    # Two 'thank' keywords, one 'meeting' keyword
+    assert registry.classify('Thank you, grateful for the meeting') == 'meeting'
+
+
+def test_hit_count_then_longest_keyword_break_ties(registry):
+    assert registry.classify('Thanks and thanks again, follow up next week') == 'thank'
+    assert registry.classify('Thank you for checking in') == 'followup'
+
+
+def test_classify_many_matches_classify(registry):
+    topics = ['Team meeting', 'Thank you note', 'Following up', 'Budget']
+
+    templates = registry.classify_many(topics)
+
+    assert [t.name for t in templates] == [registry.classify(topic) for topic in topics]
+
+
+def test_rendering_fills_the_topic(registry):
+    email = registry.get('meeting').render('Q3 planning')
+
+    assert email.startswith('Subject: Meeting - Q3 planning')
+    assert 'Body about Q3 planning.' in email
+
+
+def test_reload_picks_up_changed_keywords(registry, tmp_path):
+    assert registry.classify('Project proposal') == DEFAULT_TEMPLATE
+
+    _write(tmp_path, 'proposal', 'proposal, pitch', 40, 'Proposal')
+    # Make sure the directory signature changes even on coarse clocks
+    os.utime(tmp_path / 'proposal.txt', ns=(1, 1))
+
+    assert registry.classify('Project proposal') == 'proposal'
+    assert registry.get_stats()['reloads'] == 2
+
+
+def test_invalid_template_is_skipped(tmp_path):
+    (tmp_path / 'broken.txt').write_text('keywords: broken\n---\nHello {name}\n', encoding='utf-8')
+
+    registry = TemplateRegistry(str(tmp_path), check_interval=-1)
+
+    assert 'broken' not in registry.templates
+    assert registry.classify('broken thing') == DEFAULT_TEMPLATE
+    # A built-in general template stands in for the missing file
+    assert 'Regarding Status' in registry.get(DEFAULT_TEMPLATE).render('Status')
+
+
+def test_file_without_header_has_no_keywords():
+    template = parse_template_file('plain', 'Subject: {topic}\n\nHello.\n')
+
+    assert template.keywords == ()
+    assert template.priority == 0
+    assert template.render('Hi') == 'Subject: Hi\n\nHello.'
+
+
+def test_bundled_templates_classify_common_topics():
+    registry = TemplateRegistry(check_interval=-1)
+
+    assert registry.classify('Schedule a meeting with the design team') == 'meeting'
+    assert registry.classify('Thank you for the referral') == 'thank'
+    assert registry.classify('Thank you for your help') == 'request'
@@ -0,0 +1,58 @@
+"""
+Template Service Tests
+Feedback classification and rule matching
+"""
+import pytest
+from app.services.feedback_rules import FeedbackRuleEngine
+from app.services.template_service import FEEDBACK_PHRASES, classify_feedback, normalize_feedback
+
+
+@pytest.mark.parametrize('feedback, expected', [
+    ('make it shorter', 'concise'),
+    ('Make it shorter, please!', 'concise'),
+    ('please   more FORMAL', 'formal'),
+    ('friendlier', 'casual'),
+    ('Make it sound urgent and important.', 'urgent'),
+    ('add more details', 'detail'),
+])
+def test_known_phrases_are_classified(feedback, expected):
+    assert classify_feedback(feedback) == expected
+
+
+@pytest.mark.parametrize('feedback', [
+    'less formal',
+    'not so casual',
+    'shorter, mention the Friday deadline',
+    'make it shorter and add the agenda',
+    'formalize the budget section',
+    '',
+])
+def test_other_feedback_is_not_classified(feedback):
+    assert classify_feedback(feedback) is None
+
+
+def test_every_phrase_is_already_normalized():
+    for phrases in FEEDBACK_PHRASES.values():
+        for phrase in phrases:
+            assert normalize_feedback(phrase) == phrase
+
+
+def test_rules_activate_in_table_order():
+    engine = FeedbackRuleEngine()
+
+    names = [rule.name for rule in engine.match('Please add DETAIL and make it more formal')]
+
+    assert names == ['formal', 'detail']
+    assert engine.match('looks good') == []
+
+
+def test_rewrites_apply_for_every_active_rule():
+    engine = FeedbackRuleEngine()
+    email = "Subject: Update\n\nHi [Recipient],\n\nI hope all is well.\n\nThanks,\nBest regards"
+
+    result = engine.apply(email, 'more formal and urgent', 'Update')
+
+    assert result.startswith('Subject: [URGENT] Update')
+    assert 'Dear [Recipient]' in result
+    assert 'I urgently need to discuss' in result
+    assert result.endswith('Thank you,\nSincerely')
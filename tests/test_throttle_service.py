@@ -0,0 +1,77 @@
+"""
+Throttle Tests
+Per-domain scheduling and bucket cleanup for idle domains
+"""
+import time
+from app.services.throttle_service import DomainScheduler, TokenBucket, parse_domain_limits
+
+
+def _scheduler(domain_rate: float = 50, domain_burst: float = 1, **kwargs) -> DomainScheduler:
+    return DomainScheduler(100, domain_rate, domain_burst, sender_rate=0, sender_burst=1, **kwargs)
+
+
+def test_bucket_delays_until_refilled():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = time.monotonic()
+
+    bucket.consume(2, now)
+
+    assert bucket.delay_for(1, now) == 0.1
+    assert bucket.full_at(now) == now + 0.2
+    assert bucket.delay_for(1, now + 0.1) == 0
+
+
+def test_domain_limits_are_parsed():
+    assert parse_domain_limits('Gmail.com=2:20, yahoo.com=1,bad') == {
+        'gmail.com': (2.0, 20.0),
+        'yahoo.com': (1.0, 1.0)
+    }
+
+
+def test_throttled_domain_does_not_hold_back_others():
+    scheduler = _scheduler(domain_rate=1)
+    for n in range(2):
+        scheduler.put(f'slow{n}', 'slow.example')
+    assert scheduler.get() == 'slow0'
+
+    scheduler.put('fast', 'fast.example')
+    start = time.monotonic()
+
+    assert scheduler.get() == 'fast'
+    assert time.monotonic() - start < 0.5
+    assert scheduler.get_stats()['deferrals'] == 1
+
+
+def test_idle_domain_buckets_are_dropped_once_refilled():
+    scheduler = _scheduler()
+    for n in range(100):
+        scheduler.put(n, f'domain{n}.example')
+    for _ in range(100):
+        scheduler.get()
+
+    assert scheduler.get_stats()['domains'] == 0
+    time.sleep(0.05)
+    scheduler.put('next', 'other.example')
+
+    assert scheduler.get_stats()['buckets'] == 0
+
+
+def test_unlimited_domain_keeps_no_bucket():
+    scheduler = _scheduler(domain_rate=0)
+    scheduler.put('only', 'example.com')
+
+    assert scheduler.get() == 'only'
+    assert scheduler.get_stats()['buckets'] == 0
+
+
+def test_returning_domain_keeps_its_debt():
+    scheduler = _scheduler(domain_rate=10)
+    scheduler.put('first', 'example.com')
+    scheduler.get()
+    start = time.monotonic()
+
+    scheduler.put('second', 'example.com')
+    scheduler.get()
+
+    # The bucket was not dropped while empty, so the second send waited
+    assert time.monotonic() - start >= 0.08